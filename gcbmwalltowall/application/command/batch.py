@@ -0,0 +1,342 @@
+from __future__ import annotations
+import importlib
+import logging
+import os
+import time
+from argparse import Namespace
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any
+from gcbmwalltowall.util.encoding import load_json
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.application.command.argbase import ArgBase
+
+batch_commands = ("build", "inspect", "prepare", "merge", "convert", "clone", "extend", "run")
+
+
+@dataclass
+class BatchArgs(ArgBase):
+    plan_path: str
+    max_workers: int
+    max_mem_gb: int
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]):
+        return cls(
+            plan_path=d["plan_path"],
+            max_workers=d.get("max_workers", None),
+            max_mem_gb=d.get("max_mem_gb", None),
+        )
+
+    @classmethod
+    def from_namespace(cls, ns: Namespace):
+        return cls(
+            plan_path=ns.plan_path,
+            max_workers=getattr(ns, "max_workers", None),
+            max_mem_gb=getattr(ns, "max_mem_gb", None),
+        )
+
+
+@dataclass
+class BatchTask:
+    id: str
+    command: str
+    args: dict[str, Any]
+    depends_on: list[str] = field(default_factory=list)
+    max_workers: int = 1
+    max_mem_gb: int = None
+
+
+class BatchPlan:
+    """A DAG of walltowall commands to run in a single process. The plan file
+    is a json document with optional global budgets, a list of shared tasks run
+    once, and a list of scenario tasks run once for each scenario:
+
+        {
+            "max_workers": 16,
+            "max_mem_gb": 128,
+            "continue_on_error": false,
+            "tasks": [
+                {"id": "prepare", "command": "prepare", "max_workers": 8,
+                 "max_mem_gb": 32, "args": {"config_path": "base/walltowall_config.json"}},
+                {"id": "convert", "command": "convert", "depends_on": ["prepare"],
+                 "args": {"project_path": "base", "output_path": "base_cbm4"}}
+            ],
+            "scenarios": {
+                "high_harvest": {"end_year": 2050},
+                "low_harvest": {"end_year": 2040}
+            },
+            "scenario_tasks": [
+                {"id": "clone", "command": "clone", "depends_on": ["convert"],
+                 "args": {"config_path": "base_cbm4/cbm4_config.json",
+                          "output_path": "{scenario}", "end_year": "{end_year}"}},
+                {"id": "run", "command": "run", "depends_on": ["clone"],
+                 "args": {"project_path": "{scenario}"}}
+            ]
+        }
+
+    Task args are the same as the command's json/dict arguments. String values
+    in scenario task args are formatted with the scenario's variables plus
+    "scenario" (the scenario name); a value that is only a single placeholder
+    takes on the variable's type. Scenario task ids become "<scenario>/<id>",
+    and their dependencies refer to tasks in the same scenario first, then
+    shared tasks. Tasks request 1 worker and a share of the memory budget in
+    proportion to their workers unless they specify max_workers and
+    max_mem_gb. Relative paths are relative to the current directory.
+
+    Args:
+        tasks (list of BatchTask): the tasks in the plan, in file order
+        max_workers (int, optional): the plan's worker budget
+        max_mem_gb (int, optional): the plan's memory budget
+        continue_on_error (bool, optional): keep running tasks that don't
+            depend on a failed task instead of stopping the batch
+    """
+
+    def __init__(
+        self,
+        tasks: list[BatchTask],
+        max_workers: int = None,
+        max_mem_gb: int = None,
+        continue_on_error: bool = False,
+    ):
+        self.tasks = tasks
+        self.max_workers = max_workers
+        self.max_mem_gb = max_mem_gb
+        self.continue_on_error = continue_on_error
+        self._validate()
+
+    @classmethod
+    def load(cls, plan_path: str | Path) -> BatchPlan:
+        return cls.from_dict(load_json(plan_path))
+
+    @classmethod
+    def from_dict(cls, plan: dict[str, Any]) -> BatchPlan:
+        tasks = [cls._make_task(task) for task in plan.get("tasks", [])]
+        scenario_task_ids = {task["id"] for task in plan.get("scenario_tasks", [])}
+        for scenario, scenario_vars in plan.get("scenarios", {}).items():
+            scenario_vars = {**(scenario_vars or {}), "scenario": scenario}
+            for task_config in plan.get("scenario_tasks", []):
+                task = cls._make_task(task_config, scenario_vars)
+                task.id = f"{scenario}/{task.id}"
+                task.depends_on = [
+                    f"{scenario}/{dep}" if dep in scenario_task_ids else dep
+                    for dep in task.depends_on
+                ]
+
+                tasks.append(task)
+
+        return cls(
+            tasks,
+            plan.get("max_workers"),
+            plan.get("max_mem_gb"),
+            plan.get("continue_on_error", False),
+        )
+
+    @classmethod
+    def _make_task(cls, task_config: dict[str, Any], scenario_vars: dict = None) -> BatchTask:
+        command = task_config["command"]
+        if command not in batch_commands:
+            raise ValueError(
+                f"Unknown command '{command}' in batch task {task_config.get('id')}; "
+                f"expected one of: {', '.join(batch_commands)}"
+            )
+
+        args = task_config.get("args", {})
+        if scenario_vars is not None:
+            args = cls._substitute(args, scenario_vars)
+
+        return BatchTask(
+            id=str(task_config.get("id", command)),
+            command=command,
+            args=args,
+            depends_on=list(task_config.get("depends_on", [])),
+            max_workers=int(task_config.get("max_workers", 1)),
+            max_mem_gb=(
+                int(task_config["max_mem_gb"]) if "max_mem_gb" in task_config
+                else None
+            ),
+        )
+
+    @classmethod
+    def _substitute(cls, value: Any, scenario_vars: dict[str, Any]) -> Any:
+        if isinstance(value, dict):
+            return {k: cls._substitute(v, scenario_vars) for k, v in value.items()}
+
+        if isinstance(value, list):
+            return [cls._substitute(v, scenario_vars) for v in value]
+
+        if isinstance(value, str):
+            if value.startswith("{") and value.endswith("}") and value[1:-1] in scenario_vars:
+                return scenario_vars[value[1:-1]]
+
+            return value.format_map(scenario_vars)
+
+        return value
+
+    def _validate(self):
+        task_ids = [task.id for task in self.tasks]
+        duplicate_ids = {task_id for task_id in task_ids if task_ids.count(task_id) > 1}
+        if duplicate_ids:
+            raise ValueError(f"Duplicate batch task ids: {', '.join(sorted(duplicate_ids))}")
+
+        known_ids = set(task_ids)
+        for task in self.tasks:
+            missing = [dep for dep in task.depends_on if dep not in known_ids]
+            if missing:
+                raise ValueError(
+                    f"Batch task {task.id} depends on unknown tasks: {', '.join(missing)}"
+                )
+
+        # Kahn's algorithm - anything left over is part of a cycle.
+        remaining = {task.id: set(task.depends_on) for task in self.tasks}
+        while True:
+            ready = [task_id for task_id, deps in remaining.items() if not deps]
+            if not ready:
+                break
+
+            for task_id in ready:
+                remaining.pop(task_id)
+
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+        if remaining:
+            raise ValueError(
+                f"Batch plan has a dependency cycle between: {', '.join(sorted(remaining))}"
+            )
+
+
+class BatchRunner:
+    """Runs the tasks in a :class:`BatchPlan` on a thread pool in the current
+    process, so that tasks share cached configuration files and cbm_defaults
+    databases, starting each task once its dependencies have finished and its
+    requested workers and memory fit in what is left of the global budget. A
+    task requesting more than the whole budget runs alone. Each task's
+    max_workers and max_mem_gb args default to its granted share. Tiling,
+    which changes the working directory, runs in its own process (see
+    :py:meth:`Project.tile`).
+
+    Args:
+        plan (BatchPlan): the plan to run
+        max_workers (int): the global worker budget
+        max_mem_gb (int): the global memory budget
+    """
+
+    def __init__(self, plan: BatchPlan, max_workers: int, max_mem_gb: int):
+        self._plan = plan
+        self._max_workers = max(1, max_workers)
+        self._max_mem_gb = max(0, max_mem_gb)
+
+    def run(self) -> list[list]:
+        """Run the plan. Failed tasks are logged and reported in the returned
+        status rather than raised.
+
+        Returns:
+            list: [task, command, status, time_elapsed] for every task
+        """
+        pending = list(self._plan.tasks)
+        status: dict[str, str] = {}
+        times: dict[str, float] = {}
+        free_workers = self._max_workers
+        free_mem_gb = self._max_mem_gb
+        running = {}
+        stop = False
+
+        with ThreadPoolExecutor(self._max_workers) as pool:
+            while pending or running:
+                for task in list(pending):
+                    deps_status = {status.get(dep) for dep in task.depends_on}
+                    if deps_status & {"failed", "skipped"}:
+                        logging.info(f"Skipping {task.id}: a dependency failed")
+                        status[task.id] = "skipped"
+                        pending.remove(task)
+                        continue
+
+                    if stop or deps_status - {"done"}:
+                        continue
+
+                    workers = min(task.max_workers, self._max_workers)
+                    mem_gb = min(self._get_task_mem_gb(task, workers), self._max_mem_gb)
+                    if running and (workers > free_workers or mem_gb > free_mem_gb):
+                        continue
+
+                    free_workers -= workers
+                    free_mem_gb -= mem_gb
+                    pending.remove(task)
+                    logging.info(f"Starting {task.id} ({task.command})")
+                    future = pool.submit(self._run_task, task, workers, mem_gb)
+                    running[future] = (task, workers, mem_gb, time.time())
+
+                if not running:
+                    # Only reachable once the batch has been stopped by a
+                    # failure: otherwise some pending task is always ready.
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task, workers, mem_gb, start = running.pop(future)
+                    free_workers += workers
+                    free_mem_gb += mem_gb
+                    times[task.id] = time.time() - start
+                    try:
+                        future.result()
+                        status[task.id] = "done"
+                        logging.info(f"Finished {task.id} in {times[task.id]:.1f}s")
+                    except (Exception, SystemExit):
+                        # Commands exit on bad input; that fails the task,
+                        # not the batch.
+                        logging.exception(f"Batch task {task.id} failed")
+                        status[task.id] = "failed"
+                        stop = stop or not self._plan.continue_on_error
+
+        return [
+            [task.id, task.command, status.get(task.id, "skipped"), times.get(task.id)]
+            for task in self._plan.tasks
+        ]
+
+    def _get_task_mem_gb(self, task: BatchTask, workers: int) -> float:
+        if task.max_mem_gb is not None:
+            return task.max_mem_gb
+
+        return self._max_mem_gb * workers / self._max_workers
+
+    def _run_task(self, task: BatchTask, workers: int, mem_gb: float):
+        module = importlib.import_module(f"gcbmwalltowall.application.command.{task.command}")
+        command = getattr(module, task.command)
+        args = dict(task.args)
+        args.setdefault("max_workers", workers)
+        if mem_gb:
+            args.setdefault("max_mem_gb", mem_gb)
+
+        command(args)
+
+
+def batch(args: BatchArgs | dict):
+    import pandas as pd
+    from psutil import virtual_memory
+    from gcbmwalltowall.util.resources import ResourceGovernor
+
+    args = args if isinstance(args, BatchArgs) else BatchArgs.from_dict(args)
+    plan = BatchPlan.load(args.plan_path)
+    max_workers = args.max_workers or plan.max_workers or os.cpu_count()
+    max_mem_gb = (
+        args.max_mem_gb or plan.max_mem_gb
+        or int(virtual_memory().available / 1024**3)
+    )
+
+    logging.info(
+        f"Running batch {args.plan_path}: {len(plan.tasks)} tasks, "
+        f"{max_workers} workers, {max_mem_gb} GB"
+    )
+
+    ResourceGovernor.configure(max_mem_gb, max_workers)
+    summary = BatchRunner(plan, max_workers, max_mem_gb).run()
+    pd.DataFrame(
+        columns=["task", "command", "status", "time_elapsed"], data=summary
+    ).to_csv(
+        Path(args.plan_path).absolute().parent.joinpath("batch_profiling.csv"), index=False
+    )
+
+    failed = [task_id for task_id, _, task_status, _ in summary if task_status == "failed"]
+    if failed:
+        raise RuntimeError(f"Batch tasks failed: {', '.join(failed)}")
@@ -0,0 +1,307 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import shutil
+import time
+from argparse import Namespace
+from dataclasses import dataclass
+from typing import Any, Callable
+from gcbmwalltowall.util.encoding import load_json
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.application.command.argbase import ArgBase
+
+benchmark_metrics = ("time_elapsed", "peak_memory_MB", "disk_MB")
+
+benchmark_columns = ["landscape", "stage", "status", *benchmark_metrics]
+
+
+@dataclass
+class BenchmarkArgs(ArgBase):
+    spec_path: str
+    output_path: str
+    baseline_path: str
+    tolerance: float
+    max_workers: int
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]):
+        return cls(
+            spec_path=d["spec_path"],
+            output_path=d.get("output_path", None),
+            baseline_path=d.get("baseline_path", None),
+            tolerance=d.get("tolerance", 0.2),
+            max_workers=d.get("max_workers", None),
+        )
+
+    @classmethod
+    def from_namespace(cls, ns: Namespace):
+        return cls(
+            spec_path=ns.spec_path,
+            output_path=getattr(ns, "output_path", None),
+            baseline_path=getattr(ns, "baseline_path", None),
+            tolerance=getattr(ns, "tolerance", None) or 0.2,
+            max_workers=getattr(ns, "max_workers", None),
+        )
+
+
+class Benchmark:
+    """Runs the prepare -> convert -> run pipeline over synthetic landscapes
+    and measures each stage. The spec file is a json document naming the AIDB
+    to build the landscapes against, the CBM4 engines to run, and a set of
+    landscapes made by the synthetic project builder - each landscape's
+    settings are the builder options:
+
+        {
+            "aidb": "aidb.db",
+            "engines": ["libcbm", "cbmspec"],
+            "end_year": 2030,
+            "landscapes": {
+                "small_raster": {"width": 500, "height": 500},
+                "large_vector": {"width": 8000, "height": 8000, "classifiers": 6,
+                                 "disturbance_years": 20, "disturbance_format": "vector",
+                                 "extension_years": 5, "cohorts": 2}
+            }
+        }
+
+    The stages are build (landscape synthesis), prepare, convert, convert
+    with optimize_spinup, extend (for landscapes with extension_years), clone
+    (to end_year, if specified), and for each engine, making a fresh clone
+    (prepare_run_<engine>) and running it (run_<engine>).
+    A failed stage is logged and ends its landscape's benchmark. Relative
+    paths are relative to the spec file.
+
+    Args:
+        spec (dict): the benchmark specification
+        spec_path (Path): the directory containing the spec file
+        output_path (Path): the directory to generate landscapes in
+        max_workers (int, optional): max workers for each stage
+    """
+
+    def __init__(
+        self, spec: dict[str, Any], spec_path: Path, output_path: Path, max_workers: int = None
+    ):
+        self.spec = spec
+        self.spec_path = Path(spec_path).absolute()
+        self.output_path = Path(output_path).absolute()
+        self.max_workers = max_workers
+
+    def run(self) -> list[list]:
+        """Run every landscape's benchmark.
+
+        Returns:
+            list: [landscape, stage, status, time_elapsed, peak_memory_MB,
+                disk_MB] for every stage run
+        """
+        results = []
+        for name, landscape in self.spec["landscapes"].items():
+            landscape_path = self.output_path.joinpath(name)
+            if landscape_path.exists():
+                shutil.rmtree(landscape_path)
+
+            for stage, stage_path, fn in self._stages(name, landscape or {}, landscape_path):
+                logging.info(f"Benchmarking {name}: {stage}")
+                result = measure(fn, stage_path)
+                results.append([name, stage, *result])
+                if result[0] == "failed":
+                    break
+
+        return results
+
+    def _stages(self, name: str, landscape: dict[str, Any], landscape_path: Path):
+        from gcbmwalltowall.application.command.build import build
+        from gcbmwalltowall.application.command.clone import clone
+        from gcbmwalltowall.application.command.convert import convert
+        from gcbmwalltowall.application.command.extend import extend
+        from gcbmwalltowall.application.command.prepare import prepare
+        from gcbmwalltowall.application.command.run import run
+
+        aidb_path = str(self.spec_path.joinpath(self.spec["aidb"]))
+        gcbm_path = landscape_path.joinpath("gcbm")
+        cbm4_path = landscape_path.joinpath("cbm4")
+        cbm4_config_path = str(cbm4_path.joinpath("cbm4_config.json"))
+
+        landscape_path.mkdir(parents=True)
+        builder_config_path = landscape_path.joinpath("builder_config.json")
+        json.dump(
+            {
+                "project_name": name,
+                "aidb": aidb_path,
+                "builder": {"type": "synthetic", **landscape},
+            },
+            open(builder_config_path, "w"),
+            indent=4,
+        )
+
+        yield "build", landscape_path, lambda: build({
+            "config_path": str(builder_config_path),
+            "output_path": str(landscape_path),
+        })
+
+        yield "prepare", gcbm_path, lambda: prepare({
+            "config_path": str(landscape_path.joinpath(f"{name}.json")),
+            "output_path": str(gcbm_path),
+            "max_workers": self.max_workers,
+        })
+
+        for stage, optimize_spinup in (("convert", False), ("convert_optimized", True)):
+            stage_path = landscape_path.joinpath(
+                "cbm4_optimized" if optimize_spinup else "cbm4"
+            )
+
+            yield stage, stage_path, lambda stage_path=stage_path, optimize_spinup=optimize_spinup: convert({
+                "project_path": str(gcbm_path),
+                "output_path": str(stage_path),
+                "aidb_path": aidb_path,
+                "max_workers": self.max_workers,
+                "optimize_spinup": optimize_spinup,
+            })
+
+        if landscape.get("extension_years"):
+            extended_path = landscape_path.joinpath("cbm4_extended")
+            yield "extend", extended_path, lambda: extend({
+                "cbm4_config_path": cbm4_config_path,
+                "disturbance_config_path": str(
+                    landscape_path.joinpath("extension_disturbances.json")
+                ),
+                "output_path": str(extended_path),
+                "max_workers": self.max_workers,
+            })
+
+        end_year = self.spec.get("end_year")
+        clone_path = landscape_path.joinpath("cbm4_clone")
+        yield "clone", clone_path, lambda: clone({
+            "config_path": cbm4_config_path,
+            "output_path": str(clone_path),
+            "end_year": end_year,
+        })
+
+        for engine in self.spec.get("engines", ["libcbm"]):
+            # Each engine runs a fresh clone so that no run reuses another's
+            # results.
+            run_path = landscape_path.joinpath(f"run_{engine}")
+            yield f"prepare_run_{engine}", run_path, lambda run_path=run_path: clone({
+                "config_path": cbm4_config_path,
+                "output_path": str(run_path),
+                "end_year": end_year,
+            })
+
+            yield f"run_{engine}", run_path, lambda run_path=run_path, engine=engine: run({
+                "project_path": str(run_path),
+                "engine": engine,
+                "max_workers": self.max_workers,
+            })
+
+
+def measure(fn: Callable[[], Any], output_path: Path) -> list:
+    """Run a benchmark stage, measuring its time, the peak resident memory of
+    this process and its children, and the growth of its output directory.
+
+    Returns:
+        list: [status, time_elapsed, peak_memory_MB, disk_MB]
+    """
+    from gcbmwalltowall.util.resources import MemorySampler
+
+    disk_bytes_before = _get_disk_bytes(output_path)
+    status = "done"
+    start = time.time()
+    with MemorySampler() as sampler:
+        try:
+            fn()
+        except (Exception, SystemExit):
+            logging.exception(f"Benchmark stage writing to {output_path} failed")
+            status = "failed"
+
+    return [
+        status,
+        round(time.time() - start, 2),
+        round(sampler.peak_memory_bytes / 1024**2, 1),
+        round((_get_disk_bytes(output_path) - disk_bytes_before) / 1024**2, 1),
+    ]
+
+
+def _get_disk_bytes(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+
+    return total
+
+
+def compare_to_baseline(results, baseline, tolerance: float) -> list[str]:
+    """Compare benchmark results to a baseline from a previous run.
+
+    Args:
+        results (DataFrame): the benchmark results
+        baseline (DataFrame): the baseline results
+        tolerance (float): the allowed increase in each metric, as a fraction
+            of the baseline value
+
+    Returns:
+        list of str: a description of each regression: a stage that succeeded
+            in the baseline but not now, or a metric exceeding its tolerance
+    """
+    regressions = []
+    baseline = baseline.set_index(["landscape", "stage"])
+    for row in results.itertuples(index=False):
+        key = (row.landscape, row.stage)
+        if key not in baseline.index:
+            continue
+
+        expected = baseline.loc[key]
+        if expected["status"] != "done":
+            continue
+
+        if row.status != "done":
+            regressions.append(f"{row.landscape}/{row.stage}: {row.status}")
+            continue
+
+        for metric in benchmark_metrics:
+            value = getattr(row, metric)
+            limit = expected[metric] * (1 + tolerance)
+            if value > limit:
+                regressions.append(
+                    f"{row.landscape}/{row.stage}: {metric} {value:g} exceeds "
+                    f"baseline {expected[metric]:g} by more than {tolerance:.0%}"
+                )
+
+    return regressions
+
+
+def benchmark(args: BenchmarkArgs | dict):
+    import pandas as pd
+
+    args = args if isinstance(args, BenchmarkArgs) else BenchmarkArgs.from_dict(args)
+    spec_path = Path(args.spec_path).absolute()
+    output_path = Path(args.output_path or spec_path.parent.joinpath("benchmark")).absolute()
+    spec = load_json(spec_path)
+    logging.info(
+        f"Running benchmark {spec_path}: {len(spec['landscapes'])} landscapes in {output_path}"
+    )
+
+    summary = Benchmark(spec, spec_path.parent, output_path, args.max_workers).run()
+    results = pd.DataFrame(columns=benchmark_columns, data=summary)
+    results_path = output_path.joinpath("benchmark_results.csv")
+    results.to_csv(results_path, index=False)
+    logging.info(f"Benchmark results written to {results_path}")
+
+    failed = [
+        f"{landscape}/{stage}" for landscape, stage, status, *_ in summary
+        if status == "failed"
+    ]
+
+    regressions = []
+    if args.baseline_path:
+        baseline = pd.read_csv(args.baseline_path)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            logging.error(f"Regression: {regression}")
+
+    if failed or regressions:
+        raise RuntimeError(
+            f"Benchmark found {len(failed)} failed stages and {len(regressions)} regressions"
+        )
@@ -43,6 +43,7 @@ class CloneArgs(ArgBase):
 
 def clone(args: CloneArgs | dict):
     from arrow_space.raster_indexed_dataset import RasterIndexedDataset
+    from gcbmwalltowall.runner.parameterdatasets import copy_parameter_datasets
 
     args = args if isinstance(args, CloneArgs) else CloneArgs.from_dict(args)
     shutil.rmtree(args.output_path, True)
@@ -77,12 +78,22 @@ def clone(args: CloneArgs | dict):
     for project_file in config.config_path.glob("*.*"):
         shutil.copyfile(project_file, config.resolve_working(project_file.name))
 
+    if not args.use_cache:
+        # Without a cache the clone builds its own parameter datasets; start it
+        # with the parent's so that they're reused if the inputs still match.
+        copy_parameter_datasets(config.config_path, config.working_path)
+
     clone_cbm4_config_path = config.resolve_working("cbm4_config.json")
     shutil.copyfile(args.cbm4_config_path, clone_cbm4_config_path)
     with GCBMConfigurer.update_json_file(clone_cbm4_config_path) as cbm4_config:
         cbm4_config["cbm4_spatial_dataset"]["inventory"]["path_or_uri"] = "inventory"
         cbm4_config["cbm4_spatial_dataset"]["disturbance"]["path_or_uri"] = "disturbance"
         cbm4_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"] = "simulation"
+        if config.get("spinup_cache"):
+            cbm4_config["spinup_cache"] = os.path.relpath(
+                config.resolve(config["spinup_cache"]), clone_cbm4_config_path.parent
+            )
+
         if args.use_cache:
             # Cache rules: if the start_year is explicitly specified and is within the
             # parent project's simulation period, use the parent project as the cache,
@@ -0,0 +1,60 @@
+from __future__ import annotations
+import logging
+from argparse import Namespace
+from dataclasses import dataclass
+from typing import Any
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.application.command.argbase import ArgBase
+
+
+@dataclass
+class ExportArgs(ArgBase):
+    cbm4_config_path: str
+    output_path: str
+    reporting_classifiers: list[str]
+    variables: list[str]
+    geotiff_variables: list[str]
+    geotiff_years: list[int]
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]):
+        return cls(
+            cbm4_config_path=d["cbm4_config_path"],
+            output_path=d.get("output_path", None),
+            reporting_classifiers=d.get("reporting_classifiers", None),
+            variables=d.get("variables", None),
+            geotiff_variables=d.get("geotiff_variables", None),
+            geotiff_years=d.get("geotiff_years", None),
+        )
+
+    @classmethod
+    def from_namespace(cls, ns: Namespace):
+        return cls(
+            cbm4_config_path=ns.cbm4_config_path,
+            output_path=getattr(ns, "output_path", None),
+            reporting_classifiers=getattr(ns, "reporting_classifiers", None),
+            variables=getattr(ns, "variables", None),
+            geotiff_variables=getattr(ns, "geotiff_variables", None),
+            geotiff_years=getattr(ns, "geotiff_years", None),
+        )
+
+
+def export(args: ExportArgs | dict):
+    from gcbmwalltowall.application.command.impl.cbm4project import CBM4Project
+    from gcbmwalltowall.application.command.impl.simulationexporter import (
+        SimulationExporter,
+    )
+
+    args = args if isinstance(args, ExportArgs) else ExportArgs.from_dict(args)
+    cbm4_config_path = Path(args.cbm4_config_path).absolute()
+    output_path = Path(args.output_path or cbm4_config_path.parent.joinpath("export"))
+    logging.info(f"Exporting results of {cbm4_config_path} to {output_path}")
+
+    cbm4_project = CBM4Project(cbm4_config_path)
+    exporter = SimulationExporter(
+        cbm4_project, args.reporting_classifiers, args.variables
+    )
+
+    exporter.export_aggregates(output_path)
+    if args.geotiff_variables:
+        exporter.export_geotiffs(output_path, args.geotiff_variables, args.geotiff_years)
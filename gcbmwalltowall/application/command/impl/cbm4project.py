@@ -44,6 +44,15 @@ class CBM4Project:
     def disturbance_dataset(self) -> RasterIndexedDataset:
         return self._disturbance_dataset
 
+    @property
+    def simulation_dataset(self) -> RasterIndexedDataset:
+        return self._get_dataset("simulation")
+
+    @property
+    def classifier_names(self) -> list[str]:
+        yield_columns = list(self._inventory_dataset.read_table_pandas("yield").columns)
+        return yield_columns[: yield_columns.index("species")]
+
     @property
     def t0_year(self) -> int:
         return self._cbm4_config["start_year"] - 1
@@ -105,6 +114,32 @@ class CBM4Project:
 
         return self._bbox_path
 
+    def extract_chunk_raster(self) -> Path:
+        """Export a raster of the inventory's chunk layout, where each pixel's
+        value is its chunk index + 1.
+        """
+        chunk_raster_path = Path(self._temp_dir.name).joinpath("chunk.tiff")
+        if chunk_raster_path.exists():
+            return chunk_raster_path
+
+        inv_ri_data = self._inventory_dataset.read_polars(
+            self._inventory_dataset.raster_index_table_name
+        )
+
+        export_data = (
+            inv_ri_data.select("chunk_index", "raster_index")
+            .unique()
+            .collect()
+            .to_pandas()
+        )
+        export_data["chunk"] = export_data["chunk_index"] + 1
+
+        exporter = GeoTiffExporter(self._inventory_dataset)
+        exporter.write_data(export_data)
+        exporter.write_geotiff(self._temp_dir.name, "GTiff")
+
+        return chunk_raster_path
+
     def extract_flattened_disturbances(self) -> FlattenedCoordinateDataset:
         flat_layers = []
         split_partitions = defaultdict(list)
@@ -0,0 +1,367 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import shutil
+from tempfile import TemporaryDirectory
+from typing import Any, Iterable, Iterator
+import numpy as np
+from arrow_space.raster_indexed_dataset import RasterIndexedDataset
+from mojadata.util import gdal
+from gcbmwalltowall.application.command.impl.cbm4project import CBM4Project
+from gcbmwalltowall.configuration.configuration import Configuration
+from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
+from gcbmwalltowall.util import gdalhelpers
+from gcbmwalltowall.util.encoding import load_json
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.rasterbound import RasterBound
+from gcbmwalltowall.util.rastersession import RasterSession
+
+
+class CBM4Subset:
+    """Builds a copy of a CBM4 project restricted to some of its chunks and,
+    optionally, a window of its timesteps, so that a region of interest can
+    be spun up and simulated in a fraction of the time of the full landscape.
+    The subset project runs like any other with either CBM4 engine.
+
+    Chunks can be selected directly by index or by the pixels they contain:
+    within a bounding box in the project's coordinate system, under the
+    non-zero pixels of a mask raster, or matching a set of classifier values.
+    A chunk must satisfy every criterion given to be selected.
+
+    Args:
+        cbm4_project (CBM4Project): the project to subset
+    """
+
+    def __init__(self, cbm4_project: CBM4Project):
+        self._project = cbm4_project
+        self._config = Configuration.load(cbm4_project.config_path)
+
+    def select_chunks(
+        self,
+        chunks: Iterable[int] = None,
+        bounding_box: tuple[float, float, float, float] = None,
+        mask_path: str | Path = None,
+        classifier_filter: dict[str, Any] = None,
+    ) -> list[int]:
+        """Find the chunks matching the subset criteria.
+
+        Args:
+            chunks (list of int, optional): chunk indexes to include
+            bounding_box (tuple, optional): xmin, ymin, xmax, ymax in the
+                project's coordinate system
+            mask_path (str, optional): raster whose non-zero pixels mark the
+                area to include; reprojected to the project's grid if needed
+            classifier_filter (dict, optional): classifier name to value; a
+                chunk is included if any of its pixels has all of the values
+
+        Returns:
+            list of int: the selected chunk indexes
+        """
+        selected = set(
+            p["chunk_index"] for p in self._project.inventory_dataset.get_partition_values()
+        )
+
+        if chunks is not None:
+            selected &= set(chunks)
+
+        if bounding_box is not None:
+            selected &= self._find_chunks_in_bounding_box(bounding_box)
+
+        if mask_path is not None:
+            selected &= self._find_chunks_under_mask(mask_path)
+
+        if classifier_filter:
+            selected &= self._find_chunks_with_classifiers(classifier_filter)
+
+        return sorted(selected)
+
+    def create(
+        self,
+        output_path: str | Path,
+        chunks: Iterable[int],
+        start_year: int = None,
+        end_year: int = None,
+        resume: bool = False,
+    ) -> Path:
+        """Write the subset project, along with a manifest of the selection it
+        was made from.
+
+        Args:
+            output_path (str): the directory to write the subset project to
+            chunks (list of int): the chunks to include
+            start_year (int, optional): the first year to simulate; if later
+                than the project's start year, the subset starts from the
+                project's own simulation results for the previous year instead
+                of spinup, so the project must already have been run that far
+            end_year (int, optional): the last year to simulate
+            resume (bool, optional): keep an existing subset made from the same
+                selection, along with its simulation checkpoints, instead of
+                starting over; an existing subset made from a different
+                selection is an error. Defaults to False.
+
+        Returns:
+            Path: the subset project's cbm4_config.json
+        """
+        chunks = set(chunks)
+        if not chunks:
+            raise RuntimeError("No chunks selected for the subset")
+
+        output_path = Path(output_path).absolute()
+        subset_config_path = output_path.joinpath("cbm4_config.json")
+        manifest_path = output_path.joinpath("subset.manifest.json")
+        manifest = {
+            "project": str(self._config.config_path),
+            "chunks": sorted(chunks),
+            "start_year": start_year,
+            "end_year": end_year,
+        }
+
+        if resume and manifest_path.exists():
+            if load_json(manifest_path) != manifest:
+                raise RuntimeError(
+                    f"Can't resume the subset in {output_path}: it was made from a "
+                    "different selection of chunks or years"
+                )
+
+            logging.info(f"Resuming subset of {len(chunks)} chunks in {output_path}")
+
+            return subset_config_path
+
+        shutil.rmtree(output_path, True)
+        output_path.mkdir(parents=True)
+        logging.info(f"Creating subset of {len(chunks)} chunks in {output_path}")
+
+        for project_file in self._config.config_path.glob("*.*"):
+            if project_file.is_file():
+                shutil.copyfile(project_file, output_path.joinpath(project_file.name))
+
+        for dataset_name in ("inventory", "disturbance"):
+            copy_partitions(
+                self._get_dataset(dataset_name), dataset_name,
+                output_path.joinpath(dataset_name), chunks,
+            )
+
+        with GCBMConfigurer.update_json_file(subset_config_path) as cbm4_config:
+            for dataset_name in ("inventory", "disturbance", "simulation"):
+                dataset_config = cbm4_config["cbm4_spatial_dataset"][dataset_name]
+                dataset_config["path_or_uri"] = dataset_name
+                dataset_config["storage_type"] = "local_storage"
+
+            # Subsets are for quick investigations; keep them out of the cache
+            # shared by full runs.
+            cbm4_config.pop("spinup_cache", None)
+            cbm4_config.pop("cache", None)
+            if end_year is not None:
+                cbm4_config["end_year"] = end_year
+
+            project_start_year = self._config["start_year"]
+            if start_year is not None and start_year > project_start_year:
+                cbm4_config["cache"] = self._create_cache(
+                    output_path.joinpath("cache"), chunks, start_year - project_start_year
+                )
+
+        # Written last, so that an incomplete subset is never resumed.
+        json.dump(manifest, open(manifest_path, "w"), indent=4)
+
+        return subset_config_path
+
+    def _create_cache(self, cache_path: Path, chunks: set[int], cache_end_timestep: int) -> dict:
+        cache_config = self._config.get("cache")
+        cache_start_timestep = (
+            cache_config["end_year"] - self._config["start_year"] + 1
+            if cache_config else 0
+        )
+
+        # The state at the end of the cached timestep may have come from the
+        # project's own cache if it was cloned.
+        source_config = (
+            cache_config if cache_config and cache_end_timestep <= cache_start_timestep
+            else self._config["cbm4_spatial_dataset"]["simulation"]
+        )
+
+        source_ds = RasterIndexedDataset(
+            source_config["dataset_name"],
+            source_config["storage_type"],
+            str(self._config.resolve(source_config["path_or_uri"])),
+        )
+
+        if not copy_partitions(
+            source_ds, "simulation", cache_path.joinpath("simulation"), chunks,
+            timesteps={cache_end_timestep},
+        ):
+            raise RuntimeError(
+                f"No simulation results found for timestep {cache_end_timestep}: "
+                "run the full project before running a subset from a later start year"
+            )
+
+        # The cbmspec engine reuses the cached run's step parameters.
+        step_parameters_path = Path(
+            self._config.resolve(source_config["path_or_uri"])
+        ).parent.joinpath("step_parameters")
+
+        if step_parameters_path.exists():
+            copy_partitions(
+                RasterIndexedDataset("step_parameters", "local_storage", str(step_parameters_path)),
+                "step_parameters", cache_path.joinpath("step_parameters"), chunks,
+            )
+
+        return {
+            "dataset_name": "simulation",
+            "storage_type": "local_storage",
+            "path_or_uri": os.path.join("cache", "simulation"),
+            "end_year": self._config["start_year"] + cache_end_timestep - 1,
+        }
+
+    def _get_dataset(self, name: str) -> RasterIndexedDataset:
+        if name == "inventory":
+            return self._project.inventory_dataset
+
+        return self._project.disturbance_dataset
+
+    def _find_chunks_in_bounding_box(self, bounding_box) -> set[int]:
+        chunk_raster_path = str(self._project.extract_chunk_raster())
+        xmin, ymin, xmax, ymax = bounding_box
+        with TemporaryDirectory() as tmp:
+            window_path = os.path.join(tmp, "window.tiff")
+            gdal.Translate(window_path, chunk_raster_path, projWin=[xmin, ymax, xmax, ymin])
+            with RasterSession() as session:
+                return find_chunks(
+                    data for _, (data,) in session.read_chunks(window_path)
+                )
+
+    def _find_chunks_under_mask(self, mask_path: str | Path) -> set[int]:
+        chunk_raster_path = str(self._project.extract_chunk_raster())
+        chunk_raster = gdal.Open(chunk_raster_path)
+        x_min, x_res, _, y_max, _, y_res = chunk_raster.GetGeoTransform()
+        width, height = chunk_raster.RasterXSize, chunk_raster.RasterYSize
+        projection = chunk_raster.GetProjection()
+        chunk_bytes_per_pixel = max(
+            1, gdal.GetDataTypeSize(chunk_raster.GetRasterBand(1).DataType) // 8
+        )
+        del chunk_raster
+
+        with TemporaryDirectory() as tmp:
+            # The aligned mask is sparse, so the blocks it doesn't cover can be
+            # left out of the pass.
+            aligned_mask_path = os.path.join(tmp, "mask.tiff")
+            gdal.Warp(
+                aligned_mask_path, str(mask_path),
+                format="GTiff", dstSRS=projection, resampleAlg="near",
+                outputBounds=[x_min, y_max + y_res * height, x_min + x_res * width, y_max],
+                width=width, height=height,
+                creationOptions=["TILED=YES", "SPARSE_OK=TRUE"],
+            )
+
+            # The stacked chunk raster and the masked output are held alongside
+            # each chunk of the mask.
+            chunks = gdalhelpers.plan_raster_stack_chunks(
+                [aligned_mask_path],
+                extra_bytes_per_pixel=[chunk_bytes_per_pixel] * 2,
+                skip_nodata=True,
+            )
+
+            return find_chunks(
+                mask_chunk_rasters([chunk_raster_path, aligned_mask_path], chunks)
+            )
+
+    def _find_chunks_with_classifiers(self, classifier_filter: dict[str, Any]) -> set[int]:
+        inventory = self._project.inventory_dataset.read_pandas(
+            read_cols=["chunk_index", *classifier_filter.keys()]
+        )
+
+        matches = np.ones(len(inventory), dtype=bool)
+        for classifier, value in classifier_filter.items():
+            matches &= (inventory[classifier].astype(str) == str(value)).to_numpy()
+
+        return set(inventory.loc[matches, "chunk_index"].unique().tolist())
+
+
+def find_chunks(chunk_rasters: Iterable[np.ndarray]) -> set[int]:
+    """Collect the chunk indexes in chunk rasters, where each pixel's value is
+    its chunk index + 1 and 0 or less is outside any chunk.
+    """
+    chunks = set()
+    for data in chunk_rasters:
+        values = np.unique(data)
+        chunks.update(int(v) - 1 for v in values[values > 0])
+
+    return chunks
+
+
+def mask_chunk_rasters(
+    paths: list[str], chunks: Iterable[RasterBound]
+) -> Iterator[np.ndarray]:
+    """Read a chunk raster and a mask raster aligned to it together, chunk by
+    chunk, reusing the same buffer for every chunk of the same size.
+
+    Args:
+        paths (list of str): the chunk raster and mask raster paths
+        chunks (iterable of RasterBound): the chunks to read
+
+    Yields:
+        numpy.ndarray: the chunk raster, with pixels outside of the mask
+            (0 or nodata) set to 0
+    """
+    buffers = {}
+    for bounds in chunks:
+        shape = (2, bounds.y_size, bounds.x_size)
+        stack = gdalhelpers.read_dataset_stack(paths, bounds, out=buffers.get(shape))
+        buffers[shape] = stack.data
+        chunk_data, mask = stack.data
+        mask_nodata = stack.nodata[1]
+        yield np.where((mask != 0) & (mask != mask_nodata), chunk_data, 0)
+
+
+def copy_partitions(
+    source_ds: RasterIndexedDataset,
+    name: str,
+    path: str | Path,
+    chunks: set[int],
+    timesteps: set[int] = None,
+) -> bool:
+    """Copy the partitions of a dataset belonging to a set of chunks (and,
+    optionally, timesteps) into a new local_storage dataset, along with the
+    raster index for those chunks and all of the dataset's tables and files.
+
+    Returns:
+        bool: True if any data was copied
+    """
+    subset_ds = source_ds.create_new(
+        name, "local_storage", str(path), copy_raster_index_data=False
+    )
+
+    copied_chunks = set()
+    for partition in source_ds.get_partition_values():
+        if partition["chunk_index"] not in chunks:
+            continue
+
+        if timesteps is not None and partition.get("timestep") not in timesteps:
+            continue
+
+        data = source_ds.read_pandas(filters=[[k, "=", v] for k, v in partition.items()])
+        if data.empty:
+            continue
+
+        subset_ds.write(data)
+        copied_chunks.add(partition["chunk_index"])
+
+    for chunk in copied_chunks:
+        subset_ds.write(
+            source_ds.read_pandas(
+                source_ds.raster_index_table_name,
+                filters=[["chunk_index", "=", chunk]],
+            ),
+            subset_ds.raster_index_table_name,
+        )
+
+    for table_name in source_ds.list_tables():
+        subset_ds.write_table(table_name, source_ds.read_table_pandas(table_name))
+
+    with TemporaryDirectory() as tmp:
+        for _, file_or_dir_name in source_ds.list_files_and_dirs():
+            extracted_path = str(Path(tmp).joinpath(file_or_dir_name))
+            source_ds.extract_file_or_dir(file_or_dir_name, extracted_path)
+            subset_ds.write_file_or_dir(file_or_dir_name, extracted_path)
+
+    return bool(copied_chunks)
@@ -1,6 +1,7 @@
 import logging
 import json
 import multiprocessing
+import time
 import pandas as pd
 from tqdm import tqdm
 from concurrent.futures import ProcessPoolExecutor, as_completed
@@ -17,6 +18,9 @@ from gcbmwalltowall.application.command.impl.cbm4project import CBM4Project
 from gcbmwalltowall.project.projectfactory import ProjectFactory
 from gcbmwalltowall.component.inputdatabase import InputDatabase
 from gcbmwalltowall.application.command.impl.gcbmdisturbanceinputreader import GCBMDisturbanceInputReader
+from gcbmwalltowall.util.transitionruleregistry import (
+    SharedTransitionRuleRegistry, TransitionRuleRegistry
+)
 from arrow_space import flattened_coordinate_dataset
 from arrow_space.flattened_coordinate_dataset import FlattenedCoordinateDataset
 from arrow_space.flattened_coordinate_dataset import InputLayerCollection
@@ -24,7 +28,6 @@ from arrow_space.input.flattened_coordinate_input_layer import FlattenedCoordina
 from arrow_space.raster_indexed_dataset import RasterIndexedDataset
 from mojadata.cleanup import cleanup
 from mojadata.gdaltiler2d import GdalTiler2D
-from mojadata.layer.gcbm.transitionrulemanager import SharedTransitionRuleManager
 from mojadata.boundingbox import BoundingBox
 from mojadata.layer.rasterlayer import RasterLayer
 from cbm4.app.spatial.gcbm_input.timestep_interpreter import YearOffsetTimestepInterpreter
@@ -37,14 +40,85 @@ class _Classifier:
     name: str
 
 
+# Per-process state for partition workers: built once by the pool initializer
+# instead of being pickled into every submitted task.
+_worker_state: dict[str, Any] = {}
+
+
+def _set_worker_state(
+    preprocessor: GCBMDisturbancePreprocessor, out_dataset: RasterIndexedDataset
+):
+    _worker_state["preprocessor"] = preprocessor
+    _worker_state["out_dataset"] = out_dataset
+
+
+def _init_partition_worker(
+    disturbance_ds_config: dict[str, Any],
+    cbm_defaults_path: str,
+    cbm_defaults_locale: str,
+    t0_year: int,
+    disturbance_order: list[int],
+    out_ds_config: dict[str, Any],
+):
+    gcbm_input_reader = GCBMDisturbanceInputReader(
+        FlattenedCoordinateDataset(
+            disturbance_ds_config["dataset_name"],
+            disturbance_ds_config["storage_type"],
+            disturbance_ds_config["path_or_uri"],
+        ),
+        cbm_defaults_path,
+        cbm_defaults_locale,
+    )
+
+    preprocessor = GCBMDisturbancePreprocessor(
+        YearOffsetTimestepInterpreter(t0_year),
+        ListBasedSorter(disturbance_order),
+        gcbm_input_reader,
+    )
+
+    _set_worker_state(
+        preprocessor,
+        RasterIndexedDataset(
+            out_ds_config["dataset_name"],
+            out_ds_config["storage_type"],
+            out_ds_config["path_or_uri"],
+        ),
+    )
+
+
+def _process_partition_batch(
+    partitions: list[dict[str, Any]],
+) -> list[tuple[dict[str, Any], float, str]]:
+    preprocessor = _worker_state["preprocessor"]
+    out_dataset = _worker_state["out_dataset"]
+    results = []
+    for partition in partitions:
+        start = time.time()
+        try:
+            preprocessor.process_partition(0, partition, out_dataset)
+            err = ""
+        except Exception:
+            err = format_exc()
+
+        results.append((partition, time.time() - start, err))
+
+    return results
+
+
 class DisturbanceExtender:
 
+    _batches_per_worker = 4
+
     def __init__(self, cbm4_project: CBM4Project, use_cache: bool = True, max_workers: int | None = None):
         self._cbm4_project = cbm4_project
         self._use_cache = use_cache
         self._max_workers = max_workers
         self._temp_dir = TemporaryDirectory()
 
+    @property
+    def _merged_disturbances_path(self) -> Path:
+        return Path(self._temp_dir.name).joinpath("merged_extended_disturbances")
+
     def add_from_walltowall_config(
         self,
         disturbance_config_path: str | Path,
@@ -98,45 +172,56 @@ class DisturbanceExtender:
         )
 
         partitions = gcbm_input_reader.get_cohort_partition_values(0)
+        partition_times = []
         if self._max_workers == 1:
-            for partition in tqdm(
-                partitions,
-                desc="Extending disturbances",
-                total=len(partitions)
-            ):
-                self._preprocess_disturbance_partition(
-                    preprocessor, partition, processed_disturbances
-                )
+            _set_worker_state(preprocessor, processed_disturbances)
+            with tqdm(desc="Extending disturbances", total=len(partitions)) as pbar:
+                for batch in self._batch_partitions(partitions, 1):
+                    partition_times.extend(self._check_batch_result(
+                        _process_partition_batch(batch)
+                    ))
+                    pbar.update(len(batch))
         else:
             workers = min(
                 self._max_workers or multiprocessing.cpu_count(),
                 len(partitions)
             )
 
+            # Workers build their own preprocessor and dataset handles once at
+            # startup, so tasks only need to carry the partition keys.
             with ProcessPoolExecutor(
                 max_workers=workers,
                 mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_partition_worker,
+                initargs=(
+                    {
+                        "dataset_name": all_flattened_disturbances.name,
+                        "storage_type": "local_storage",
+                        "path_or_uri": str(self._merged_disturbances_path),
+                    },
+                    str(self._cbm4_project.cbm_defaults_path),
+                    self._cbm4_project.cbm_defaults_locale,
+                    self._cbm4_project.t0_year,
+                    self._cbm4_project.disturbance_order + [0],
+                    out_ds_config,
+                ),
             ) as executor:
-                futures = []
-                for partition in partitions:
-                    futures.append(
-                        executor.submit(
-                            self._preprocess_disturbance_partition,
-                            preprocessor,
-                            partition,
-                            processed_disturbances,
-                        )
-                    )
+                futures = {
+                    executor.submit(_process_partition_batch, batch): len(batch)
+                    for batch in self._batch_partitions(partitions, workers)
+                }
 
                 with tqdm(
                     desc="Extending disturbances",
-                    total=len(futures)
+                    total=len(partitions)
                 ) as pbar:
                     for future_result in as_completed(futures):
-                        err = future_result.result()
-                        if err:
-                            raise ValueError(err)
-                        pbar.update()
+                        partition_times.extend(
+                            self._check_batch_result(future_result.result())
+                        )
+                        pbar.update(futures[future_result])
+
+        self._write_partition_profile(partition_times)
 
         max_disturbance_year = int(
             processed_disturbances.read_polars().select("year").max().collect().item()
@@ -155,17 +240,51 @@ class DisturbanceExtender:
             else:
                 cbm4_config.pop("cache", None)
 
-    def _preprocess_disturbance_partition(
-        self,
-        preprocessor: GCBMDisturbancePreprocessor,
-        partition: dict[str, Any],
-        out_dataset: RasterIndexedDataset,
-    ):
-        try:
-            preprocessor.process_partition(0, partition, out_dataset)
-            return ""
-        except Exception:
-            return format_exc()
+    def _batch_partitions(
+        self, partitions: list[dict[str, Any]], workers: int
+    ) -> list[list[dict[str, Any]]]:
+        # Aim for a few batches per worker: enough to balance uneven partitions
+        # without paying task overhead for every small one.
+        batch_size = max(1, len(partitions) // (workers * self._batches_per_worker))
+        return [
+            partitions[i:i + batch_size]
+            for i in range(0, len(partitions), batch_size)
+        ]
+
+    def _check_batch_result(
+        self, batch_result: list[tuple[dict[str, Any], float, str]]
+    ) -> list[list[Any]]:
+        partition_times = []
+        for partition, time_elapsed, err in batch_result:
+            if err:
+                raise ValueError(err)
+
+            partition_name = "_".join((f"{k}_{v}" for k, v in partition.items()))
+            partition_times.append([f"partition_{partition_name}", time_elapsed])
+
+        return partition_times
+
+    def _write_partition_profile(self, partition_times: list[list[Any]]):
+        if not partition_times:
+            return
+
+        time_profiling = pd.DataFrame(
+            columns=["task", "time_elapsed"], data=partition_times
+        )
+
+        slowest = time_profiling.loc[time_profiling["time_elapsed"].idxmax()]
+        logging.info(
+            f"Processed {len(time_profiling)} partitions in "
+            f"{time_profiling['time_elapsed'].sum():.1f}s total; slowest: "
+            f"{slowest['task']} ({slowest['time_elapsed']:.1f}s)"
+        )
+
+        time_profiling.to_csv(
+            Path(self._cbm4_project.config_path).absolute().parent.joinpath(
+                "extend_profiling.csv"
+            ),
+            index=False,
+        )
 
     def _tile_disturbances(
         self,
@@ -185,9 +304,9 @@ class DisturbanceExtender:
             disturbance_config, classifiers, input_db
         )
 
-        mgr = SharedTransitionRuleManager()
+        mgr = SharedTransitionRuleRegistry()
         mgr.start()
-        rule_manager = mgr.TransitionRuleManager()
+        rule_manager = TransitionRuleRegistry(mgr.TransitionRuleIndex())
         with cleanup():
             logging.info("Starting up tiler...")
             bbox_path = str(self._cbm4_project.extract_bounding_box())
@@ -296,7 +415,7 @@ class DisturbanceExtender:
             ),
             "disturbance",
             "local_storage",
-            str(Path(self._temp_dir.name).joinpath("merged_extended_disturbances")),
+            str(self._merged_disturbances_path),
             creation_options={
                 "chunk_options": {
                     "chunk_x_size_max": datasets[0].chunks[0].x_size,
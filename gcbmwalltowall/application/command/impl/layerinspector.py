@@ -0,0 +1,352 @@
+from __future__ import annotations
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+from mojadata.util import gdal, ogr, osr
+from gcbmwalltowall.component.classifier import Classifier
+from gcbmwalltowall.component.disturbance import Disturbance
+from gcbmwalltowall.component.layer import DefaultLayer, Layer
+from gcbmwalltowall.component.project import Project
+from gcbmwalltowall.component.vectorattributetable import VectorAttributeTable
+
+# Pixel size of the tiler's output for layers with an attribute table.
+_attribute_table_bytes_per_pixel = 4
+
+
+@dataclass
+class LayerInspection:
+    name: str
+    kind: str
+    path: str = None
+    layer_format: str = None
+    crs: str = None
+    extent: tuple[float, float, float, float] = None
+    resolution: float = None
+    size: int = None
+    nodata: Any = None
+    attributes: dict[str, int] = field(default_factory=dict)
+    years: tuple[int, int] = None
+    est_tiled_pixels: int = None
+    est_memory_MB: float = None
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+    columns = [
+        "name", "kind", "path", "format", "crs", "extent", "resolution", "size",
+        "nodata", "attribute_values", "years", "est_tiled_pixels",
+        "est_memory_MB", "errors", "warnings",
+    ]
+
+    def to_row(self) -> list[Any]:
+        return [
+            self.name, self.kind, self.path, self.layer_format, self.crs,
+            " ".join(f"{v:g}" for v in self.extent) if self.extent else None,
+            self.resolution, self.size, self.nodata,
+            "; ".join(f"{k}={v}" for k, v in self.attributes.items()),
+            "-".join(str(y) for y in self.years) if self.years else None,
+            self.est_tiled_pixels, self.est_memory_MB,
+            "; ".join(self.errors), "; ".join(self.warnings),
+        ]
+
+
+class LayerInspector:
+    """Reads the metadata of every input layer in a project - bounding box,
+    general layers, classifiers and each file matching a disturbance pattern -
+    without tiling anything, to catch configuration problems up front and
+    estimate the size of the tiling job. Layers are inspected in parallel.
+
+    Size is the pixel count of a raster or the feature count of a vector, and
+    the tiling estimates are for the part of the layer overlapping the
+    bounding box at the project's resolution.
+
+    Args:
+        project (Project): the project to inspect
+        max_workers (int, optional): the number of layers to inspect at once;
+            defaults to the number of CPUs
+    """
+
+    def __init__(self, project: Project, max_workers: int = None):
+        self.project = project
+        self.max_workers = max_workers or os.cpu_count()
+        self._target_srs = None
+        self._target_extent = None
+
+    def inspect(self) -> list[LayerInspection]:
+        bounding_box = self.project.bounding_box
+        self._target_srs = self._make_srs(bounding_box.epsg)
+        bbox_inspection = self._inspect_layer("bounding_box", bounding_box.layer)
+        if bbox_inspection.extent and bbox_inspection.crs:
+            self._target_extent = self._transform_extent(
+                bbox_inspection.extent, self._get_srs(bounding_box.layer)
+            )
+
+        self._estimate(bbox_inspection, bounding_box.layer)
+
+        targets = [("layer", layer, None) for layer in self.project.layers]
+        targets.extend(
+            ("classifier", classifier.layer, None)
+            for classifier in self.project.classifiers
+            if isinstance(classifier, Classifier)
+        )
+
+        inspections = [bbox_inspection]
+        for disturbance in self.project.disturbances or []:
+            layer_sources = disturbance.find_layer_sources()
+            if not layer_sources:
+                inspections.append(LayerInspection(
+                    disturbance.name or disturbance.pattern.name, "disturbance",
+                    str(disturbance.pattern),
+                    errors=[f"no files match pattern {disturbance.pattern}"],
+                ))
+
+            targets.extend(
+                ("disturbance", disturbance.make_layer(*layer_source), disturbance)
+                for layer_source in layer_sources
+            )
+
+        with _concurrent_inspection(self.max_workers):
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                inspections.extend(pool.map(lambda target: self._inspect(*target), targets))
+
+        return inspections
+
+    def _inspect(self, kind: str, layer: Layer, disturbance: Disturbance = None) -> LayerInspection:
+        inspection = self._inspect_layer(kind, layer, disturbance)
+        try:
+            self._estimate(inspection, layer)
+        except (Exception, SystemExit) as e:
+            inspection.warnings.append(f"unable to estimate tiling cost: {e}")
+
+        return inspection
+
+    def _inspect_layer(
+        self, kind: str, layer: Layer, disturbance: Disturbance = None
+    ) -> LayerInspection:
+        if isinstance(layer, DefaultLayer):
+            return LayerInspection(layer.name, kind, layer_format="default")
+
+        inspection = LayerInspection(layer.name, kind, str(layer.path))
+        try:
+            if not layer.path.exists():
+                inspection.errors.append("file not found")
+                return inspection
+
+            if layer.is_raster:
+                self._read_raster_metadata(inspection, layer)
+            elif layer.is_vector:
+                self._read_vector_metadata(inspection, layer)
+            else:
+                inspection.errors.append(f"unsupported format: {layer.path.suffix}")
+                return inspection
+
+            attribute_table = self._read_attribute_table(inspection, layer, disturbance)
+            if disturbance and attribute_table is not None:
+                self._read_disturbance_info(inspection, layer, disturbance, attribute_table)
+        except (Exception, SystemExit) as e:
+            # Some layer code exits on bad input; that's an error in this
+            # layer rather than a reason to stop inspecting.
+            inspection.errors.append(str(e))
+
+        return inspection
+
+    def _read_raster_metadata(self, inspection: LayerInspection, layer: Layer):
+        ds = gdal.Open(str(layer.path))
+        if ds is None:
+            raise IOError(f"unable to open {layer.path}")
+
+        x_min, x_res, _, y_max, _, y_res = ds.GetGeoTransform()
+        band = ds.GetRasterBand(1)
+        inspection.layer_format = ds.GetDriver().ShortName
+        inspection.crs = self._describe_srs(ds.GetSpatialRef())
+        inspection.extent = (
+            x_min, y_max + y_res * ds.RasterYSize, x_min + x_res * ds.RasterXSize, y_max
+        )
+        inspection.resolution = abs(x_res)
+        inspection.size = ds.RasterXSize * ds.RasterYSize
+        inspection.nodata = band.GetNoDataValue()
+        if inspection.nodata is None:
+            inspection.warnings.append("no nodata value set")
+
+    def _read_vector_metadata(self, inspection: LayerInspection, layer: Layer):
+        ds = ogr.Open(str(layer.path))
+        if ds is None:
+            raise IOError(f"unable to open {layer.path}")
+
+        lyr = ds.GetLayerByName(layer.layer) if layer.layer else ds.GetLayer(0)
+        if lyr is None:
+            raise IOError(f"layer {layer.layer or 0} not found in {layer.path}")
+
+        x_min, x_max, y_min, y_max = lyr.GetExtent()
+        inspection.layer_format = ds.GetDriver().GetName()
+        inspection.crs = self._describe_srs(lyr.GetSpatialRef())
+        inspection.extent = (x_min, y_min, x_max, y_max)
+        inspection.size = lyr.GetFeatureCount()
+        if inspection.size == 0:
+            inspection.warnings.append("no features")
+
+    def _read_attribute_table(
+        self, inspection: LayerInspection, layer: Layer, disturbance: Disturbance = None
+    ) -> dict[str, list[Any]] | None:
+        try:
+            if disturbance:
+                # Disturbances infer their year and type from all attributes.
+                attribute_table = layer.attribute_table
+            else:
+                lookup_table = layer._load_lookup_table()
+                if lookup_table is None:
+                    return None
+
+                attributes = layer.attributes
+                if not attributes and layer.is_vector:
+                    attributes = [
+                        layer.name if layer.name in lookup_table.attributes
+                        else lookup_table.attributes[0]
+                    ]
+
+                attribute_table = lookup_table.get_unique_values(attributes)
+        except KeyError as e:
+            inspection.errors.append(f"attribute not found: {e}")
+            return None
+
+        inspection.attributes = {
+            attribute: len(values) for attribute, values in attribute_table.items()
+        }
+
+        return attribute_table
+
+    def _read_disturbance_info(
+        self,
+        inspection: LayerInspection,
+        layer: Layer,
+        disturbance: Disturbance,
+        attribute_table: dict[str, list[Any]],
+    ):
+        year, disturbance_type = disturbance.get_year_and_type(layer.path, attribute_table)
+        years = (
+            [int(float(v)) for v in attribute_table[year] if v is not None]
+            if year in attribute_table else [int(float(year))]
+        )
+
+        if years:
+            inspection.years = (min(years), max(years))
+
+        if disturbance_type not in attribute_table:
+            inspection.attributes["disturbance_type"] = 1
+
+    def _estimate(self, inspection: LayerInspection, layer: Layer):
+        if not inspection.extent or not inspection.crs or self._target_srs is None:
+            return
+
+        layer_srs = self._get_srs(layer)
+        if not layer_srs.IsSame(self._target_srs):
+            inspection.warnings.append(
+                "CRS differs from bounding box; will be reprojected"
+            )
+
+        extent = self._transform_extent(inspection.extent, layer_srs)
+        if self._target_extent:
+            extent = (
+                max(extent[0], self._target_extent[0]),
+                max(extent[1], self._target_extent[1]),
+                min(extent[2], self._target_extent[2]),
+                min(extent[3], self._target_extent[3]),
+            )
+
+        if extent[0] >= extent[2] or extent[1] >= extent[3]:
+            inspection.warnings.append("does not overlap the bounding box")
+            inspection.est_tiled_pixels = 0
+            inspection.est_memory_MB = 0
+            return
+
+        resolution = self.project.bounding_box.resolution
+        inspection.est_tiled_pixels = int(
+            (extent[2] - extent[0]) / resolution * (extent[3] - extent[1]) / resolution
+        )
+
+        bytes_per_pixel = _attribute_table_bytes_per_pixel
+        if layer.is_raster:
+            band = gdal.Open(str(layer.path)).GetRasterBand(1)
+            bytes_per_pixel = max(1, gdal.GetDataTypeSize(band.DataType) // 8)
+
+        inspection.est_memory_MB = round(inspection.est_tiled_pixels * bytes_per_pixel / 1e6, 1)
+
+    def _get_srs(self, layer: Layer) -> osr.SpatialReference:
+        if layer.is_raster:
+            srs = gdal.Open(str(layer.path)).GetSpatialRef()
+        else:
+            ds = ogr.Open(str(layer.path))
+            lyr = ds.GetLayerByName(layer.layer) if layer.layer else ds.GetLayer(0)
+            srs = lyr.GetSpatialRef()
+
+        srs = srs.Clone()
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        return srs
+
+    def _make_srs(self, epsg: int) -> osr.SpatialReference:
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(int(epsg))
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        return srs
+
+    def _transform_extent(
+        self, extent: tuple[float, float, float, float], srs: osr.SpatialReference
+    ) -> tuple[float, float, float, float]:
+        if srs.IsSame(self._target_srs):
+            return extent
+
+        transform = osr.CoordinateTransformation(srs, self._target_srs)
+
+        return tuple(transform.TransformBounds(*extent, 21))
+
+    def _describe_srs(self, srs: osr.SpatialReference) -> str | None:
+        if srs is None:
+            return None
+
+        authority = srs.GetAuthorityName(None)
+        code = srs.GetAuthorityCode(None)
+
+        return f"{authority}:{code}" if authority and code else srs.GetName()
+
+
+def summarize(inspections: list[LayerInspection], workers: int) -> dict[str, Any]:
+    """Summarize an inspection for logging.
+
+    Returns:
+        dict: layer, error and warning counts, the total estimated tiled
+            pixels, and the estimated peak memory when tiling the largest
+            layers concurrently with the specified number of workers
+    """
+    memory = sorted((i.est_memory_MB or 0 for i in inspections), reverse=True)
+
+    return {
+        "layers": len(inspections),
+        "errors": sum(len(i.errors) for i in inspections),
+        "warnings": sum(len(i.warnings) for i in inspections),
+        "est_tiled_pixels": sum(i.est_tiled_pixels or 0 for i in inspections),
+        "est_peak_memory_MB": round(sum(memory[:workers]), 1),
+    }
+
+
+@contextmanager
+def _concurrent_inspection(max_workers: int):
+    # Each inspection thread reading an attribute table would otherwise start
+    # a process per CPU, and toggle OGR's global exception mode while other
+    # threads are using it.
+    if max_workers <= 1:
+        yield
+        return
+
+    attribute_table_workers = VectorAttributeTable.max_workers
+    use_exceptions = ogr.GetUseExceptions()
+    VectorAttributeTable.max_workers = 1
+    ogr.UseExceptions()
+    try:
+        yield
+    finally:
+        VectorAttributeTable.max_workers = attribute_table_workers
+        if not use_exceptions:
+            ogr.DontUseExceptions()
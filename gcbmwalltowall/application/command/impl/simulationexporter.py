@@ -0,0 +1,246 @@
+from __future__ import annotations
+import logging
+import shutil
+from collections import defaultdict
+from typing import TYPE_CHECKING, Iterable, Iterator
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from gcbmwalltowall.util.path import Path
+
+if TYPE_CHECKING:
+    from gcbmwalltowall.application.command.impl.cbm4project import CBM4Project
+
+pixel_keys = ["chunk_index", "index", "cohort_index"]
+
+boundary_columns = ["admin_boundary", "eco_boundary"]
+
+variable_prefixes = ("pools.", "flux.")
+
+geotiff_dtype = np.float32
+
+geotiff_nodata = float(np.finfo(geotiff_dtype).min)
+
+
+class SimulationExporter:
+    """Exports the results of a CBM4 run from its simulation dataset, one
+    chunk at a time so that memory use depends on the chunk size and the
+    number of reporting categories rather than the size of the landscape.
+
+    Results are aggregated by year, the reporting classifiers and the admin
+    and eco boundaries (where the inventory has them) and written as Parquet
+    partitioned by year:
+
+        <output_path>/aggregates/year=<year>/part-0.parquet
+
+    Selected variables can also be exported as GeoTIFFs, one per year:
+
+        <output_path>/geotiff/<variable>_<year>.tiff
+
+    Args:
+        cbm4_project (CBM4Project): the project to export
+        reporting_classifiers (list of str, optional): the classifiers to
+            aggregate by; defaults to all of the project's classifiers
+        variables (list of str, optional): the simulation columns to
+            aggregate; defaults to every pool, flux and area column
+    """
+
+    def __init__(
+        self,
+        cbm4_project: CBM4Project,
+        reporting_classifiers: list[str] = None,
+        variables: list[str] = None,
+    ):
+        self._project = cbm4_project
+        self._simulation_ds = cbm4_project.simulation_dataset
+        self._reporting_classifiers = (
+            reporting_classifiers if reporting_classifiers is not None
+            else cbm4_project.classifier_names
+        )
+        self._variables = variables
+
+    def export_aggregates(self, output_path: str | Path) -> Path:
+        """Aggregate the simulation results and write them as partitioned
+        Parquet.
+
+        Returns:
+            Path: the root of the partitioned Parquet dataset
+        """
+        aggregate_path = Path(output_path).joinpath("aggregates")
+        shutil.rmtree(aggregate_path, True)
+
+        partitions = self._get_partitions_by_chunk()
+        group_columns = None
+        totals = defaultdict(lambda: None)
+        for chunk_index, timesteps in tqdm(partitions.items(), desc="Aggregating chunks"):
+            # Inventory attributes don't change over time, so each chunk's are
+            # read once and joined to every timestep of its results.
+            attributes = self._read_chunk_attributes(chunk_index)
+            group_columns = [c for c in attributes.columns if c not in pixel_keys]
+            for timestep in timesteps:
+                results = self._simulation_ds.read_pandas(
+                    filters=[["chunk_index", "=", chunk_index], ["timestep", "=", timestep]]
+                )
+
+                if results.empty:
+                    continue
+
+                variables = self._variables or select_variables(results.columns)
+                join_keys = [k for k in pixel_keys if k in results.columns]
+                totals[timestep] = combine(
+                    totals[timestep],
+                    aggregate(
+                        results[join_keys + variables].merge(attributes, on=join_keys),
+                        group_columns, variables,
+                    ),
+                )
+
+        for timestep, total in sorted(totals.items()):
+            year = self._project.t0_year + timestep
+            partition_path = aggregate_path.joinpath(f"year={year}")
+            partition_path.mkdir(parents=True)
+            total.reset_index(drop=not group_columns).to_parquet(
+                partition_path.joinpath("part-0.parquet"), index=False
+            )
+
+        logging.info(f"Exported {len(totals)} years of results to {aggregate_path}")
+
+        return aggregate_path
+
+    def export_geotiffs(
+        self, output_path: str | Path, variables: list[str], years: Iterable[int] = None
+    ) -> list[Path]:
+        """Export selected variables as GeoTIFFs summed over each pixel's
+        cohorts, reusing the inventory's raster index. Each chunk's results are
+        written into its window of the GeoTIFFs as soon as they're read.
+
+        Args:
+            years (list of int, optional): the years to export; defaults to
+                every simulated year
+
+        Returns:
+            list of Path: the GeoTIFFs written
+        """
+        from gcbmwalltowall.util.gdalhelpers import create_empty_raster, gdal_creation_options
+        from gcbmwalltowall.util.rastersession import RasterSession
+
+        geotiff_path = Path(output_path).joinpath("geotiff")
+        geotiff_path.mkdir(parents=True, exist_ok=True)
+        inventory_ds = self._project.inventory_dataset
+        partitions = self._get_partitions_by_chunk()
+        if years is None:
+            years = [
+                self._project.t0_year + timestep
+                for timestep in sorted(set().union(*partitions.values()))
+            ]
+
+        # The chunk raster covers the inventory's extent, so it's the template
+        # for every GeoTIFF.
+        template_path = self._project.extract_chunk_raster()
+
+        outputs = []
+        for year in years:
+            timestep = year - self._project.t0_year
+            year_outputs = {v: geotiff_path.joinpath(f"{v}_{year}.tiff") for v in variables}
+            for path in year_outputs.values():
+                create_empty_raster(
+                    template_path, path, "GTiff", data_type=geotiff_dtype,
+                    nodata=geotiff_nodata, options=gdal_creation_options,
+                )
+
+            with RasterSession(prefetch=False) as session:
+                for chunk_index, timesteps in partitions.items():
+                    if timestep not in timesteps:
+                        continue
+
+                    chunk_filter = [["chunk_index", "=", chunk_index]]
+                    results = self._simulation_ds.read_pandas(
+                        filters=chunk_filter + [["timestep", "=", timestep]]
+                    )
+
+                    if results.empty:
+                        continue
+
+                    raster_index = inventory_ds.read_pandas(
+                        inventory_ds.raster_index_table_name, filters=chunk_filter
+                    )
+
+                    join_keys = [k for k in pixel_keys if k in results.columns]
+                    pixel_data = (
+                        results[join_keys + variables]
+                        .merge(raster_index[join_keys + ["raster_index"]], on=join_keys)
+                        .groupby("raster_index")[variables]
+                        .sum()
+                        .reset_index()
+                    )
+
+                    chunk = inventory_ds.chunks[chunk_index]
+                    for variable, data in rasterize_chunk(
+                        pixel_data, variables, chunk.x_size, chunk.y_size
+                    ):
+                        session.write(
+                            str(year_outputs[variable]), data, chunk.x_off, chunk.y_off
+                        )
+
+            outputs.extend(year_outputs.values())
+
+        return outputs
+
+    def _get_partitions_by_chunk(self) -> dict[int, list[int]]:
+        partitions = defaultdict(set)
+        for partition in self._simulation_ds.get_partition_values():
+            partitions[partition["chunk_index"]].add(partition["timestep"])
+
+        return {chunk: sorted(timesteps) for chunk, timesteps in sorted(partitions.items())}
+
+    def _read_chunk_attributes(self, chunk_index: int) -> pd.DataFrame:
+        inventory_ds = self._project.inventory_dataset
+        available_layers = set(inventory_ds.get_layer_names())
+        attribute_columns = [
+            c for c in self._reporting_classifiers + boundary_columns
+            if c in available_layers
+        ]
+
+        return inventory_ds.read_pandas(
+            filters=[["chunk_index", "=", chunk_index]],
+            read_cols=pixel_keys + attribute_columns,
+        )
+
+
+def select_variables(columns: Iterable[str]) -> list[str]:
+    """Find the pool, flux and area columns in a set of simulation results."""
+    return [
+        c for c in columns
+        if c.startswith(variable_prefixes) or c == "area" or c.endswith(".area")
+    ]
+
+
+def aggregate(data: pd.DataFrame, group_columns: list[str], variables: list[str]) -> pd.DataFrame:
+    """Sum the variables by the group columns."""
+    if not group_columns:
+        return data[variables].sum().to_frame().T
+
+    return data.groupby(group_columns, dropna=False)[variables].sum()
+
+
+def rasterize_chunk(
+    pixel_data: pd.DataFrame, variables: list[str], x_size: int, y_size: int
+) -> Iterator[tuple[str, np.ndarray]]:
+    """Lay out a chunk's results as rasters of the chunk's window, one variable
+    at a time. Each pixel's raster_index is its offset from the upper left
+    corner of the chunk in row-major order; pixels without results are
+    nodata.
+    """
+    raster_index = pixel_data["raster_index"].to_numpy()
+    for variable in variables:
+        data = np.full(x_size * y_size, geotiff_nodata, dtype=geotiff_dtype)
+        data[raster_index] = pixel_data[variable].to_numpy()
+        yield variable, data.reshape(y_size, x_size)
+
+
+def combine(total: pd.DataFrame | None, partial: pd.DataFrame) -> pd.DataFrame:
+    """Add a chunk's aggregated results to the running total."""
+    if total is None:
+        return partial
+
+    return total.add(partial, fill_value=0)
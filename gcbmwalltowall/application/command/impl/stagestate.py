@@ -0,0 +1,77 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import pickle
+import shutil
+from typing import Any, Callable
+from gcbmwalltowall.util.path import Path
+
+
+class StageState:
+    """Tracks which stages of a long-running command have completed so that a
+    rerun after a failure can resume from the first incomplete stage. Each
+    completed stage leaves a marker file, and any stage result needed by later
+    stages is pickled alongside it. All state is discarded if the command's
+    inputs (described by the fingerprint) change.
+
+    Args:
+        state_path (str): directory to keep the state in
+        fingerprint (dict): json-serializable description of the inputs; a
+            rerun only resumes if this matches the previous run's
+        resume (bool, optional): set to False to discard any previous state
+            and start over. Defaults to True.
+    """
+
+    def __init__(self, state_path: str | Path, fingerprint: dict[str, Any], resume: bool = True):
+        self.path = Path(state_path).absolute()
+        self._fingerprint = hashlib.sha256(
+            json.dumps(fingerprint, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        fingerprint_path = self.path.joinpath("fingerprint")
+        previous_fingerprint = (
+            fingerprint_path.read_text() if fingerprint_path.exists() else None
+        )
+
+        if not resume or previous_fingerprint != self._fingerprint:
+            if previous_fingerprint:
+                logging.info(f"Discarding previous state in {self.path}")
+
+            shutil.rmtree(self.path, ignore_errors=True)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        fingerprint_path.write_text(self._fingerprint)
+
+    def is_complete(self, stage: str) -> bool:
+        return self.path.joinpath(f"{stage}.done").exists()
+
+    def run(self, stage: str, fn: Callable[[], Any]) -> Any:
+        """Run a stage unless it has already completed, in which case its saved
+        result is returned instead.
+
+        Args:
+            stage (str): name of the stage
+            fn (callable): runs the stage and returns its result, which must be
+                picklable
+
+        Returns:
+            the stage result
+        """
+        result_path = self.path.joinpath(f"{stage}.pkl")
+        if self.is_complete(stage):
+            logging.info(f"Skipping completed stage: {stage}")
+            with open(result_path, "rb") as result_file:
+                return pickle.load(result_file)
+
+        result = fn()
+        with open(result_path, "wb") as result_file:
+            pickle.dump(result, result_file)
+
+        self.path.joinpath(f"{stage}.done").touch()
+
+        return result
+
+    def clear(self):
+        """Discard all state once the command has finished."""
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import logging
+import sys
+from argparse import Namespace
+from dataclasses import dataclass
+from typing import Any
+from gcbmwalltowall.configuration.configuration import Configuration
+from gcbmwalltowall.project.projectfactory import ProjectFactory
+from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.application.command.argbase import ArgBase
+from gcbmwalltowall.application.command.impl.layerinspector import (
+    LayerInspection, LayerInspector, summarize
+)
+
+
+@dataclass
+class InspectArgs(ArgBase):
+    config_path: str
+    output_path: str
+    max_workers: int
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]):
+        return cls(
+            config_path=d["config_path"],
+            output_path=d.get("output_path", None),
+            max_workers=d.get("max_workers", None),
+        )
+
+    @classmethod
+    def from_namespace(cls, ns: Namespace):
+        return cls(
+            config_path=ns.config_path,
+            output_path=getattr(ns, "output_path", None),
+            max_workers=getattr(ns, "max_workers", None),
+        )
+
+
+def inspect(args: InspectArgs | dict):
+    import pandas as pd
+
+    args = args if isinstance(args, InspectArgs) else InspectArgs.from_dict(args)
+    try:
+        config = Configuration.load(args.config_path)
+        project = ProjectFactory().create(config)
+    except Exception as e:
+        logging.fatal(f"Error loading {args.config_path}: {e}")
+        sys.exit("Fatal error loading project configuration")
+
+    logging.info(f"Inspecting {project.name}")
+    inspector = LayerInspector(project, args.max_workers)
+    inspections = inspector.inspect()
+
+    report = pd.DataFrame(
+        columns=LayerInspection.columns,
+        data=[inspection.to_row() for inspection in inspections],
+    )
+
+    report_path = Path(args.output_path or ".").absolute().joinpath("inspection.csv")
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(report_path, index=False)
+
+    for inspection in inspections:
+        for error in inspection.errors:
+            logging.error(f"{inspection.name}: {error}")
+
+        for warning in inspection.warnings:
+            logging.warning(f"{inspection.name}: {warning}")
+
+    summary = summarize(inspections, config.get("max_workers") or inspector.max_workers)
+    logging.info(
+        f"Inspected {summary['layers']} layers: {summary['errors']} errors, "
+        f"{summary['warnings']} warnings, ~{summary['est_tiled_pixels']:,} tiled pixels, "
+        f"~{summary['est_peak_memory_MB']:,.0f} MB peak tiling memory; "
+        f"details in {report_path}"
+    )
+
+    if summary["errors"]:
+        sys.exit(f"Inspection found {summary['errors']} configuration errors")
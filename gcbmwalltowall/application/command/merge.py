@@ -2,19 +2,23 @@ from __future__ import annotations
 import logging
 import shutil
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from tempfile import TemporaryDirectory
+from functools import partial
 from typing import Any
-from psutil import virtual_memory
 from spatial_inventory_rollback.gcbm.merge import gcbm_merge, gcbm_merge_tile
 from spatial_inventory_rollback.gcbm.merge.gcbm_merge_input_db import (
     replace_direct_attached_transition_rules,
 )
 from gcbmwalltowall.component.preparedproject import PreparedProject
+from gcbmwalltowall.component.resumablepassthroughtiler import ResumablePassthroughTiler2D
 from gcbmwalltowall.configuration.configuration import Configuration
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resources import ResourceGovernor
 from gcbmwalltowall.application.command.argbase import ArgBase
+from gcbmwalltowall.application.command.impl.stagestate import StageState
 
 
 @dataclass
@@ -25,6 +29,7 @@ class MergeArgs(ArgBase):
     include_index_layer: bool
     max_mem_gb: int
     tempdir: str
+    resume: bool
 
     @classmethod
     def from_dict(cls, d: dict[str, Any]):
@@ -35,6 +40,7 @@ class MergeArgs(ArgBase):
             include_index_layer=d["include_index_layer"],
             max_mem_gb=d.get("max_mem_gb", None),
             tempdir=d.get("tempdir", None),
+            resume=d.get("resume", True),
         )
 
     @classmethod
@@ -46,58 +52,118 @@ class MergeArgs(ArgBase):
             include_index_layer=ns.include_index_layer,
             max_mem_gb=getattr(ns, "max_mem_gb", None),
             tempdir=getattr(ns, "tempdir", None),
+            resume=getattr(ns, "resume", True),
         )
 
 
 def merge(args: MergeArgs | dict):
     args = args if isinstance(args, MergeArgs) else MergeArgs.from_dict(args)
-    with TemporaryDirectory() as tmp:
-        projects = [PreparedProject(path) for path in args.project_paths]
-        logging.info(
-            "Merging projects:\n{}".format("\n".join((str(p.path) for p in projects)))
-        )
-        inventories = [
-            project.prepare_merge(tmp, i) for i, project in enumerate(projects)
-        ]
-
-        output_path = Path(args.output_path)
-        merged_output_path = output_path.joinpath("layers", "merged")
-        tiled_output_path = output_path.joinpath("layers", "tiled")
-        db_output_path = output_path.joinpath("input_database")
-
-        shutil.rmtree(merged_output_path, ignore_errors=True)
-
-        start_year = min((project.start_year for project in projects))
-        end_year = max((project.end_year for project in projects))
-
-        max_mem_gb = args.max_mem_gb or (virtual_memory().available * 0.75 // 1024**3)
-        memory_limit = int(max_mem_gb * 1024)
-        merged_data = gcbm_merge.merge(
-            inventories,
-            str(merged_output_path),
-            str(db_output_path),
-            start_year,
-            memory_limit_MB=memory_limit,
-        )
+    projects = [PreparedProject(path) for path in args.project_paths]
+    logging.info(
+        "Merging projects:\n{}".format("\n".join((str(p.path) for p in projects)))
+    )
 
-        gcbm_merge_tile.tile(
-            str(tiled_output_path), merged_data, inventories, args.include_index_layer
-        )
+    output_path = Path(args.output_path)
+    merged_output_path = output_path.joinpath("layers", "merged")
+    tiled_output_path = output_path.joinpath("layers", "tiled")
+    db_output_path = output_path.joinpath("input_database")
 
-        replace_direct_attached_transition_rules(
-            str(db_output_path.joinpath("gcbm_input.db")),
-            str(tiled_output_path.joinpath("transition_rules.csv")),
-        )
+    # Each stage is recorded as it completes so that a rerun with the same
+    # inputs after a failure picks up where the previous run stopped.
+    state = StageState(
+        output_path.joinpath(".merge_state"),
+        _get_fingerprint(args, projects),
+        args.resume,
+    )
 
-        config = Configuration.load(args.config_path, args.output_path)
-        configurer = GCBMConfigurer(
-            [str(tiled_output_path)],
-            config.gcbm_template_path,
-            str(db_output_path.joinpath("gcbm_input.db")),
-            str(output_path.joinpath("gcbm_project")),
-            start_year,
-            end_year,
-            config.gcbm_disturbance_order,
-        )
+    staging_path = state.path.joinpath("staging")
+
+    def stage_inputs():
+        shutil.rmtree(staging_path, ignore_errors=True)
+        staging_path.mkdir()
+        with ThreadPoolExecutor() as pool:
+            return list(pool.map(
+                lambda i: projects[i].prepare_merge(staging_path, i),
+                range(len(projects))
+            ))
+
+    inventories = state.run("stage", stage_inputs)
+
+    start_year = min((project.start_year for project in projects))
+    end_year = max((project.end_year for project in projects))
+
+    with ResourceGovernor.get().lease("merge", memory_gb=args.max_mem_gb) as lease:
+
+        def merge_inventories():
+            shutil.rmtree(merged_output_path, ignore_errors=True)
+            return gcbm_merge.merge(
+                inventories,
+                str(merged_output_path),
+                str(db_output_path),
+                start_year,
+                memory_limit_MB=lease.memory_mb,
+            )
+
+        def tile_inventories():
+            # Each merged layer is recorded as it's tiled, so a rerun after a
+            # failure part way through only tiles the remaining layers.
+            with _resumable_tiling(state.path.joinpath("tiled_layers")):
+                return gcbm_merge_tile.tile(
+                    str(tiled_output_path), merged_data, inventories, args.include_index_layer
+                )
+
+        merged_data = state.run("merge", merge_inventories)
+        state.run("tile", tile_inventories)
+
+    state.run("rules", lambda: replace_direct_attached_transition_rules(
+        str(db_output_path.joinpath("gcbm_input.db")),
+        str(tiled_output_path.joinpath("transition_rules.csv")),
+    ))
+
+    config = Configuration.load(args.config_path, args.output_path)
+    configurer = GCBMConfigurer(
+        [str(tiled_output_path)],
+        config.gcbm_template_path,
+        str(db_output_path.joinpath("gcbm_input.db")),
+        str(output_path.joinpath("gcbm_project")),
+        start_year,
+        end_year,
+        config.gcbm_disturbance_order,
+    )
+
+    configurer.configure()
+    state.clear()
+
+
+@contextmanager
+def _resumable_tiling(checkpoint_path: Path):
+    # gcbm_merge_tile creates its own passthrough tiler, so a checkpointing one
+    # is swapped in for the duration of the tile stage.
+    tiler = gcbm_merge_tile.PassthroughGdalTiler2D
+    gcbm_merge_tile.PassthroughGdalTiler2D = partial(
+        ResumablePassthroughTiler2D, checkpoint_path=checkpoint_path
+    )
+
+    try:
+        yield
+    finally:
+        gcbm_merge_tile.PassthroughGdalTiler2D = tiler
+
+
+def _get_fingerprint(args: MergeArgs, projects: list[PreparedProject]) -> dict[str, Any]:
+    # Changes to any project's layers or databases invalidate earlier progress.
+    project_files = []
+    for project in projects:
+        for path in (
+            project.tiled_layer_path.joinpath("study_area.json"),
+            project.rollback_layer_path.joinpath("study_area.json"),
+            project.input_db_path,
+            project.rollback_db_path,
+        ):
+            if path.exists():
+                project_files.append([str(path), path.stat().st_mtime_ns])
 
-        configurer.configure()
+    return {
+        "project_files": project_files,
+        "include_index_layer": args.include_index_layer,
+    }
@@ -14,6 +14,7 @@ class PrepareArgs(ArgBase):
     output_path: str
     max_workers: int
     max_mem_gb: int
+    shards: int
 
     @classmethod
     def from_dict(cls, d: dict[str, Any]):
@@ -22,6 +23,7 @@ class PrepareArgs(ArgBase):
             output_path=d.get("output_path", None),
             max_workers=d.get("max_workers", None),
             max_mem_gb=d.get("max_mem_gb", None),
+            shards=d.get("shards", None),
         )
 
     @classmethod
@@ -31,6 +33,7 @@ class PrepareArgs(ArgBase):
             output_path=getattr(ns, "output_path", None),
             max_workers=getattr(ns, "max_workers", None),
             max_mem_gb=getattr(ns, "max_mem_gb", None),
+            shards=getattr(ns, "shards", None),
         )
 
 
@@ -42,7 +45,7 @@ def prepare(args: PrepareArgs | dict):
     project = ProjectFactory().create(config)
     logging.info(f"Preparing {project.name}")
 
-    project.tile()
+    project.tile(args.shards)
     project.create_input_database()
     project.run_rollback()
 
@@ -24,6 +24,22 @@ class RunArgs(ArgBase):
     max_workers: int
     engine: str
     write_parameters: bool
+    spinup_cache_path: str
+    resume: bool
+    checkpoint_interval: int
+    start_year: int
+    chunks: list[int]
+    bounding_box: list[float]
+    mask_path: str
+    classifier_filter: dict[str, str]
+    subset_path: str
+
+    @property
+    def has_subset(self) -> bool:
+        return any((
+            self.start_year, self.chunks, self.bounding_box, self.mask_path,
+            self.classifier_filter,
+        ))
 
     @classmethod
     def from_dict(cls, d: dict[str, Any]):
@@ -38,6 +54,15 @@ class RunArgs(ArgBase):
             max_workers=d.get("max_workers", None),
             engine=d.get("engine", "libcbm"),
             write_parameters=d.get("write_parameters", False),
+            spinup_cache_path=d.get("spinup_cache_path", None),
+            resume=d.get("resume", False),
+            checkpoint_interval=d.get("checkpoint_interval", 1),
+            start_year=d.get("start_year", None),
+            chunks=d.get("chunks", None),
+            bounding_box=d.get("bounding_box", None),
+            mask_path=d.get("mask_path", None),
+            classifier_filter=d.get("classifier_filter", None),
+            subset_path=d.get("subset_path", None),
         )
 
     @classmethod
@@ -53,6 +78,17 @@ class RunArgs(ArgBase):
             max_workers=getattr(ns, "max_workers", None),
             engine=getattr(ns, "engine", "libcbm"),
             write_parameters=getattr(ns, "write_parameters", False),
+            spinup_cache_path=getattr(ns, "spinup_cache_path", None),
+            resume=getattr(ns, "resume", False),
+            checkpoint_interval=getattr(ns, "checkpoint_interval", None) or 1,
+            start_year=getattr(ns, "start_year", None),
+            chunks=getattr(ns, "chunks", None),
+            bounding_box=getattr(ns, "bounding_box", None),
+            mask_path=getattr(ns, "mask_path", None),
+            classifier_filter=dict(
+                item.split("=", 1) for item in getattr(ns, "classifier_filter", None) or []
+            ) or None,
+            subset_path=getattr(ns, "subset_path", None),
         )
 
 
@@ -73,6 +109,8 @@ def run(args: RunArgs | dict):
             cbm4_config_path = Path(args.project_path).joinpath("cbm4_config.json")
             if cbm4_config_path.exists():
                 extra_kwargs: dict[str, Any] = dict()
+                if args.has_subset:
+                    cbm4_config_path = _create_subset(args, cbm4_config_path)
 
                 match args.engine:
                     case "libcbm":
@@ -93,6 +131,9 @@ def run(args: RunArgs | dict):
                     max_workers=args.max_workers,
                     write_parameters=args.write_parameters,
                     end_year=args.end_year,
+                    spinup_cache_path=args.spinup_cache_path,
+                    resume=args.resume,
+                    checkpoint_interval=args.checkpoint_interval,
                     **extra_kwargs,
                 )
             else:
@@ -147,3 +188,20 @@ def run(args: RunArgs | dict):
             subprocess.run(run_args, cwd=project.path)
 
     logging.info(f"Finished {run_type.lower()} project ({args.host}):\n{project.path}")
+
+
+def _create_subset(args: RunArgs, cbm4_config_path: Path) -> Path:
+    from gcbmwalltowall.application.command.impl.cbm4project import CBM4Project
+    from gcbmwalltowall.application.command.impl.cbm4subset import CBM4Subset
+
+    subset = CBM4Subset(CBM4Project(cbm4_config_path))
+    chunks = subset.select_chunks(
+        args.chunks, args.bounding_box, args.mask_path, args.classifier_filter
+    )
+
+    logging.info(f"Running subset of chunks: {', '.join(map(str, chunks))}")
+
+    return subset.create(
+        args.subset_path or Path(args.project_path).joinpath("subset"),
+        chunks, args.start_year, args.end_year, args.resume,
+    )
@@ -4,43 +4,77 @@ import multiprocessing as mp
 from argparse import ArgumentParser, Namespace
 from logging import FileHandler, StreamHandler
 from gcbmwalltowall.util.path import Path
-from gcbmwalltowall.application.command.convert import convert, ConvertArgs
-from gcbmwalltowall.application.command.build import build, BuildArgs
-from gcbmwalltowall.application.command.prepare import prepare, PrepareArgs
-from gcbmwalltowall.application.command.merge import merge, MergeArgs
-from gcbmwalltowall.application.command.run import run, RunArgs
-from gcbmwalltowall.application.command.clone import clone, CloneArgs
-from gcbmwalltowall.application.command.extend import extend, ExtendArgs
 
 
+# Command modules are imported by the handlers below rather than at the top of
+# this module so that --help, argument errors and light commands don't pay for
+# loading the heavy dependencies of the others.
 def _convert(args: Namespace):
+    from gcbmwalltowall.application.command.convert import convert, ConvertArgs
+
     convert(ConvertArgs.from_namespace(args))
 
 
 def _build(args: Namespace):
+    from gcbmwalltowall.application.command.build import build, BuildArgs
+
     build(BuildArgs.from_namespace(args))
 
 
 def _prepare(args: Namespace):
+    from gcbmwalltowall.application.command.prepare import prepare, PrepareArgs
+
     prepare(PrepareArgs.from_namespace(args))
 
 
 def _merge(args: Namespace):
+    from gcbmwalltowall.application.command.merge import merge, MergeArgs
+
     merge(MergeArgs.from_namespace(args))
 
 
 def _run(args: Namespace):
+    from gcbmwalltowall.application.command.run import run, RunArgs
+
     run(RunArgs.from_namespace(args))
 
 
 def _clone(args: Namespace):
+    from gcbmwalltowall.application.command.clone import clone, CloneArgs
+
     clone(CloneArgs.from_namespace(args))
 
 
 def _extend(args: Namespace):
+    from gcbmwalltowall.application.command.extend import extend, ExtendArgs
+
     extend(ExtendArgs.from_namespace(args))
 
 
+def _export(args: Namespace):
+    from gcbmwalltowall.application.command.export import export, ExportArgs
+
+    export(ExportArgs.from_namespace(args))
+
+
+def _batch(args: Namespace):
+    from gcbmwalltowall.application.command.batch import batch, BatchArgs
+
+    batch(BatchArgs.from_namespace(args))
+
+
+def _inspect(args: Namespace):
+    from gcbmwalltowall.application.command.inspect import inspect, InspectArgs
+
+    inspect(InspectArgs.from_namespace(args))
+
+
+def _benchmark(args: Namespace):
+    from gcbmwalltowall.application.command.benchmark import benchmark, BenchmarkArgs
+
+    benchmark(BenchmarkArgs.from_namespace(args))
+
+
 def cli():
     try:
         mp.set_start_method("spawn")
@@ -85,6 +119,29 @@ def cli():
     )
     prepare_parser.add_argument("--max_workers", type=int, help="max workers")
     prepare_parser.add_argument("--max_mem_gb", type=int, help="max memory (GB)")
+    prepare_parser.add_argument(
+        "--shards", type=int,
+        help="split tiling into this many groups of tiles, tiled separately and stitched",
+    )
+
+    inspect_parser = subparsers.add_parser(
+        "inspect",
+        help=(
+            "Check the layers in the project configuration for errors and estimate "
+            "the cost of tiling them, without preparing the project."
+        ),
+    )
+    inspect_parser.set_defaults(func=_inspect)
+    inspect_parser.add_argument(
+        "config_path",
+        help="path to config file containing fully-specified project configuration",
+    )
+    inspect_parser.add_argument(
+        "output_path", nargs="?", help="destination directory for the inspection report"
+    )
+    inspect_parser.add_argument(
+        "--max_workers", type=int, help="max layers to inspect at once"
+    )
 
     merge_parser = subparsers.add_parser(
         "merge", help="Merge two or more walltowall-prepared inventories together."
@@ -108,6 +165,12 @@ def cli():
         help="include merged index as reporting classifier",
     )
     merge_parser.add_argument("--max_mem_gb", type=int, help="max memory (GB)")
+    merge_parser.add_argument(
+        "--no_resume",
+        action="store_false",
+        help="start over instead of resuming a previously interrupted merge",
+        dest="resume",
+    )
 
     run_parser = subparsers.add_parser(
         "run", help="Run the specified project either locally or on the cluster."
@@ -148,6 +211,55 @@ def cli():
         action="store_true",
         help="[cbm4 only] write parameters datasets; default: false",
     )
+    run_parser.add_argument(
+        "--spinup_cache_path",
+        help=(
+            "[cbm4 only] directory to cache spinup results in, shared between runs; "
+            "default: the cbm4_config.json spinup_cache setting, if any"
+        ),
+    )
+    run_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="[cbm4 only] resume an interrupted run from its last checkpoint",
+    )
+    run_parser.add_argument(
+        "--checkpoint_interval",
+        type=int,
+        help="[cbm4 only] timesteps between checkpoints for --resume; default: 1",
+    )
+    run_parser.add_argument(
+        "--start_year",
+        type=int,
+        help=(
+            "[cbm4 only] run a subset starting from this year, using the project's "
+            "previous results for the year before"
+        ),
+    )
+    run_parser.add_argument(
+        "--chunks", type=int, nargs="+", help="[cbm4 only] run a subset of these chunks"
+    )
+    run_parser.add_argument(
+        "--bounding_box",
+        type=float,
+        nargs=4,
+        metavar=("XMIN", "YMIN", "XMAX", "YMAX"),
+        help="[cbm4 only] run a subset of the chunks within this bounding box",
+    )
+    run_parser.add_argument(
+        "--mask_path",
+        help="[cbm4 only] run a subset of the chunks under the non-zero pixels of this raster",
+    )
+    run_parser.add_argument(
+        "--classifier_filter",
+        nargs="+",
+        metavar="CLASSIFIER=VALUE",
+        help="[cbm4 only] run a subset of the chunks containing these classifier values",
+    )
+    run_parser.add_argument(
+        "--subset_path",
+        help="[cbm4 only] directory to create the subset project in; default: <project>/subset",
+    )
 
     convert_parser = subparsers.add_parser(
         "convert", help=("Convert a walltowall-prepared GCBM project to CBM4.")
@@ -236,12 +348,78 @@ def cli():
         dest="use_cache",
     )
 
+    export_parser = subparsers.add_parser(
+        "export",
+        help=(
+            "Export a CBM4 project's results as Parquet aggregated by year, "
+            "classifiers and boundaries, and optionally as GeoTIFFs."
+        ),
+    )
+    export_parser.set_defaults(func=_export)
+    export_parser.add_argument(
+        "cbm4_config_path", help="path to CBM4 project's cbm4_config.json"
+    )
+    export_parser.add_argument(
+        "output_path", nargs="?",
+        help="destination directory for exported results; default: export in the project directory",
+    )
+    export_parser.add_argument(
+        "--reporting_classifiers", nargs="+",
+        help="classifiers to aggregate results by; default: all",
+    )
+    export_parser.add_argument(
+        "--variables", nargs="+",
+        help="simulation columns to aggregate; default: all pools, fluxes and area",
+    )
+    export_parser.add_argument(
+        "--geotiff_variables", nargs="+", help="simulation columns to export as GeoTIFFs"
+    )
+    export_parser.add_argument(
+        "--geotiff_years", type=int, nargs="+",
+        help="years to export as GeoTIFFs; default: all simulated years",
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Run a plan of commands over one or more scenarios in a single process."
+    )
+    batch_parser.set_defaults(func=_batch)
+    batch_parser.add_argument(
+        "plan_path", help="path to batch plan json file describing the tasks to run"
+    )
+    batch_parser.add_argument("--max_workers", type=int, help="max workers shared by all tasks")
+    batch_parser.add_argument("--max_mem_gb", type=int, help="max memory (GB) shared by all tasks")
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help=(
+            "Time the prepare, convert, extend, clone and run stages over synthetic "
+            "landscapes and compare them to a baseline."
+        ),
+    )
+    benchmark_parser.set_defaults(func=_benchmark)
+    benchmark_parser.add_argument(
+        "spec_path", help="path to benchmark spec json file describing the landscapes"
+    )
+    benchmark_parser.add_argument(
+        "output_path", nargs="?", help="destination directory for landscapes and results"
+    )
+    benchmark_parser.add_argument(
+        "--baseline_path", help="benchmark_results.csv from a previous run to compare to"
+    )
+    benchmark_parser.add_argument(
+        "--tolerance", type=float,
+        help="allowed fractional increase over the baseline in each metric; default: 0.2",
+    )
+    benchmark_parser.add_argument("--max_workers", type=int, help="max workers")
+
     args = parser.parse_args()
 
     log_path = Path(
         args.output_path
         if getattr(args, "output_path", None)
-        else args.project_path if getattr(args, "project_path", None) else "."
+        else args.project_path if getattr(args, "project_path", None)
+        else Path(args.plan_path).absolute().parent if getattr(args, "plan_path", None)
+        else "."
     ).joinpath("walltowall.log")
 
     log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -250,11 +428,18 @@ def cli():
         level=logging.INFO,
         format="%(asctime)s %(message)s",
         handlers=[
-            FileHandler(log_path, mode=("a" if args.func == run else "w")),
+            FileHandler(log_path, mode=("a" if args.func is _run else "w")),
             StreamHandler(),
         ],
     )
 
+    if getattr(args, "max_mem_gb", None) or getattr(args, "max_workers", None):
+        from gcbmwalltowall.util.resources import ResourceGovernor
+
+        ResourceGovernor.configure(
+            getattr(args, "max_mem_gb", None), getattr(args, "max_workers", None)
+        )
+
     args.func(args)
 
 
@@ -15,10 +15,13 @@ class ProjectBuilder:
             CasfriProjectBuilder
         from gcbmwalltowall.builder.compositeprojectbuilder import \
             CompositeProjectBuilder
+        from gcbmwalltowall.builder.syntheticprojectbuilder import \
+            SyntheticProjectBuilder
 
         return {
             "casfri": CasfriProjectBuilder,
             "composite": CompositeProjectBuilder,
+            "synthetic": SyntheticProjectBuilder,
         }
 
     @staticmethod
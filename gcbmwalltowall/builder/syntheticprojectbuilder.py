@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+import csv
+import json
+import math
+from typing import Any, Callable
+
+import numpy as np
+
+from gcbmwalltowall.builder.projectbuilder import ProjectBuilder
+from gcbmwalltowall.configuration.configuration import Configuration
+from gcbmwalltowall.validation.string import require_not_null
+from gcbmwalltowall.util.path import Path, relpath
+from gcbmwalltowall.util.rasterbound import RasterBound
+from gcbmwalltowall.util.rasterchunks import get_raster_chunks
+
+
+class SyntheticProjectBuilder(ProjectBuilder):
+    """Generates a complete walltowall project of any size from random data so
+    that tiling, conversion and CBM4 runs can be reproduced and benchmarked
+    without sharing real inventories. Layers are made of square stands of
+    patch_size pixels, each with its own classifier values and age, and each
+    disturbance year disturbs a random set of stands. The same seed always
+    generates the same landscape.
+
+    Species and disturbance types are names, or a number of names to draw from
+    the project's AIDB or cbm_defaults database; by default, softwood and
+    hardwood forest types, and wildfire and clearcut, if the database has
+    them. Classifier values can be a count for every classifier or a list of
+    counts, one per classifier. Rollback can be true or extra rollback
+    settings, and generates an age distribution for the inventory at the end
+    of the disturbance years.
+
+    Builder options, all optional except for "aidb" in the main config:
+
+        {
+            "builder": {
+                "type": "synthetic",
+                "width": 1000,                  # pixels
+                "height": 1000,
+                "resolution": 0.001,            # degrees
+                "origin": [-100.0, 55.0],       # upper left corner
+                "patch_size": 50,               # stand width in pixels
+                "classifiers": 2,
+                "classifier_values": 5,         # or i.e. [5, 100]
+                "classifier_format": "raster",  # or "vector"
+                "species": 2,                   # or a list of names
+                "disturbance_types": 2,         # or a list of names
+                "disturbance_years": 10,
+                "disturbance_rate": 0.05,       # fraction of stands per year
+                "start_year": 2010,
+                "disturbance_format": "raster", # or "vector"
+                "rollback": false,
+                "extension_years": 0,           # extra years for walltowall extend
+                "cohorts": 0,
+                "seed": 0
+            }
+        }
+    """
+
+    synthetic_builder_keys = {
+        "type", "width", "height", "resolution", "origin", "patch_size",
+        "classifiers", "classifier_values", "classifier_format", "species",
+        "disturbance_types", "disturbance_years", "disturbance_rate",
+        "start_year", "disturbance_format", "extension_years", "cohorts",
+        "rollback", "seed",
+    }
+
+    default_species = ["Softwood forest type", "Hardwood forest type"]
+    default_disturbance_types = ["Wildfire", "Clearcut harvesting with salvage"]
+
+    yield_interval = 10
+    max_yield_age = 200
+
+    @staticmethod
+    def build(config: Configuration) -> Configuration:
+        from gcbmwalltowall.component.inputdatabase import InputDatabase
+
+        builder_config = config["builder"]
+        landscape = SyntheticLandscape(
+            config.working_path,
+            width=builder_config.get("width", 1000),
+            height=builder_config.get("height", 1000),
+            resolution=builder_config.get("resolution", 0.001),
+            origin=builder_config.get("origin", (-100.0, 55.0)),
+            patch_size=builder_config.get("patch_size", 50),
+            seed=builder_config.get("seed", 0),
+        )
+
+        input_db = InputDatabase(
+            config.resolve(require_not_null(config.get("aidb"))),
+            landscape.output_path.joinpath("yields.csv"),
+            SyntheticProjectBuilder.yield_interval,
+            config.get("locale", "en-CA"),
+        )
+
+        species = choose_names(
+            "species", builder_config.get("species"),
+            input_db.get_species_types(), SyntheticProjectBuilder.default_species,
+            landscape.seed,
+        )
+
+        disturbance_types = choose_names(
+            "disturbance type", builder_config.get("disturbance_types"),
+            input_db.get_disturbance_types(),
+            SyntheticProjectBuilder.default_disturbance_types, landscape.seed,
+        )
+
+        start_year = builder_config.get("start_year", 2010)
+        disturbance_years = builder_config.get("disturbance_years", 10)
+        disturbance_rate = builder_config.get("disturbance_rate", 0.05)
+        disturbance_format = builder_config.get("disturbance_format", "raster")
+        classifier_format = builder_config.get("classifier_format", "raster")
+
+        config.setdefault("project_name", "synthetic")
+        config["resolution"] = landscape.resolution
+        config["bounding_box"] = {"layer": landscape.write_bounding_box()}
+
+        classifier_names = [
+            f"classifier_{i + 1}" for i in range(builder_config.get("classifiers", 2))
+        ]
+
+        num_values = builder_config.get("classifier_values", 5)
+        if not isinstance(num_values, list):
+            num_values = [num_values] * len(classifier_names)
+
+        config["classifiers"] = {
+            name: landscape.write_classifier(name, i, classifier_values, classifier_format)
+            for i, (name, classifier_values) in enumerate(zip(classifier_names, num_values))
+        }
+
+        config["yield_table"] = landscape.write_yield_table(
+            classifier_names, num_values[0], species,
+            SyntheticProjectBuilder.yield_interval,
+            SyntheticProjectBuilder.max_yield_age,
+        )
+        config["yield_interval"] = SyntheticProjectBuilder.yield_interval
+
+        config["layers"] = {"initial_age": landscape.write_age("initial_age", 0)}
+
+        num_cohorts = builder_config.get("cohorts", 0)
+        if num_cohorts:
+            proportion = 1 / (num_cohorts + 1)
+            config["layers"]["cohort_proportion"] = landscape.write_constant(
+                "cohort_proportion", proportion
+            )
+
+            config["cohorts"] = [
+                {
+                    "cohort_proportion": landscape.write_constant(
+                        f"cohort_{i + 1}_proportion", proportion
+                    ),
+                    "initial_age": landscape.write_age(f"cohort_{i + 1}_age", i + 1),
+                }
+                for i in range(num_cohorts)
+            ]
+
+        disturbance_pattern = landscape.write_disturbances(
+            range(start_year, start_year + disturbance_years),
+            disturbance_types,
+            disturbance_format,
+            rate=disturbance_rate,
+        )
+
+        # Shapefile field names are limited to 10 characters.
+        disturbance_config = {
+            "year": "year",
+            "disturbance_type": (
+                "dist_type" if disturbance_format == "vector" else "disturbance_type"
+            ),
+        }
+        config["disturbances"] = {disturbance_pattern: disturbance_config}
+
+        extension_years = builder_config.get("extension_years", 0)
+        if extension_years:
+            extension_start = start_year + disturbance_years
+            extension_pattern = landscape.write_disturbances(
+                range(extension_start, extension_start + extension_years),
+                disturbance_types,
+                disturbance_format,
+                "extension",
+                disturbance_rate,
+            )
+
+            json.dump(
+                {"disturbances": {extension_pattern: disturbance_config}},
+                open(config.working_path.joinpath("extension_disturbances.json"), "w"),
+                indent=4,
+            )
+
+        rollback = builder_config.get("rollback")
+        if rollback:
+            config["rollback"] = {
+                "age_distribution": landscape.write_age_distribution(
+                    SyntheticProjectBuilder.yield_interval,
+                    SyntheticProjectBuilder.max_yield_age,
+                ),
+                "inventory_year": start_year + disturbance_years,
+                "random_seed": landscape.seed,
+                **(rollback if isinstance(rollback, dict) else {}),
+            }
+
+        # Users can override or explicitly configure top-level items, or provide
+        # extra values for items that are collections (i.e. layers, disturbances).
+        for k, v in builder_config.items():
+            if k in SyntheticProjectBuilder.synthetic_builder_keys:
+                continue
+
+            if isinstance(v, dict) and k in config:
+                config[k].update(v)
+            else:
+                config[k] = v
+
+        return config
+
+
+def choose_names(
+    kind: str,
+    configured: int | list[str] | None,
+    available: set[str],
+    defaults: list[str],
+    seed: int = 0,
+) -> list[str]:
+    """Choose the species or disturbance type names for a synthetic project.
+
+    Args:
+        kind (str): what the names are, for error messages
+        configured (int or list, optional): the names to use, or the number
+            of names to draw from the available ones
+        available (set of str): the names in the AIDB or cbm_defaults database
+        defaults (list of str): the names to use if none are configured, where
+            available
+        seed (int, optional): random seed for drawing names
+
+    Returns:
+        list of str: the chosen names, spelled as in the database
+    """
+    available_by_key = {name.lower(): name for name in available}
+    if isinstance(configured, list):
+        missing = [name for name in configured if name.lower() not in available_by_key]
+        if missing:
+            raise RuntimeError(
+                f"Synthetic project {kind} not found in database: {', '.join(missing)}"
+            )
+
+        return [available_by_key[name.lower()] for name in configured]
+
+    count = len(defaults) if configured is None else int(configured)
+    if count > len(available):
+        raise RuntimeError(
+            f"Synthetic project needs {count} {kind} names but the database "
+            f"only has {len(available)}"
+        )
+
+    chosen = [
+        available_by_key[name.lower()] for name in defaults
+        if name.lower() in available_by_key
+    ][:count]
+
+    remaining = sorted(set(available) - set(chosen))
+    rng = np.random.default_rng(seed)
+    chosen.extend(rng.choice(remaining, count - len(chosen), replace=False).tolist())
+
+    return chosen
+
+
+class SyntheticLandscape:
+    """Writes the random layers for a :class:`SyntheticProjectBuilder` project
+    into the layers directory of the output path. Paths returned by the write
+    methods are relative to the output path.
+
+    Args:
+        output_path (str): the project directory
+        width (int): width of the landscape in pixels
+        height (int): height of the landscape in pixels
+        resolution (float): pixel size in degrees
+        origin (tuple): the upper left corner of the landscape
+        patch_size (int): width of a stand in pixels
+        seed (int): random seed
+    """
+
+    # Pixels to generate at a time.
+    chunk_pixels = 16_000_000
+
+    def __init__(
+        self,
+        output_path: str | Path,
+        width: int,
+        height: int,
+        resolution: float,
+        origin: tuple[float, float],
+        patch_size: int,
+        seed: int,
+    ):
+        self.output_path = Path(output_path).absolute()
+        self.layer_path = self.output_path.joinpath("layers")
+        self.layer_path.mkdir(parents=True, exist_ok=True)
+        self.width = int(width)
+        self.height = int(height)
+        self.resolution = float(resolution)
+        self.origin = tuple(origin)
+        self.patch_size = max(1, int(patch_size))
+        self.seed = int(seed)
+        self.patch_cols = math.ceil(self.width / self.patch_size)
+        self.patch_rows = math.ceil(self.height / self.patch_size)
+        self._bounding_box_path = None
+
+    def write_bounding_box(self) -> str:
+        from mojadata.util import gdal, osr
+
+        self._bounding_box_path = self.layer_path.joinpath("bounding_box.tif")
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+        ds = gdal.GetDriverByName("GTiff").Create(
+            str(self._bounding_box_path), self.width, self.height, 1, gdal.GDT_Byte,
+            ["TILED=YES", "COMPRESS=ZSTD", "BIGTIFF=IF_SAFER"],
+        )
+
+        ds.SetGeoTransform(
+            (self.origin[0], self.resolution, 0, self.origin[1], 0, -self.resolution)
+        )
+        ds.SetProjection(srs.ExportToWkt())
+        ds.GetRasterBand(1).SetNoDataValue(0)
+        del ds
+
+        self._write_raster(
+            self._bounding_box_path, np.uint8, 0,
+            lambda bounds, stands: np.ones(stands.shape, np.uint8),
+        )
+
+        return self._relpath(self._bounding_box_path)
+
+    def write_classifier(
+        self, name: str, index: int, num_values: int, layer_format: str = "raster"
+    ) -> dict[str, Any]:
+        """Write a classifier layer of integer codes with a lookup table of
+        the codes' classifier values: a raster attribute table, or attribute
+        substitutions for a shapefile with one polygon per stand.
+
+        Returns:
+            dict: the classifier's walltowall configuration
+        """
+        values = self._patch_values(("classifier", index), 1, num_values + 1)
+        classifier_config = {}
+        if layer_format == "vector":
+            path = self.layer_path.joinpath(f"{name}.shp")
+            self._write_shapefile(
+                path, {"code": "integer"},
+                ((stand, {"code": int(code)}) for stand, code in enumerate(values)),
+            )
+
+            code_col = "code"
+            classifier_config["attribute"] = "code"
+        else:
+            path = self.layer_path.joinpath(f"{name}.tif")
+            self._write_raster(
+                path, np.int32, -1, lambda bounds, stands: values[stands].astype(np.int32)
+            )
+
+            code_col = "px"
+
+        lookup_path = path.with_suffix(".csv")
+        self._write_csv(
+            lookup_path,
+            [code_col, name],
+            ([code, self.classifier_value(name, code)] for code in range(1, num_values + 1)),
+        )
+
+        return {
+            "layer": self._relpath(path),
+            **classifier_config,
+            "values_path": self._relpath(lookup_path),
+            "values_col": name,
+        }
+
+    @staticmethod
+    def classifier_value(name: str, px: int) -> str:
+        return f"{name}_{px}"
+
+    def write_yield_table(
+        self,
+        classifier_names: list[str],
+        num_values: int,
+        species: list[str],
+        interval: int,
+        max_age: int,
+    ) -> str:
+        # One curve per value of the first classifier; the rest are wildcards.
+        ages = np.arange(0, max_age + 1, interval)
+        rows = []
+        for px in range(1, num_values + 1):
+            rng = np.random.default_rng((self.seed, px))
+            peak = rng.uniform(100, 400)
+            rate = rng.uniform(0.02, 0.05)
+            volumes = peak * (1 - np.exp(-rate * ages)) ** 3
+            rows.append(
+                [self.classifier_value(classifier_names[0], px)]
+                + ["?"] * (len(classifier_names) - 1)
+                + [species[(px - 1) % len(species)]]
+                + [round(v, 2) for v in volumes]
+            )
+
+        path = self.output_path.joinpath("yields.csv")
+        self._write_csv(
+            path,
+            classifier_names + ["species"] + [f"v{age}" for age in ages],
+            rows,
+        )
+
+        return self._relpath(path)
+
+    def write_age(self, name: str, index: int) -> str:
+        path = self.layer_path.joinpath(f"{name}.tif")
+        ages = self._patch_values(("age", index), 0, 200)
+        self._write_raster(
+            path, np.int16, -1, lambda bounds, stands: ages[stands].astype(np.int16)
+        )
+
+        return self._relpath(path)
+
+    def write_age_distribution(self, interval: int, max_age: int) -> str:
+        """Write a rollback age distribution: the proportion of stands in each
+        age class, declining linearly with age.
+        """
+        ages = np.arange(0, max_age + 1, interval)
+        weights = (len(ages) - np.arange(len(ages))).astype(float)
+        proportions = weights / weights.sum()
+        path = self.output_path.joinpath("age_distribution.json")
+        json.dump(
+            [{"distribution": [[int(age), round(float(p), 6)] for age, p in zip(ages, proportions)]}],
+            open(path, "w"),
+            indent=4,
+        )
+
+        return self._relpath(path)
+
+    def write_constant(self, name: str, value: float) -> str:
+        path = self.layer_path.joinpath(f"{name}.tif")
+        self._write_raster(
+            path, np.float32, -1, lambda bounds, stands: np.full(stands.shape, value, np.float32)
+        )
+
+        return self._relpath(path)
+
+    def write_disturbances(
+        self,
+        years: range,
+        disturbance_types: list[str],
+        layer_format: str = "raster",
+        prefix: str = "disturbances",
+        rate: float = 0.05,
+    ) -> str:
+        """Write one disturbance layer per year, each disturbing a random
+        fraction of the stands with a random disturbance type.
+
+        Returns:
+            str: the file pattern matching the disturbance layers
+        """
+        disturbance_path = self.layer_path.joinpath(prefix)
+        disturbance_path.mkdir(parents=True, exist_ok=True)
+        for year in years:
+            rng = np.random.default_rng((self.seed, year))
+            disturbed = rng.random(self.patch_rows * self.patch_cols) < rate
+            dist_types = np.where(
+                disturbed, rng.integers(1, len(disturbance_types) + 1, disturbed.size), 0
+            )
+
+            if layer_format == "vector":
+                self._write_shapefile(
+                    disturbance_path.joinpath(f"{prefix}_{year}.shp"),
+                    {"year": "integer", "dist_type": "string"},
+                    (
+                        (stand, {"year": year, "dist_type": disturbance_types[dist_types[stand] - 1]})
+                        for stand in np.flatnonzero(dist_types)
+                    ),
+                )
+            else:
+                path = disturbance_path.joinpath(f"{prefix}_{year}.tif")
+                self._write_raster(
+                    path, np.uint8, 0, lambda bounds, stands: dist_types[stands].astype(np.uint8)
+                )
+
+                self._write_csv(
+                    path.with_suffix(".csv"),
+                    ["px", "year", "disturbance_type"],
+                    ([px, year, dist_type] for px, dist_type in enumerate(disturbance_types, 1)),
+                )
+
+        ext = "shp" if layer_format == "vector" else "tif"
+
+        return self._relpath(disturbance_path.joinpath(f"{prefix}_*.{ext}"))
+
+    def _write_shapefile(self, path: Path, fields: dict[str, str], stands):
+        """Write a shapefile with a square polygon for each stand.
+
+        Args:
+            path (Path): the shapefile to write
+            fields (dict): field name to type: integer or string
+            stands (iterable): (stand index, {field: value}) for each polygon
+        """
+        from mojadata.util import ogr, osr
+
+        field_types = {"integer": ogr.OFTInteger, "string": ogr.OFTString}
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+        ds = ogr.GetDriverByName("ESRI Shapefile").CreateDataSource(str(path))
+        lyr = ds.CreateLayer(path.stem, srs, ogr.wkbPolygon)
+        for field_name, field_type in fields.items():
+            lyr.CreateField(ogr.FieldDefn(field_name, field_types[field_type]))
+
+        stand_size = self.patch_size * self.resolution
+        x_limit = self.origin[0] + self.width * self.resolution
+        y_limit = self.origin[1] - self.height * self.resolution
+        lyr.StartTransaction()
+        for stand, values in stands:
+            row, col = divmod(int(stand), self.patch_cols)
+            x_min = self.origin[0] + col * stand_size
+            y_max = self.origin[1] - row * stand_size
+            x_max = min(x_min + stand_size, x_limit)
+            y_min = max(y_max - stand_size, y_limit)
+
+            ring = ogr.Geometry(ogr.wkbLinearRing)
+            for x, y in ((x_min, y_max), (x_max, y_max), (x_max, y_min), (x_min, y_min), (x_min, y_max)):
+                ring.AddPoint_2D(x, y)
+
+            polygon = ogr.Geometry(ogr.wkbPolygon)
+            polygon.AddGeometry(ring)
+            feature = ogr.Feature(lyr.GetLayerDefn())
+            for field_name, value in values.items():
+                feature.SetField(field_name, value)
+
+            feature.SetGeometry(polygon)
+            lyr.CreateFeature(feature)
+
+        lyr.CommitTransaction()
+        del ds
+
+    def _patch_values(self, key: tuple, low: int, high: int) -> np.ndarray:
+        # Seeded from the key's text since hash() of a str varies by process.
+        rng = np.random.default_rng([self.seed] + [ord(c) for c in repr(key)])
+
+        return rng.integers(low, high, self.patch_rows * self.patch_cols)
+
+    def _write_raster(
+        self,
+        path: Path,
+        dtype: np.dtype,
+        nodata: int | float,
+        fn: Callable[[RasterBound, np.ndarray], np.ndarray],
+    ):
+        """Write a raster matching the bounding box chunk by chunk, where fn
+        gets the chunk bounds and each pixel's stand index and returns the
+        pixel values.
+        """
+        from gcbmwalltowall.util.gdalhelpers import create_empty_raster
+        from gcbmwalltowall.util.rastersession import RasterSession
+
+        if path != self._bounding_box_path:
+            create_empty_raster(
+                self._bounding_box_path, path, data_type=dtype, nodata=nodata,
+                options=["TILED=YES", "COMPRESS=ZSTD", "BIGTIFF=IF_SAFER"],
+            )
+
+        chunk_height = max(1, self.chunk_pixels // self.width)
+        with RasterSession() as session:
+            for bounds in get_raster_chunks(self.width, self.height, self.width, chunk_height):
+                rows = np.arange(bounds.y_off, bounds.y_off + bounds.y_size) // self.patch_size
+                cols = np.arange(bounds.x_off, bounds.x_off + bounds.x_size) // self.patch_size
+                stands = rows[:, None] * self.patch_cols + cols[None, :]
+                session.write(path, fn(bounds, stands), bounds.x_off, bounds.y_off)
+
+    def _write_csv(self, path: Path, header: list[str], rows):
+        with open(path, "w", newline="") as out_file:
+            writer = csv.writer(out_file)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def _relpath(self, path: Path) -> str:
+        return relpath(path, self.output_path)
@@ -11,6 +11,7 @@ from mojadata.util import ogr
 
 from gcbmwalltowall.component.layer import Layer
 from gcbmwalltowall.component.tileable import Tileable
+from gcbmwalltowall.component.vectorsplitter import VectorSplitter
 from gcbmwalltowall.util.path import Path
 from gcbmwalltowall.util.yearparser import YearParser
 
@@ -62,21 +63,43 @@ class Disturbance(Tileable):
         self.layer_kwargs = layer_kwargs or {}
 
     def to_tiler_layer(self, rule_manager, **kwargs):
-        pattern_root = self.pattern.absolute().parent
-        while "*" in pattern_root.name:
-            pattern_root = pattern_root.parent
-
-        if not pattern_root.exists():
+        if not self._pattern_root.exists():
             logging.fatal(
                 f"Error scanning for disturbance layer pattern {self.pattern}: "
-                f"parent directory {pattern_root} does not exist"
+                f"parent directory {self._pattern_root} does not exist"
             )
 
             sys.exit("Fatal error preparing disturbance layers")
 
         disturbance_layers = []
-        pattern_glob = str(self.pattern.relative_to(pattern_root))
-        for layer_path in pattern_root.glob(pattern_glob):
+        for layer_path, layer_kwargs in self.find_layer_sources():
+            disturbance_layers.extend(
+                self._to_tiler_layer(layer_path, rule_manager, layer_kwargs, **kwargs)
+            )
+
+        if not disturbance_layers:
+            logging.fatal(
+                f"Error scanning for disturbance layer pattern {self.pattern}: "
+                f"no matching files found"
+            )
+
+            sys.exit("Fatal error preparing disturbance layers")
+
+        return disturbance_layers
+
+    def find_layer_sources(self):
+        """Find the files (and layers within them, for GDBs) matching the
+        disturbance pattern.
+
+        Returns:
+            list: (layer path, layer kwargs) for each source layer
+        """
+        if not self._pattern_root.exists():
+            return []
+
+        layer_sources = []
+        pattern_glob = str(self.pattern.relative_to(self._pattern_root))
+        for layer_path in self._pattern_root.glob(pattern_glob):
             if layer_path.suffix == ".gdb" and self.layers:
                 sublayers = self.layers
                 if isinstance(sublayers, str):
@@ -91,31 +114,14 @@ class Disturbance(Tileable):
                 for sublayer in sublayers:
                     layer_kwargs = self.layer_kwargs.copy()
                     layer_kwargs.update({"layer": sublayer})
-                    disturbance_layers.extend(
-                        self._to_tiler_layer(
-                            layer_path, rule_manager, layer_kwargs, **kwargs
-                        )
-                    )
+                    layer_sources.append((layer_path, layer_kwargs))
             else:
-                disturbance_layers.extend(
-                    self._to_tiler_layer(
-                        layer_path, rule_manager, self.layer_kwargs, **kwargs
-                    )
-                )
+                layer_sources.append((layer_path, self.layer_kwargs))
 
-        if not disturbance_layers:
-            logging.fatal(
-                f"Error scanning for disturbance layer pattern {self.pattern}: "
-                f"no matching files found"
-            )
+        return layer_sources
 
-            sys.exit("Fatal error preparing disturbance layers")
-
-        return disturbance_layers
-
-    def _to_tiler_layer(self, layer_path, rule_manager, layer_kwargs, **kwargs):
-        disturbance_layers = []
-        layer = Layer(
+    def make_layer(self, layer_path, layer_kwargs):
+        return Layer(
             self._make_tiler_name(layer_path, layer_kwargs.get("layer")),
             layer_path,
             lookup_table=self.lookup_table,
@@ -123,6 +129,33 @@ class Disturbance(Tileable):
             **layer_kwargs,
         )
 
+    def get_year_and_type(self, layer_path, attribute_table):
+        """Get the disturbance year and type for a source layer, either as
+        configured/parsed values or as the names of the layer attributes
+        holding them.
+
+        Returns:
+            tuple: the year and disturbance type
+        """
+        disturbance_type = self._get_disturbance_type_or_attribute(
+            layer_path, attribute_table
+        )
+        year = self._get_disturbance_year_or_attribute(layer_path, attribute_table)
+
+        return year, disturbance_type
+
+    @property
+    def _pattern_root(self):
+        pattern_root = self.pattern.absolute().parent
+        while "*" in pattern_root.name:
+            pattern_root = pattern_root.parent
+
+        return pattern_root
+
+    def _to_tiler_layer(self, layer_path, rule_manager, layer_kwargs, **kwargs):
+        disturbance_layers = []
+        layer = self.make_layer(layer_path, layer_kwargs)
+
         attribute_table = layer.attribute_table
 
         transition_disturbed, transition_disturbed_attributes = self._make_transition(
@@ -137,10 +170,7 @@ class Disturbance(Tileable):
         spatial_classifier_transition.update(set(transition_disturbed_attributes or []))
         spatial_classifier_transition.update(set(transition_undisturbed_attributes or []))
 
-        disturbance_type = self._get_disturbance_type_or_attribute(
-            layer_path, attribute_table
-        )
-        year = self._get_disturbance_year_or_attribute(layer_path, attribute_table)
+        year, disturbance_type = self.get_year_and_type(layer_path, attribute_table)
         proportion = self._get_configured_or_default(
             attribute_table, "proportion", self.proportion
         )
@@ -341,12 +371,24 @@ class Disturbance(Tileable):
                     k: v for k, v in layer_filters.items() if k not in split_values
                 }
 
-                for i, split_target_values in enumerate(
-                    product(*split_values.values())
-                ):
-                    split_layer_filters = dict(
-                        zip(split_values.keys(), split_target_values)
-                    )
+                # Where possible, read the source once and write out only the
+                # combinations that have features, rather than rasterizing the
+                # whole source with a filter for every possible combination.
+                splitter = VectorSplitter(layer)
+                if splitter.can_split(split_attributes):
+                    split_sources = [
+                        (dict(zip(split_values.keys(), split_target_values)),
+                         {"path": split_path, "layer": split_layer_name})
+                        for split_target_values, (split_path, split_layer_name)
+                        in splitter.split(split_values).items()
+                    ]
+                else:
+                    split_sources = [
+                        (dict(zip(split_values.keys(), split_target_values)), {})
+                        for split_target_values in product(*split_values.values())
+                    ]
+
+                for i, (split_layer_filters, split_source) in enumerate(split_sources):
                     split_layer_filters.update(non_splitting_filters)
 
                     logging.info(f"    split {i}: {split_layer_filters}")
@@ -354,6 +396,7 @@ class Disturbance(Tileable):
                         self._make_tiler_name(layer_path, layer_kwargs.get("layer"), i),
                         tiler_attributes,
                         split_layer_filters,
+                        **split_source,
                     )
 
                     disturbance_layers.append(
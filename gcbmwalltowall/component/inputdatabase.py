@@ -6,7 +6,7 @@ from gcbminputloader.util.configuration import Configuration
 from gcbminputloader.util.db import get_connection
 from sqlalchemy import text
 from gcbmwalltowall.util.path import Path
-from gcbmwalltowall.util.encoding import load_csv
+from gcbmwalltowall.util.encoding import load_csv, load_csv_header
 
 
 class InputDatabase:
@@ -22,16 +22,19 @@ class InputDatabase:
         input_db_config_path = output_path.with_suffix(".json")
         output_dir = Path(output_path).absolute().parent
 
-        # Add any missing classifier columns to the transition rules.
+        # Add any missing classifier columns to the transition rules; only the
+        # header needs to be read to find out if the table must be rewritten.
         if transition_rules_path and Path(transition_rules_path).exists():
-            transitions = load_csv(transition_rules_path)
-            changed = False
-            for classifier in classifiers:
-                if classifier.name not in transitions:
-                    transitions[classifier.name] = "?"
-                    changed = True
-
-            if changed:
+            transition_cols = load_csv_header(transition_rules_path)
+            missing_cols = [
+                c.name for c in classifiers if c.name not in transition_cols
+            ]
+
+            if missing_cols:
+                transitions = load_csv(transition_rules_path)
+                for col in missing_cols:
+                    transitions[col] = "?"
+
                 transitions.to_csv(transition_rules_path, index=False)
         else:
             transition_rules_path = None
@@ -172,11 +175,11 @@ class InputDatabase:
 
         raise RuntimeError(f"Unable to find increment columns in {self.yield_path}")
 
-    def _find_species_col(self):
+    def get_species_types(self):
         with get_connection(self.aidb_path) as conn:
             if self.aidb_path.suffix == ".mdb":
                 species_types = {
-                    row[0].lower()
+                    row[0]
                     for row in conn.execute(
                         text(
                             "SELECT DISTINCT speciestypename FROM tblspeciestypedefault"
@@ -185,7 +188,7 @@ class InputDatabase:
                 }
             else:
                 species_types = {
-                    row[0].lower()
+                    row[0]
                     for row in conn.execute(
                         text(
                             """
@@ -202,6 +205,10 @@ class InputDatabase:
                     )
                 }
 
+            return species_types
+
+    def _find_species_col(self):
+        species_types = {species.lower() for species in self.get_species_types()}
         yield_table = load_csv(self.yield_path)
         for col in yield_table.columns:
             yield_col_values = {str(v).lower() for v in yield_table[col].unique()}
@@ -259,11 +266,11 @@ class InputDatabase:
         if not (csv_path and csv_path.exists()):
             return default
 
-        header = load_csv(csv_path, nrows=1)
+        header = load_csv_header(csv_path)
         if col_name not in header:
             return default
 
-        return header.columns.get_loc(col_name)
+        return header.index(col_name)
 
     def _only_numeric(self, values):
         return all((isinstance(v, Number) for v in values))
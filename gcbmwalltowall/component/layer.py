@@ -11,7 +11,7 @@ from gcbmwalltowall.util.encoding import load_csv
 class Layer(Tileable):
 
     raster_formats = [".tif", ".tiff"]
-    vector_formats = [".shp", ".gdb"]
+    vector_formats = [".shp", ".gdb", ".gpkg"]
 
     def __init__(
         self,
@@ -90,14 +90,14 @@ class Layer(Tileable):
             **kwargs,
         )
 
-    def split(self, name=None, attributes=None, filters=None):
+    def split(self, name=None, attributes=None, filters=None, path=None, layer=None):
         layer_copy = __class__(
             name or self.name,
-            self.path,
+            path or self.path,
             attributes or self.attributes,
             self.lookup_table,
             filters or self.filters,
-            self.layer,
+            layer or self.layer,
             extended_attribute_table=self.extended_attribute_table,
             **self.tiler_kwargs,
         )
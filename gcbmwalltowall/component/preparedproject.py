@@ -7,7 +7,7 @@ from spatial_inventory_rollback.gcbm.merge.gcbm_merge_layer_input import \
     MergeInputLayers
 
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
-from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.path import Path, link_or_copy
 
 
 class PreparedLayer:
@@ -272,7 +272,9 @@ class PreparedProject:
             )
 
         # Merge expects a single study_area.json, so for projects that have been
-        # rolled back, need to consolidate the layers and study areas.
+        # rolled back, need to consolidate the layers and study areas. The layers
+        # themselves are linked into the staging directory rather than copied,
+        # since merge only reads them.
         staging_path = Path(working_path).joinpath(self.path.stem)
         staging_path.mkdir()
 
@@ -286,7 +288,7 @@ class PreparedProject:
             for layer in self.layers:
                 study_area["layers"].append(layer.study_area_metadata)
                 for layer_file in (layer.path, layer.path.with_suffix(".json")):
-                    shutil.copyfile(layer_file, staging_path.joinpath(layer_file.name))
+                    link_or_copy(layer_file, staging_path.joinpath(layer_file.name))
 
         transition_rules = self.rollback_layer_path.joinpath("transition_rules.csv")
 
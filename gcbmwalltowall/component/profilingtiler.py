@@ -0,0 +1,214 @@
+from __future__ import annotations
+import os
+import time
+from collections import defaultdict
+from functools import wraps
+from typing import Any
+import pandas as pd
+from mojadata import gdaltiler2d
+from mojadata.cleanup import cleanup
+from mojadata.gdaltiler2d import GdalTiler2D
+from mojadata.tiler import Tiler
+from gcbmwalltowall.util.path import Path
+
+
+class ProfilingGdalTiler2D(GdalTiler2D):
+    """A GdalTiler2D that measures how long each layer spends in each stage of
+    tiling and writes a tiling_profile.csv next to study_area.json:
+
+        layer: the tiled layer's name
+        source: the walltowall layer, classifier or disturbance it came from
+        status: tiled, skipped (empty or failed), or resumed (tiled by an
+            earlier run)
+        prepare_time: time spent making the source's tiler layers before
+            tiling, shared by every layer from the same source
+        attribute_scan_time: time spent reading and building a vector layer's
+            attribute table
+        rasterize_time: time spent reprojecting, filtering and rasterizing the
+            layer, excluding the attribute scan
+        warp_time: time spent warping, clipping and padding the raster to the
+            bounding box
+        total_time: time spent tiling the layer in its worker
+        output_MB: size of the tiled raster
+        peak_worker_memory_MB: peak resident memory of the worker while tiling
+            the layer
+
+    Accepts the same arguments as GdalTiler2D, plus:
+
+    Args:
+        checkpoint_path (str, optional): directory to record each layer in as
+            it is tiled; layers recorded by an earlier run whose output still
+            exists are not tiled again
+    """
+
+    profile_columns = [
+        "layer", "source", "status", "prepare_time", "attribute_scan_time",
+        "rasterize_time", "warp_time", "total_time", "output_MB",
+        "peak_worker_memory_MB",
+    ]
+
+    def __init__(self, *args, checkpoint_path: str | Path = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checkpoint_path = (
+            Path(checkpoint_path).absolute() if checkpoint_path else None
+        )
+
+    def tile(self, layers, output_path=".", sources: dict[str, tuple[str, float]] = None):
+        """Tile the layers, same as GdalTiler2D.tile.
+
+        Args:
+            sources (dict, optional): tiler layer name to the name of the
+                walltowall layer it came from and that layer's preparation time
+        """
+        self._skipped_layers = []
+        self._resumed_layers = set()
+        self._profiles = {}
+        working_path = os.path.abspath(os.curdir)
+        os.makedirs(output_path, exist_ok=True)
+        os.chdir(output_path)
+        try:
+            with cleanup():
+                self._bounding_box.init()
+                layers = self._remove_duplicates(layers)
+                self._resumed_layers = self._find_resumed_layers(layers)
+                layer_config = {
+                    "tile_extent": self._tile_extent,
+                    "block_extent": self._block_extent,
+                    "use_bbox_res": self._use_bounding_box_resolution,
+                    "compact_attribute_table": self._compact_attribute_table,
+                }
+
+                self._log.info("Processing layers...")
+                pool = self._create_pool(
+                    gdaltiler2d._pool_init, (self._bounding_box, layers, layer_config)
+                )
+
+                for i, layer in enumerate(layers):
+                    if layer.name in self._resumed_layers:
+                        continue
+
+                    pool.apply_async(
+                        _profile_tile_layer, (i,), callback=self._handle_profiled_result
+                    )
+
+                pool.close()
+                pool.join()
+
+                study_area_info = self._get_study_area_info()
+                study_area_info["layers"] = [
+                    layer.metadata for layer in layers
+                    if layer.name not in self._skipped_layers
+                ]
+
+                Tiler.write_json(study_area_info, "study_area.json")
+                self._write_profile(layers, sources or {}, "tiling_profile.csv")
+
+                return study_area_info
+        finally:
+            os.chdir(working_path)
+
+    def _handle_profiled_result(self, result):
+        layer_name, success, messages, profile = result
+        self._profiles[layer_name] = profile
+        self._handle_tile_layer_result((layer_name, success, messages))
+        if self._checkpoint_path and success and profile.get("output_path"):
+            self._checkpoint_path.joinpath(f"{layer_name}.done").write_text(
+                profile["output_path"]
+            )
+
+    def _find_resumed_layers(self, layers) -> set[str]:
+        if not self._checkpoint_path:
+            return set()
+
+        self._checkpoint_path.mkdir(parents=True, exist_ok=True)
+        resumed = set()
+        for layer in layers:
+            marker = self._checkpoint_path.joinpath(f"{layer.name}.done")
+            if marker.exists() and os.path.exists(marker.read_text()):
+                resumed.add(layer.name)
+
+        if resumed:
+            self._log.info(
+                f"Resuming tiling: {len(resumed)} of {len(layers)} layers already tiled"
+            )
+
+        return resumed
+
+    def _write_profile(self, layers, sources, path):
+        rows = []
+        for layer in layers:
+            source, prepare_time = sources.get(layer.name, (layer.name, None))
+            profile = self._profiles.get(layer.name, {})
+            rows.append([
+                layer.name,
+                source,
+                "skipped" if layer.name in self._skipped_layers
+                else "resumed" if layer.name in self._resumed_layers
+                else "tiled",
+                _round(prepare_time),
+                *(_round(profile.get(col)) for col in self.profile_columns[4:]),
+            ])
+
+        pd.DataFrame(columns=self.profile_columns, data=rows).to_csv(path, index=False)
+
+
+def _profile_tile_layer(layer_idx: int) -> tuple[str, bool, list, dict[str, Any]]:
+    from gcbmwalltowall.util.resources import MemorySampler
+
+    # The layers and bounding box are the worker's own copies, set up by the
+    # GdalTiler2D pool initializer, so their methods can be wrapped in place.
+    layer = gdaltiler2d.layers[layer_idx]
+    bbox = gdaltiler2d.bbox
+    timings = defaultdict(float)
+    outputs = []
+    _time_method(layer, "_build_attribute_table", timings, "attribute_scan")
+    _time_method(layer, "as_raster_layer", timings, "as_raster_layer")
+    _time_method(bbox, "normalize", timings, "normalize", outputs)
+
+    start = time.time()
+    try:
+        with MemorySampler() as sampler:
+            layer_name, success, messages = gdaltiler2d._tile_layer(layer_idx)
+    finally:
+        del bbox.normalize
+
+    output_bytes = None
+    output_path = None
+    result = next((output[0] for output in outputs if output and output[0]), None)
+    if success and result and os.path.exists(result.path):
+        output_bytes = os.path.getsize(result.path)
+        output_path = os.path.abspath(result.path)
+
+    return layer_name, success, messages, {
+        "attribute_scan_time": timings["attribute_scan"],
+        "rasterize_time": timings["as_raster_layer"] - timings["attribute_scan"],
+        "warp_time": timings["normalize"] - timings["as_raster_layer"],
+        "total_time": time.time() - start,
+        "output_MB": output_bytes / 1024**2 if output_bytes is not None else None,
+        "peak_worker_memory_MB": sampler.peak_memory_bytes / 1024**2,
+        "output_path": output_path,
+    }
+
+
+def _time_method(obj, name: str, timings: dict[str, float], key: str, outputs: list = None):
+    method = getattr(obj, name, None)
+    if method is None:
+        return
+
+    @wraps(method)
+    def timed(*args, **kwargs):
+        start = time.time()
+        try:
+            result = method(*args, **kwargs)
+            if outputs is not None:
+                outputs.append(result)
+
+            return result
+        finally:
+            timings[key] += time.time() - start
+
+    setattr(obj, name, timed)
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
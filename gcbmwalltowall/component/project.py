@@ -1,30 +1,45 @@
 import csv
 import logging
+import multiprocessing as mp
+import os
 import shutil
+import stat
+import time
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import date
 from itertools import chain
-from multiprocessing import cpu_count
 from tempfile import TemporaryDirectory
 from uuid import uuid4
 
 from mojadata.cleanup import cleanup
-from mojadata.gdaltiler2d import GdalTiler2D
-from mojadata.layer.gcbm.transitionrulemanager import \
-    SharedTransitionRuleManager
 from mojadata.util import gdal
 
 from gcbmwalltowall.component.boundingbox import BoundingBox
 from gcbmwalltowall.component.inputdatabase import InputDatabase
+from gcbmwalltowall.component.profilingtiler import ProfilingGdalTiler2D
+from gcbmwalltowall.component.shardedtiler import ShardedTiler
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
-from gcbmwalltowall.util.path import Path
-from gcbmwalltowall.util.encoding import load_csv
+from gcbmwalltowall.util.path import Path, link_or_copy
+from gcbmwalltowall.util.resources import ResourceGovernor
+from gcbmwalltowall.util.transitionruleregistry import (
+    SharedTransitionRuleRegistry, TransitionRuleRegistry
+)
+from gcbmwalltowall.util.encoding import load_csv, load_csv_header
 from gcbmwalltowall.validation.generic import require_instance_of
 from gcbmwalltowall.validation.string import require_not_null
 
 
 class Project:
 
+    # Rows of generated transition rules to process at a time.
+    transition_rule_chunk_size = 500_000
+
+    # Smallest share of the memory budget worth giving a concurrent cohort
+    # rollback.
+    min_rollback_mem_gb = 4
+
     def __init__(
         self,
         name,
@@ -89,57 +104,92 @@ class Project:
     def rollback_input_db_path(self):
         return self.output_path.joinpath("input_database", "rollback_gcbm_input.db")
 
-    def tile(self):
+    def tile(self, shards=None):
+        # The tilers change the working directory, so tiling runs in its own
+        # process where that can't affect anything else running in this one,
+        # i.e. other batch tasks on threads.
+        root_logger = logging.getLogger()
+        log_paths = [
+            handler.baseFilename for handler in root_logger.handlers
+            if isinstance(handler, logging.FileHandler)
+        ]
+
+        with ResourceGovernor.get().lease(
+            "tile", memory_gb=self.max_mem_gb, workers=self.max_workers
+        ) as lease, ProcessPoolExecutor(
+            1,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_tiling_worker,
+            initargs=(lease.memory_gb, lease.workers, root_logger.level, log_paths),
+        ) as pool:
+            pool.submit(self._tile, shards).result()
+
+    def _tile(self, shards):
         shutil.rmtree(str(self.tiler_output_path), ignore_errors=True)
         shutil.rmtree(str(self.rollback_output_path), ignore_errors=True)
         self.tiler_output_path.mkdir(parents=True, exist_ok=True)
 
-        mgr = SharedTransitionRuleManager()
+        mgr = SharedTransitionRuleRegistry()
         mgr.start()
-        rule_manager = mgr.TransitionRuleManager()
+        rule_manager = TransitionRuleRegistry(mgr.TransitionRuleIndex())
         with cleanup():
             logging.info(f"Preparing non-disturbance layers")
             tiler_bbox = self.bounding_box.to_tiler_layer(rule_manager)
-            tiler_layers = [
-                self._make_tiler_layer(rule_manager, layer)
-                for layer in chain(self.layers, self.classifiers)
-            ]
+            tiler_layers = []
+            tiler_layer_sources = {}
+            for layer in chain(self.layers, self.classifiers):
+                self._prepare_tiler_layers(
+                    layer.name, lambda: self._make_tiler_layer(rule_manager, layer),
+                    tiler_layers, tiler_layer_sources,
+                )
 
             logging.info(f"Finished preparing non-disturbance layers")
             if self.disturbances:
                 for disturbance in self.disturbances:
-                    logging.info(f"Preparing {disturbance.name or disturbance.pattern}")
-                    layer = disturbance.to_tiler_layer(rule_manager)
-                    if isinstance(layer, list):
-                        tiler_layers.extend(layer)
-                    else:
-                        tiler_layers.append(layer)
-
-                    logging.info(
-                        f"Finished preparing {disturbance.name or disturbance.pattern}"
+                    disturbance_name = str(disturbance.name or disturbance.pattern)
+                    logging.info(f"Preparing {disturbance_name}")
+                    elapsed = self._prepare_tiler_layers(
+                        disturbance_name, lambda: disturbance.to_tiler_layer(rule_manager),
+                        tiler_layers, tiler_layer_sources,
                     )
 
-            logging.info("Starting up tiler...")
-            tiler_mem = (self.max_mem_gb * 1024**3) if self.max_mem_gb else None
-            tiler = GdalTiler2D(
-                tiler_bbox,
-                use_bounding_box_resolution=True,
-                workers=min((self.max_workers or cpu_count()), len(tiler_layers)),
-                total_mem_bytes=tiler_mem,
-            )
+                    logging.info(f"Finished preparing {disturbance_name} in {elapsed:.1f}s")
 
-            tiler.tile(tiler_layers, str(self.tiler_output_path))
-            if self.cohorts:
-                for i, cohort in enumerate(self.cohorts, 1):
-                    cohort_output_path = self.tiler_output_path.joinpath(
-                        "cohorts", str(i)
+            logging.info("Starting up tiler...")
+            with ResourceGovernor.get().lease(
+                "tile", memory_gb=self.max_mem_gb, workers=self.max_workers
+            ) as lease:
+                if shards and shards > 1:
+                    tiler = ShardedTiler(
+                        tiler_bbox,
+                        self.bounding_box.epsg,
+                        shards,
+                        workers=lease.workers,
+                        total_mem_bytes=lease.memory_bytes,
+                    )
+                else:
+                    tiler = ProfilingGdalTiler2D(
+                        tiler_bbox,
+                        use_bounding_box_resolution=True,
+                        workers=min(lease.workers, len(tiler_layers)),
+                        total_mem_bytes=lease.memory_bytes,
                     )
-                    cohort_layers = [
-                        self._make_tiler_layer(rule_manager, layer)
-                        for layer in chain(cohort.layers, cohort.classifiers)
-                    ]
 
-                    tiler.tile(cohort_layers, str(cohort_output_path))
+                tiler.tile(tiler_layers, str(self.tiler_output_path), tiler_layer_sources)
+                if self.cohorts:
+                    for i, cohort in enumerate(self.cohorts, 1):
+                        cohort_output_path = self.tiler_output_path.joinpath(
+                            "cohorts", str(i)
+                        )
+                        cohort_layers = []
+                        cohort_layer_sources = {}
+                        for layer in chain(cohort.layers, cohort.classifiers):
+                            self._prepare_tiler_layers(
+                                layer.name, lambda: self._make_tiler_layer(rule_manager, layer),
+                                cohort_layers, cohort_layer_sources,
+                            )
+
+                        tiler.tile(cohort_layers, str(cohort_output_path), cohort_layer_sources)
 
             rule_manager.write_rules(
                 str(self.tiler_output_path.joinpath("transition_rules.csv"))
@@ -164,71 +214,30 @@ class Project:
         if not self.rollback:
             return
 
-        mgr = SharedTransitionRuleManager()
+        mgr = SharedTransitionRuleRegistry()
         mgr.start()
-        rule_manager = mgr.TransitionRuleManager()
+        rule_manager = TransitionRuleRegistry(mgr.TransitionRuleIndex())
 
         output_path = self.input_db_path.parent
         rollback_transition_rules_path = self.rollback_output_path.absolute()
         rollback_mem = (self.max_mem_gb // 8) if self.max_mem_gb else None
-        self.rollback.run(
-            self.classifiers,
-            self.tiler_output_path,
-            self.input_db_path,
-            rule_manager,
-            rollback_mem,
-        )
-
-        if self.cohorts:
-            for i, _ in enumerate(self.cohorts, 1):
-                with TemporaryDirectory() as tmp:
-                    cohort_staging_path = Path(tmp)
-                    staging_layers_path = cohort_staging_path.joinpath(r"layers", "tiled")
-                    staging_layers_path.mkdir(parents=True)
-                    cohort_layers = list(
-                        (
-                            fn
-                            for fn in self.tiler_output_path.joinpath(
-                                "cohorts", str(i)
-                            ).glob("*.*")
-                            if fn.name != "study_area.json"
-                        )
-                    )
-
-                    cohort_layer_names = [fn.name for fn in cohort_layers]
-                    for fn in self.tiler_output_path.glob("*.*"):
-                        if fn.name not in cohort_layer_names:
-                            shutil.copyfile(fn, staging_layers_path.joinpath(fn.name))
-
-                    for fn in cohort_layers:
-                        shutil.copyfile(fn, staging_layers_path.joinpath(fn.name))
-
-                    shutil.copyfile(
-                        self.input_db_path,
-                        cohort_staging_path.joinpath("input_database"),
-                    )
-                    self.rollback.run(
-                        self.classifiers,
-                        staging_layers_path,
-                        self.input_db_path,
-                        rule_manager,
-                        rollback_mem,
-                    )
+        with TemporaryDirectory() as tmp:
+            # Inputs that are the same for every cohort are computed once up
+            # front instead of in each rollback run.
+            rollback = self.rollback.with_shared_inputs(
+                self.classifiers, self.input_db_path, Path(tmp).joinpath("shared")
+            )
 
-                    cohort_rollback_path = self.rollback_output_path.joinpath(
-                        "cohorts", str(i)
-                    )
-                    cohort_rollback_path.mkdir(parents=True)
-                    for fn in cohort_staging_path.joinpath(r"layers", "rollback").glob(
-                        "*.*"
-                    ):
-                        if "contemporary" not in str(fn):
-                            shutil.copyfile(fn, cohort_rollback_path.joinpath(fn.name))
-                    
-                    shutil.copytree(
-                        cohort_staging_path.joinpath(r"layers", "rollback", "rollback_stats"),
-                        cohort_rollback_path.joinpath("rollback_stats")
-                    )
+            if not self.cohorts:
+                rollback.run(
+                    self.classifiers,
+                    self.tiler_output_path,
+                    self.input_db_path,
+                    rule_manager,
+                    rollback_mem,
+                )
+            else:
+                self._run_cohort_rollbacks(rollback, rule_manager, Path(tmp))
 
         final_transition_rules_path = output_path.joinpath(
             "gcbmwalltowall_rollback_transitions.csv"
@@ -275,6 +284,127 @@ class Project:
 
         configurer.configure()
 
+    def _run_cohort_rollbacks(self, rollback, rule_manager, staging_root):
+        # Each cohort is rolled back against a staging copy of the base tiled
+        # layers with its own cohort layers swapped in; the base layers are
+        # linked rather than copied, since rollback only reads them. Rollback
+        # writes its output next to the staging directory, so the staging
+        # directory and the layers in it are made read-only while it runs, and
+        # the linked layers are checked afterwards to make sure nothing was
+        # written through them.
+        staging_paths = {}
+        for i, _ in enumerate(self.cohorts, 1):
+            staging_layers_path = staging_root.joinpath(str(i), "layers", "tiled")
+            staging_layers_path.mkdir(parents=True)
+            cohort_layers = [
+                fn for fn in self.tiler_output_path.joinpath("cohorts", str(i)).glob("*.*")
+                if fn.name != "study_area.json"
+            ]
+
+            cohort_layer_names = {fn.name for fn in cohort_layers}
+            for fn in self.tiler_output_path.glob("*.*"):
+                if fn.name not in cohort_layer_names:
+                    link_or_copy(fn, staging_layers_path.joinpath(fn.name))
+
+            for fn in cohort_layers:
+                link_or_copy(fn, staging_layers_path.joinpath(fn.name))
+
+            staging_paths[i] = staging_layers_path
+
+        staged_layers = {
+            fn: _get_file_signature(fn)
+            for staging_layers_path in staging_paths.values()
+            for fn in staging_layers_path.iterdir()
+        }
+
+        # The base project and all the cohorts are rolled back concurrently,
+        # splitting the memory budget between as many runs as fit. Each run's
+        # rollback memory limit is the same proportion of its share as a
+        # single rollback's is of the whole budget.
+        jobs = [(0, self.tiler_output_path)] + list(staging_paths.items())
+        with ResourceGovernor.get().lease(
+            "cohort rollbacks", memory_gb=self.max_mem_gb, workers=len(jobs)
+        ) as lease:
+            workers = max(1, min(
+                len(jobs),
+                lease.workers,
+                int(lease.memory_gb // self.min_rollback_mem_gb),
+            ))
+
+            job_share_gb = lease.memory_gb / workers
+            job_mem_gb = job_share_gb / (8 if self.max_mem_gb else 3)
+            logging.info(
+                f"Rolling back {len(jobs) - 1} cohorts and base project: {workers} "
+                f"concurrent runs, {job_share_gb:.1f} GB each"
+            )
+
+            # The rollbacks run in spawned processes, which would otherwise
+            # each size themselves from the whole machine.
+            with _read_only(staging_paths.values()), ProcessPoolExecutor(
+                workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_rollback_worker,
+                initargs=(job_share_gb, max(1, lease.workers // workers)),
+            ) as pool:
+                futures = {
+                    pool.submit(
+                        rollback.run,
+                        # Classifiers are only needed for age distribution
+                        # conversion, which with_shared_inputs has done.
+                        None,
+                        tiled_layers_path,
+                        self.input_db_path,
+                        rule_manager,
+                        job_mem_gb,
+                    ): cohort
+                    for cohort, tiled_layers_path in jobs
+                }
+
+                for future in as_completed(futures):
+                    future.result()
+                    logging.info(
+                        f"Finished rollback for cohort {futures[future]}"
+                        if futures[future] else "Finished rollback for base project"
+                    )
+
+        modified_layers = [
+            str(fn) for fn, signature in staged_layers.items()
+            if _get_file_signature(fn) != signature
+        ]
+
+        if modified_layers:
+            raise RuntimeError(
+                "Rollback modified its linked input layers, which are shared with "
+                f"the base project: {', '.join(modified_layers)}"
+            )
+
+        for i, staging_layers_path in staging_paths.items():
+            staging_rollback_path = staging_layers_path.parent.joinpath("rollback")
+            cohort_rollback_path = self.rollback_output_path.joinpath("cohorts", str(i))
+            cohort_rollback_path.mkdir(parents=True)
+            for fn in staging_rollback_path.glob("*.*"):
+                if "contemporary" not in str(fn):
+                    shutil.move(fn, cohort_rollback_path.joinpath(fn.name))
+
+            shutil.move(
+                staging_rollback_path.joinpath("rollback_stats"),
+                cohort_rollback_path.joinpath("rollback_stats")
+            )
+
+    def _prepare_tiler_layers(self, source_name, make_tiler_layers, tiler_layers, sources):
+        # Records which walltowall layer each tiler layer came from and how
+        # long it took to prepare, for the tiling profile.
+        start = time.time()
+        layers = make_tiler_layers()
+        elapsed = time.time() - start
+        layers = layers if isinstance(layers, list) else [layers]
+        for layer in layers:
+            sources[layer.name] = (source_name, elapsed)
+
+        tiler_layers.extend(layers)
+
+        return elapsed
+
     def _make_tiler_layer(self, rule_manager, walltowall_layer):
         return walltowall_layer.to_tiler_layer(
             rule_manager,
@@ -305,15 +435,28 @@ class Project:
         ):
             return None
 
-        all_transition_rules = []
-        for transition_path in (
-            transition_disturbed_path,
-            self.transition_rules_disturbed_path,
-        ):
-            if transition_path and transition_path.exists():
-                all_transition_rules.extend(
-                    (row for row in csv.DictReader(open(transition_path, newline="")))
-                )
+        # The tiler's generated rules can number in the millions, so they are
+        # streamed through in chunks with the missing columns filled in, and
+        # written out once at the end. The user's rules are usually small but
+        # may be in any encoding, so are loaded in one go.
+        sources = []
+        if transition_disturbed_path.exists():
+            sources.append((
+                pd.read_csv(transition_disturbed_path, nrows=0).columns.tolist(),
+                lambda: pd.read_csv(
+                    transition_disturbed_path, dtype=str, keep_default_na=False,
+                    chunksize=self.transition_rule_chunk_size,
+                ),
+            ))
+
+        user_transitions_path = self.transition_rules_disturbed_path
+        if user_transitions_path and user_transitions_path.exists():
+            sources.append((
+                load_csv_header(user_transitions_path),
+                lambda: [load_csv(
+                    user_transitions_path, dtype=str, keep_default_na=False
+                )],
+            ))
 
         non_classifier_cols = {
             "id",
@@ -322,26 +465,31 @@ class Project:
             "disturbance_type",
             "age_reset_type",
         }
-        all_transition_classifiers = set()
-        for transition in all_transition_rules:
-            all_transition_classifiers.update(
-                set(transition.keys()) - non_classifier_cols
-            )
 
-        for transition in all_transition_rules:
-            transition["id"] = transition.get("id", str(uuid4()))
-            transition["disturbance_type"] = transition.get("disturbance_type", "")
-            transition["age_reset_type"] = transition.get("age_reset_type", "absolute")
-            transition["regen_delay"] = transition.get("regen_delay", 0)
+        defaults = {
+            "id": None,
+            "disturbance_type": "",
+            "age_reset_type": "absolute",
+            "regen_delay": "0",
+        }
 
-            for classifier in all_transition_classifiers:
-                transition[classifier] = transition.get(classifier, "?")
+        header = list(sources[0][0]) if sources else []
+        for col in defaults:
+            if col not in header:
+                header.append(col)
 
-            for classifier in self.classifiers:
-                transition[classifier.name] = transition.get(classifier.name, "?")
-                transition[f"{classifier.name}_match"] = transition.get(
-                    f"{classifier.name}_match", ""
-                )
+        for source_cols, _ in sources:
+            for col in source_cols:
+                if col not in header:
+                    header.append(col)
+                    defaults[col] = "" if col in non_classifier_cols else "?"
+
+        for classifier in self.classifiers:
+            for col, default in ((classifier.name, "?"), (f"{classifier.name}_match", "")):
+                if col not in header:
+                    header.append(col)
+
+                defaults.setdefault(col, default)
 
         tiler_transition_undisturbed_path = tiler_output_path.joinpath(
             "undisturbed_transition_rules.csv"
@@ -356,10 +504,19 @@ class Project:
             )
 
         with open(output_path, "w", newline="") as merged_transition_rules:
-            header = all_transition_rules[0].keys()
-            writer = csv.DictWriter(merged_transition_rules, fieldnames=header)
-            writer.writeheader()
-            writer.writerows(all_transition_rules)
+            pd.DataFrame(columns=header).to_csv(merged_transition_rules, index=False)
+            for _, read_chunks in sources:
+                for chunk in read_chunks():
+                    for col in header:
+                        if col in chunk:
+                            continue
+
+                        chunk[col] = (
+                            [str(uuid4()) for _ in range(len(chunk))] if col == "id"
+                            else defaults[col]
+                        )
+
+                    chunk[header].to_csv(merged_transition_rules, index=False, header=False)
 
     def _prepare_extra_data(self, output_path):
         if self.disturbance_rules:
@@ -384,3 +541,48 @@ class Project:
 
         if self.cohort_filters:
             shutil.copyfile(self.cohort_filters, output_path.joinpath("cohort_filter.csv"))
+
+
+def _init_rollback_worker(max_mem_gb, max_workers):
+    ResourceGovernor.configure(max_mem_gb, max_workers)
+
+
+def _init_tiling_worker(max_mem_gb, max_workers, log_level, log_paths):
+    ResourceGovernor.configure(max_mem_gb, max_workers)
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s %(message)s",
+        handlers=[
+            *(logging.FileHandler(log_path, mode="a") for log_path in log_paths),
+            logging.StreamHandler(),
+        ],
+    )
+
+
+def _get_file_signature(path):
+    file_stat = os.stat(path)
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+@contextmanager
+def _read_only(paths):
+    # Files can't be created in or removed from a read-only directory, and the
+    # files in it are made read-only too: they're links to the base layers, so
+    # changing a link's permissions protects the file it shares contents with.
+    write_bits = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+    original_modes = {}
+    for path in paths:
+        for fn in path.iterdir():
+            original_modes[fn] = stat.S_IMODE(fn.stat().st_mode)
+            fn.chmod(original_modes[fn] & ~write_bits)
+
+        original_modes[path] = stat.S_IMODE(path.stat().st_mode)
+        path.chmod(stat.S_IRUSR | stat.S_IXUSR)
+
+    try:
+        yield
+    finally:
+        # Restored in reverse, so a file linked into more than one directory
+        # ends up with the mode it had before the first link was changed.
+        for path, mode in reversed(original_modes.items()):
+            path.chmod(mode)
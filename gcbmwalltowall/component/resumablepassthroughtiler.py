@@ -0,0 +1,99 @@
+from __future__ import annotations
+import os
+from mojadata import passthroughgdaltiler2d
+from mojadata.passthroughgdaltiler2d import PassthroughGdalTiler2D
+from mojadata.tiler import Tiler
+from gcbmwalltowall.util.path import Path
+
+
+class ResumablePassthroughTiler2D(PassthroughGdalTiler2D):
+    """A PassthroughGdalTiler2D that records each layer in a checkpoint
+    directory once it has been copied to the output directory, so that a rerun
+    after a failure part way through only copies the remaining layers. The
+    study_area.json written at the end still lists every layer.
+
+    Accepts the same arguments as PassthroughGdalTiler2D, plus:
+
+    Args:
+        checkpoint_path (str): directory to record each layer in as it is
+            copied; layers recorded by an earlier run whose output still exists
+            are not copied again
+    """
+
+    def __init__(self, *args, checkpoint_path: str | Path, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._checkpoint_path = Path(checkpoint_path).absolute()
+
+    def tile(self, layers, output_path="."):
+        self._skipped_layers = []
+        working_path = os.path.abspath(os.curdir)
+        os.makedirs(output_path, exist_ok=True)
+        os.chdir(output_path)
+        try:
+            layers = self._remove_duplicates(layers)
+            resumed_layers = self._find_resumed_layers(layers)
+            layer_config = {
+                "tile_extent": self._tile_extent,
+                "block_extent": self._block_extent,
+                "compact_attribute_table": self._compact_attribute_table,
+            }
+
+            self._log.info("Processing layers...")
+            pool = self._create_pool(
+                passthroughgdaltiler2d._pool_init, (layers, layer_config)
+            )
+
+            for i, layer in enumerate(layers):
+                if layer.name in resumed_layers:
+                    continue
+
+                pool.apply_async(
+                    passthroughgdaltiler2d._tile_layer, (i,),
+                    callback=self._handle_tile_layer_result,
+                )
+
+            pool.close()
+            pool.join()
+
+            self._bounding_box = layers[0]
+            study_area_info = self._get_study_area_info()
+            study_area_info["layers"] = [
+                layer.metadata for layer in layers
+                if layer.name not in self._skipped_layers
+            ]
+
+            Tiler.write_json(study_area_info, "study_area.json")
+
+            return study_area_info
+        finally:
+            os.chdir(working_path)
+
+    def _handle_tile_layer_result(self, result):
+        super()._handle_tile_layer_result(result)
+        layer_name, success, _ = result
+        if success:
+            self._checkpoint_path.joinpath(f"{layer_name}.done").touch()
+
+    def _find_resumed_layers(self, layers) -> set[str]:
+        self._checkpoint_path.mkdir(parents=True, exist_ok=True)
+        resumed = {
+            layer.name for layer in layers
+            if self._checkpoint_path.joinpath(f"{layer.name}.done").exists()
+            and os.path.exists(_get_output_path(layer))
+        }
+
+        if resumed:
+            self._log.info(
+                f"Resuming tiling: {len(resumed)} of {len(layers)} layers already tiled"
+            )
+
+        return resumed
+
+
+def _get_output_path(layer) -> str:
+    # Same name as the passthrough tiler gives the copy of the layer, relative
+    # to the output directory.
+    raster_name = "{}_moja".format("".join(layer.name.split("_moja")))
+    ext = os.path.splitext(layer.path)[1]
+
+    return f"{raster_name}{ext}"
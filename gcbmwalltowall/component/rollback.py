@@ -1,16 +1,17 @@
+import copy
 import json
 import shutil
 from collections import defaultdict
 
 import numpy as np
 import pandas as pd
-import psutil
 from spatial_inventory_rollback.application.app import run as spatial_rollback
 from spatial_inventory_rollback.application.rollback_app_parameters import \
     RollbackAppParameters
 from sqlalchemy import create_engine, text
 
 from gcbmwalltowall.util.path import Path
+from gcbmwalltowall.util.resources import ResourceGovernor
 
 
 class Rollback:
@@ -69,36 +70,69 @@ class Rollback:
             rollback_age_distribution = output_path.joinpath("age_distribution.json")
             self._convert_age_distribution(classifiers, rollback_age_distribution)
 
-        spatial_rollback(
-            RollbackAppParameters(
-                input_layers=str(tiled_layers_path),
-                input_db=str(input_db_path),
-                inventory_year=inventory_year,
-                rollback_year=self.rollback_year,
-                rollback_age_distribution=str(rollback_age_distribution),
-                prioritize_disturbances=self.prioritize_disturbances,
-                establishment_disturbance_type=(
-                    self.establishment_disturbance_type
-                    if not Path(self.establishment_disturbance_type).exists()
-                    else None
-                ),
-                establishment_disturbance_type_distribution=(
-                    self.establishment_disturbance_type
-                    if Path(self.establishment_disturbance_type).exists()
-                    else None
-                ),
-                single_draw=self.single_draw,
-                output_path=str(output_path),
-                stand_replacing_lookup=self.stand_replacing_lookup,
-                disturbance_type_order=self.disturbance_order,
-                logging_level="INFO",
-                transition_rule_manager=transition_rule_manager,
-                memory_limit_MB=int(
-                    max_mem_gb or (psutil.virtual_memory().available / 1024**3 / 4)
-                ) * 1024,
-                random_seed=self.random_seed,
+        # Without an explicit limit, rollback gets a third of the process
+        # budget (a quarter of available memory by default).
+        with ResourceGovernor.get().lease(
+            "rollback", memory_gb=max_mem_gb, memory_fraction=1 / 3
+        ) as lease:
+            spatial_rollback(
+                RollbackAppParameters(
+                    input_layers=str(tiled_layers_path),
+                    input_db=str(input_db_path),
+                    inventory_year=inventory_year,
+                    rollback_year=self.rollback_year,
+                    rollback_age_distribution=str(rollback_age_distribution),
+                    prioritize_disturbances=self.prioritize_disturbances,
+                    establishment_disturbance_type=(
+                        self.establishment_disturbance_type
+                        if not Path(self.establishment_disturbance_type).exists()
+                        else None
+                    ),
+                    establishment_disturbance_type_distribution=(
+                        self.establishment_disturbance_type
+                        if Path(self.establishment_disturbance_type).exists()
+                        else None
+                    ),
+                    single_draw=self.single_draw,
+                    output_path=str(output_path),
+                    stand_replacing_lookup=self.stand_replacing_lookup,
+                    disturbance_type_order=self.disturbance_order,
+                    logging_level="INFO",
+                    transition_rule_manager=transition_rule_manager,
+                    memory_limit_MB=lease.memory_mb,
+                    random_seed=self.random_seed,
+                )
+            )
+
+    def with_shared_inputs(self, classifiers, input_db_path, shared_path):
+        """Compute the inputs that are the same for every rollback run against
+        the same input database once - the default disturbance order and the
+        json conversion of a spreadsheet age distribution - and return a copy
+        of this Rollback that uses them, i.e. for running cohorts in parallel.
+
+        Args:
+            classifiers (list): the project classifiers
+            input_db_path (str): the input database the rollbacks will use
+            shared_path (str): directory to write the shared inputs to; must
+                outlive any runs of the returned Rollback
+
+        Returns:
+            Rollback: a copy of this Rollback using the shared inputs
+        """
+        shared_path = Path(shared_path).absolute()
+        shared_path.mkdir(parents=True, exist_ok=True)
+        shared = copy.copy(self)
+        if not shared.disturbance_order:
+            shared.disturbance_order = shared_path.joinpath("disturbance_order.txt")
+            self._get_default_disturbance_order(Path(input_db_path).absolute()).to_csv(
+                shared.disturbance_order, index=False, header=False
             )
-        )
+
+        if self.age_distribution.suffix in (".xls", ".xlsx"):
+            shared.age_distribution = shared_path.joinpath("age_distribution.json")
+            self._convert_age_distribution(classifiers, shared.age_distribution)
+
+        return shared
 
     def _convert_age_distribution(self, classifiers, output_path):
         age_distributions = []
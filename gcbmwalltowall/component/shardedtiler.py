@@ -0,0 +1,391 @@
+from __future__ import annotations
+import json
+import logging
+import math
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import mkdtemp
+from typing import Any
+import numpy as np
+import pandas as pd
+from mojadata.boundingbox import BoundingBox as TilerBoundingBox
+from mojadata.cleanup import register_temp_dir
+from mojadata.gdaltiler2d import _write_native_attribute_table
+from mojadata.layer.rasterlayer import RasterLayer
+from mojadata.tiler import Tiler
+from mojadata.util import gdal
+from mojadata.util.gdalhelper import GDALHelper
+from osgeo import gdal_array
+from gcbmwalltowall.component.profilingtiler import ProfilingGdalTiler2D
+from gcbmwalltowall.util.encoding import load_json
+from gcbmwalltowall.util.path import Path
+
+
+class ShardedTiler:
+    """Tiles a study area in shards so that no single tiling job has to hold
+    the whole study area: the bounding box is split along its longer side into
+    groups of whole tiles, every layer is tiled against each shard's part of
+    the bounding box in its own process, and the shards' outputs are stitched
+    into one set of tiled layers and a merged study_area.json.
+
+    Each shard numbers its attribute table values independently, so stitching
+    gives every distinct attribute value (or combination of values) one pixel
+    value across all shards and remaps each shard's pixels to it. Shards share
+    the caller's transition rule registry, so transition rule ids are already
+    the same in every shard.
+
+    Shard outputs are written to a "_shards" directory in the output path,
+    which must be on a filesystem shared by the shard processes, and removed
+    once stitched. The shards' bounding boxes are made once, next to the first
+    output path, and reused by later calls to :py:meth:`tile` (i.e. for
+    cohorts) until the surrounding mojadata cleanup context exits.
+
+    Args:
+        bounding_box (mojadata BoundingBox): the study area
+        epsg (int): the study area's projection
+        shards (int): the maximum number of shards to split the study area
+            into; fewer are used if the study area has fewer tiles along its
+            longer side, and shards with no data are skipped
+        tile_extent (float, optional): the tile size used by the tiler
+        workers (int, optional): total tiler workers, shared by shards
+            running at the same time
+        total_mem_bytes (int, optional): total tiler memory, shared by shards
+            running at the same time
+    """
+
+    def __init__(
+        self,
+        bounding_box: TilerBoundingBox,
+        epsg: int,
+        shards: int,
+        tile_extent: float = 1.0,
+        workers: int = None,
+        total_mem_bytes: int = None,
+    ):
+        self.bounding_box = bounding_box
+        self.epsg = epsg
+        self.shards = max(1, int(shards))
+        self.tile_extent = tile_extent
+        self.workers = max(1, workers or os.cpu_count())
+        self.total_mem_bytes = total_mem_bytes
+        self._shard_bboxes = None
+
+    def tile(
+        self, layers: list, output_path: str | Path, sources: dict[str, tuple[str, float]] = None
+    ) -> dict[str, Any]:
+        """Tile the layers into the output path.
+
+        Args:
+            layers (list): the tiler layers
+            output_path (str): the tiled layer directory
+            sources (dict, optional): passed to
+                :py:meth:`ProfilingGdalTiler2D.tile`
+
+        Returns:
+            dict: the merged study area
+        """
+        output_path = Path(output_path).absolute()
+        shard_root = output_path.joinpath("_shards")
+        shutil.rmtree(shard_root, ignore_errors=True)
+        shard_root.mkdir(parents=True)
+
+        if self._shard_bboxes is None:
+            bbox_path = Path(mkdtemp(prefix="shard_bounding_boxes_", dir=output_path.parent))
+            register_temp_dir(str(bbox_path))
+            self._shard_bboxes = self._make_shard_bounding_boxes(bbox_path)
+
+        shard_bboxes = self._shard_bboxes
+        if not shard_bboxes:
+            raise RuntimeError("Bounding box has no data to tile")
+
+        # Shards run concurrently when there are fewer layers than workers.
+        concurrent_shards = min(len(shard_bboxes), max(1, self.workers // max(1, len(layers))))
+        shard_workers = max(1, self.workers // concurrent_shards)
+        shard_mem_bytes = (
+            self.total_mem_bytes // concurrent_shards if self.total_mem_bytes else None
+        )
+
+        logging.info(
+            f"Tiling {len(layers)} layers in {len(shard_bboxes)} shards, "
+            f"{concurrent_shards} at a time with {shard_workers} workers each"
+        )
+
+        shard_paths = [shard_root.joinpath(str(i)) for i in range(len(shard_bboxes))]
+        with ProcessPoolExecutor(concurrent_shards) as pool:
+            list(pool.map(
+                _tile_shard,
+                shard_bboxes,
+                [self.epsg] * len(shard_bboxes),
+                [layers] * len(shard_bboxes),
+                shard_paths,
+                [sources] * len(shard_bboxes),
+                [shard_workers] * len(shard_bboxes),
+                [shard_mem_bytes] * len(shard_bboxes),
+            ))
+
+        study_area = stitch_shards(shard_paths, output_path, self.workers)
+        shutil.rmtree(shard_root, ignore_errors=True)
+
+        return study_area
+
+    def _make_shard_bounding_boxes(self, bbox_path: Path) -> list[str]:
+        working_path = os.path.abspath(os.curdir)
+        os.chdir(bbox_path)
+        try:
+            self.bounding_box.init()
+        finally:
+            os.chdir(working_path)
+
+        study_area_path = self.bounding_box._layer.path
+        ds = gdal.Open(study_area_path)
+        x_min, res, _, y_max, _, y_res = ds.GetGeoTransform()
+        x_max = x_min + res * ds.RasterXSize
+        y_min = y_max + y_res * ds.RasterYSize
+        del ds
+
+        shard_bboxes = []
+        for i, (ulx, uly, lrx, lry) in enumerate(
+            split_extent((x_min, y_min, x_max, y_max), self.tile_extent, self.shards)
+        ):
+            shard_bbox_path = str(bbox_path.joinpath(f"bounding_box_{i}.tif"))
+            gdal.Translate(shard_bbox_path, study_area_path, projWin=[ulx, uly, lrx, lry])
+            if RasterLayer.is_empty_layer(shard_bbox_path):
+                continue
+
+            shard_bboxes.append(shard_bbox_path)
+
+        return shard_bboxes
+
+
+def split_extent(
+    extent: tuple[float, float, float, float], tile_extent: float, shards: int
+) -> list[tuple[float, float, float, float]]:
+    """Split an extent along its longer side into at most the specified number
+    of bands, each covering a whole number of tiles.
+
+    Args:
+        extent (tuple): x_min, y_min, x_max, y_max
+        tile_extent (float): the tile size
+        shards (int): the maximum number of bands
+
+    Returns:
+        list: the bands as (upper left x, upper left y, lower right x, lower
+            right y), clipped to the extent, from the upper left
+    """
+    x_min, y_min, x_max, y_max = extent
+    tile_x_min = math.floor(x_min / tile_extent) * tile_extent
+    tile_y_max = math.ceil(y_max / tile_extent) * tile_extent
+    cols = max(1, round((math.ceil(x_max / tile_extent) * tile_extent - tile_x_min) / tile_extent))
+    rows = max(1, round((tile_y_max - math.floor(y_min / tile_extent) * tile_extent) / tile_extent))
+
+    bands = []
+    if cols >= rows:
+        for group in np.array_split(np.arange(cols), min(shards, cols)):
+            bands.append((
+                max(x_min, tile_x_min + int(group[0]) * tile_extent), y_max,
+                min(x_max, tile_x_min + (int(group[-1]) + 1) * tile_extent), y_min,
+            ))
+    else:
+        for group in np.array_split(np.arange(rows), min(shards, rows)):
+            bands.append((
+                x_min, min(y_max, tile_y_max - int(group[0]) * tile_extent),
+                x_max, max(y_min, tile_y_max - (int(group[-1]) + 1) * tile_extent),
+            ))
+
+    return bands
+
+
+def _tile_shard(bbox_path, epsg, layers, output_path, sources, workers, total_mem_bytes):
+    bounding_box = TilerBoundingBox(RasterLayer(bbox_path), epsg=epsg, preprocessed=True)
+    tiler = ProfilingGdalTiler2D(
+        bounding_box,
+        use_bounding_box_resolution=True,
+        workers=min(workers, len(layers)),
+        total_mem_bytes=total_mem_bytes,
+    )
+
+    logging.info(f"Tiling shard {Path(output_path).name}")
+    tiler.tile(layers, str(output_path), sources)
+
+
+def stitch_shards(shard_paths: list[Path], output_path: Path, workers: int = None) -> dict[str, Any]:
+    """Stitch tiled shards into a single set of tiled layers.
+
+    Args:
+        shard_paths (list): the shards' tiled layer directories
+        output_path (Path): the directory to write the stitched layers,
+            study_area.json and tiling_profile.csv to
+        workers (int, optional): number of layers to stitch at once
+
+    Returns:
+        dict: the merged study area
+    """
+    shard_study_areas = [load_json(path.joinpath("study_area.json")) for path in shard_paths]
+    study_area = merge_study_areas(shard_study_areas)
+    layer_names = [layer["name"] for layer in study_area["layers"]]
+    with ProcessPoolExecutor(workers) as pool:
+        list(pool.map(
+            _stitch_layer,
+            layer_names,
+            [shard_paths] * len(layer_names),
+            [output_path] * len(layer_names),
+        ))
+
+    Tiler.write_json(study_area, str(output_path.joinpath("study_area.json")))
+
+    profiles = []
+    for i, path in enumerate(shard_paths):
+        profile_path = path.joinpath("tiling_profile.csv")
+        if profile_path.exists():
+            profiles.append(pd.read_csv(profile_path).assign(shard=i))
+
+    if profiles:
+        pd.concat(profiles).to_csv(output_path.joinpath("tiling_profile.csv"), index=False)
+
+    return study_area
+
+
+def merge_study_areas(study_areas: list[dict[str, Any]]) -> dict[str, Any]:
+    """Merge the study areas of a set of shards: the union of their tiles and
+    layers, with the tile, block and pixel size of the first.
+    """
+    merged = {k: v for k, v in study_areas[0].items() if k not in ("tiles", "layers")}
+    tiles = {}
+    layers = {}
+    for study_area in study_areas:
+        for tile in study_area["tiles"]:
+            tiles.setdefault(tile["index"], tile)
+
+        for layer in study_area["layers"]:
+            layers.setdefault(layer["name"], layer)
+
+    merged["tiles"] = [tiles[index] for index in sorted(tiles)]
+    merged["layers"] = list(layers.values())
+
+    return merged
+
+
+def merge_attribute_tables(
+    attribute_tables: list[dict[str, Any] | None],
+) -> tuple[dict[str, Any], list[dict[int, int]]]:
+    """Give every distinct attribute value in a set of shard attribute tables
+    one pixel value.
+
+    Args:
+        attribute_tables (list): each shard's attribute table in tiler
+            metadata format (pixel value to attribute value or dict of
+            attribute values), or None for shards without the layer
+
+    Returns:
+        tuple: the merged attribute table and, for each shard, a map of its
+            pixel values to the merged pixel values
+    """
+    merged_ids = {}
+    merged_table = {}
+    remaps = []
+    for attribute_table in attribute_tables:
+        remap = {}
+        for px, value in (attribute_table or {}).items():
+            key = json.dumps(value, sort_keys=True)
+            if key not in merged_ids:
+                merged_ids[key] = len(merged_ids) + 1
+                merged_table[str(merged_ids[key])] = value
+
+            remap[int(px)] = merged_ids[key]
+
+        remaps.append(remap)
+
+    return merged_table, remaps
+
+
+def _stitch_layer(name: str, shard_paths: list[Path], output_path: Path):
+    from gcbmwalltowall.util.rastersession import RasterSession
+    from gcbmwalltowall.util.gdalhelpers import gdal_creation_options
+    from gcbmwalltowall.util.valuemap import ValueMap
+
+    parts = []
+    for shard_path in shard_paths:
+        metadata_path = shard_path.joinpath(f"{name}_moja.json")
+        raster_path = next(shard_path.glob(f"{name}_moja.tif*"), None)
+        if raster_path and metadata_path.exists():
+            parts.append((str(raster_path), load_json(metadata_path)))
+
+    if not parts:
+        return
+
+    merged_table, remaps = merge_attribute_tables([meta.get("attributes") for _, meta in parts])
+    if merged_table:
+        data_type = GDALHelper.best_fit_data_type((0, len(merged_table)), allow_float=False)
+        nodata = GDALHelper.best_nodata_value(data_type)
+    else:
+        dtypes = [
+            np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(gdal.GetDataTypeByName(meta["layer_data"])))
+            for _, meta in parts
+        ]
+
+        dtype = np.result_type(*dtypes)
+        data_type = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+        nodata_values = {meta["nodata"] for _, meta in parts}
+        nodata = (
+            next(iter(nodata_values)) if len(nodata_values) == 1
+            else GDALHelper.best_nodata_value(data_type)
+        )
+
+    dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(data_type))
+    for remap, (_, meta) in zip(remaps, parts):
+        if meta["nodata"] != nodata:
+            remap[meta["nodata"]] = nodata
+
+    # All shards are on the same pixel grid, padded to whole tiles.
+    extents = []
+    for raster_path, _ in parts:
+        ds = gdal.Open(raster_path)
+        x_min, res, _, y_max, _, y_res = ds.GetGeoTransform()
+        extents.append((x_min, y_max, ds.RasterXSize, ds.RasterYSize))
+        projection = ds.GetProjection()
+        del ds
+
+    merged_x_min = min(x for x, _, _, _ in extents)
+    merged_y_max = max(y for _, y, _, _ in extents)
+    width = max(round((x - merged_x_min) / res) + w for x, _, w, _ in extents)
+    height = max(round((merged_y_max - y) / res) + h for _, y, _, h in extents)
+
+    merged_path = str(output_path.joinpath(f"{name}_moja.tiff"))
+    ds = gdal.GetDriverByName("GTiff").Create(
+        merged_path, width, height, 1, data_type, gdal_creation_options + ["SPARSE_OK=TRUE"]
+    )
+
+    ds.SetGeoTransform((merged_x_min, res, 0, merged_y_max, 0, y_res))
+    ds.SetProjection(projection)
+    ds.GetRasterBand(1).SetNoDataValue(nodata)
+    del ds
+
+    with RasterSession() as session:
+        for (raster_path, _), remap, (x, y, _, _) in zip(parts, remaps, extents):
+            value_map = ValueMap(remap, dtype)
+            x_off = round((x - merged_x_min) / res)
+            y_off = round((merged_y_max - y) / res)
+            for bounds, (data,) in session.read_chunks(raster_path):
+                session.write(
+                    merged_path,
+                    value_map.apply(data.astype(dtype)),
+                    x_off + bounds.x_off,
+                    y_off + bounds.y_off,
+                )
+
+    metadata = dict(parts[0][1])
+    metadata["layer_data"] = gdal.GetDataTypeName(data_type)
+    metadata["nodata"] = nodata
+    if merged_table:
+        metadata["attributes"] = merged_table
+        native_attributes = ["null"] * (len(merged_table) + 1)
+        for px, value in merged_table.items():
+            native_attributes[int(px)] = (
+                repr([str(v) for v in value.values()]) if isinstance(value, dict)
+                else str(value)
+            )
+
+        _write_native_attribute_table(merged_path, native_attributes)
+
+    Tiler.write_json(metadata, str(output_path.joinpath(f"{name}_moja.json")))
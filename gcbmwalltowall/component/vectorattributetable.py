@@ -21,6 +21,10 @@ class VectorAttributeTable(AttributeTable):
     _attribute_cache = {}
     _data_cache = {}
 
+    # Processes to read distinct attribute values with, or None for one per
+    # CPU; set to 1 by callers that read several attribute tables at once.
+    max_workers = None
+
     def __init__(
         self,
         layer_path: Path | str,
@@ -77,6 +81,17 @@ class VectorAttributeTable(AttributeTable):
             for attribute in selected_attributes
         }
 
+    def get_value_map(
+        self, attributes: str | list[str] = None
+    ) -> dict[str, dict[Any, Any]]:
+        selected_attributes = self._get_selected_attributes(attributes)
+        attribute_data = self._data(selected_attributes)
+
+        return {
+            attribute: attribute_data[attribute].copy()
+            for attribute in selected_attributes
+        }
+
     def to_tiler_args(
         self,
         attributes: str | list[str] = None,
@@ -201,15 +216,21 @@ class VectorAttributeTable(AttributeTable):
         return attributes
 
     def _extract_attribute_table(self, attributes: list[str]) -> dict[str, list[Any]]:
+        # The exception mode is global; leave it alone if a caller has already
+        # turned exceptions on.
+        toggle_exceptions = not ogr.GetUseExceptions()
         try:
-            ogr.UseExceptions()
+            if toggle_exceptions:
+                ogr.UseExceptions()
+
             ds = ogr.Open(str(self.layer_path))
             lyr = ds.GetLayerByName(self.layer) if self.layer else ds.GetLayer(0)
         except Exception as e:
             logging.fatal(e)
             sys.exit(f"Fatal error loading {self.layer_path}")
         finally:
-            ogr.DontUseExceptions()
+            if toggle_exceptions:
+                ogr.DontUseExceptions()
 
         ds_table = lyr.GetName()
         if ds is None or ds_table is None:
@@ -231,24 +252,31 @@ class VectorAttributeTable(AttributeTable):
             raise RuntimeError(error)
 
         attribute_table = {}
-        tasks = []
-        with Pool() as pool:
-            num_attributes = len(attributes)
+        num_attributes = len(attributes)
+        if self.max_workers == 1:
             for i, attribute in enumerate(attributes):
-                field_num = i + 1
-                logging.info(f"    ({field_num} / {num_attributes}) {attribute}")
-                tasks.append(
-                    pool.apply_async(
-                        self._get_distinct_attribute_values, (ds_table, attribute)
-                    )
+                logging.info(f"    ({i + 1} / {num_attributes}) {attribute}")
+                _, attribute_table[attribute] = self._get_distinct_attribute_values(
+                    ds_table, attribute
                 )
+        else:
+            tasks = []
+            with Pool(self.max_workers) as pool:
+                for i, attribute in enumerate(attributes):
+                    field_num = i + 1
+                    logging.info(f"    ({field_num} / {num_attributes}) {attribute}")
+                    tasks.append(
+                        pool.apply_async(
+                            self._get_distinct_attribute_values, (ds_table, attribute)
+                        )
+                    )
 
-            pool.close()
-            pool.join()
+                pool.close()
+                pool.join()
 
-        for task in tasks:
-            attribute, unique_values = task.get()
-            attribute_table[attribute] = unique_values
+            for task in tasks:
+                attribute, unique_values = task.get()
+                attribute_table[attribute] = unique_values
 
         # Fix any unicode errors and ensure the final attribute values are UTF-8.
         # This fixes cases where a shapefile has a bad encoding along with non-ASCII
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import logging
+from tempfile import mkdtemp
+from typing import Any
+from mojadata.cleanup import register_temp_dir
+from mojadata.util import ogr
+from gcbmwalltowall.component.layer import Layer
+from gcbmwalltowall.util.path import Path
+
+
+class VectorSplitter:
+    """Splits a vector layer into one layer per combination of values of a set
+    of attributes by reading the source features once and writing each of them
+    into its combination's layer in a temporary GeoPackage. Combinations with no
+    features never produce a layer, so the tiler only rasterizes the features
+    that exist instead of scanning the whole source once per combination.
+
+    Combinations are made from the attributes' final values, i.e. after any
+    lookup table substitutions, the same as the layer's attribute table.
+
+    Args:
+        layer (Layer): the vector layer to split
+    """
+
+    # Features written between commits to the GeoPackage.
+    commit_interval = 100_000
+
+    def __init__(self, layer: Layer):
+        self.layer = layer
+
+    def can_split(self, split_attributes: list[str]) -> bool:
+        """Check if the split attributes are all fields in the source layer;
+        attributes from an extended attribute table are not.
+        """
+        if self.layer.extended_attribute_table:
+            return False
+
+        ds = ogr.Open(str(self.layer.path))
+        if ds is None:
+            return False
+
+        lyr = ds.GetLayerByName(self.layer.layer) if self.layer.layer else ds.GetLayer(0)
+        if lyr is None:
+            return False
+
+        fields = {field.GetName() for field in lyr.schema}
+
+        return set(split_attributes).issubset(fields)
+
+    def split(
+        self, split_values: dict[str, list[Any]]
+    ) -> dict[tuple[Any, ...], tuple[Path, str]]:
+        """Split the layer.
+
+        Args:
+            split_values (dict): attribute name to the final values to split
+                on; features with any other value are left out
+
+        Returns:
+            dict: combination of split values (in split_values order) to the
+                path and layer name of the split layer, for non-empty
+                combinations only, sorted by combination
+        """
+        split_attributes = list(split_values.keys())
+        value_maps = self.layer._load_lookup_table().get_value_map(split_attributes)
+        allowed_values = [set(split_values[attr]) for attr in split_attributes]
+
+        output_path = Path(mkdtemp(prefix=f"{self.layer.name}_split_"))
+        register_temp_dir(str(output_path))
+        split_layers = self._write_buckets(output_path, split_attributes, value_maps, allowed_values)
+        logging.info(
+            f"  split {self.layer.path.name} into {len(split_layers)} non-empty layers"
+        )
+
+        return dict(sorted(
+            split_layers.items(), key=lambda item: tuple(str(v) for v in item[0])
+        ))
+
+    def _write_buckets(self, output_path, split_attributes, value_maps, allowed_values):
+        src_ds = ogr.Open(str(self.layer.path))
+        src_lyr = src_ds.GetLayerByName(self.layer.layer) if self.layer.layer else src_ds.GetLayer(0)
+        src_defn = src_lyr.GetLayerDefn()
+        field_idx = [src_defn.GetFieldIndex(attr) for attr in split_attributes]
+
+        # Every bucket is a layer in the same GeoPackage, so only one database
+        # is open however many combinations there are.
+        bucket_path = output_path.joinpath("split.gpkg")
+        out_ds = ogr.GetDriverByName("GPKG").CreateDataSource(str(bucket_path))
+        buckets = {}
+        uncommitted = 0
+        out_ds.StartTransaction()
+        for feature in src_lyr:
+            key = []
+            for idx, value_map, allowed in zip(field_idx, value_maps.values(), allowed_values):
+                value = value_map.get(feature.GetField(idx))
+                if value is None or value not in allowed:
+                    break
+
+                key.append(value)
+            else:
+                key = tuple(key)
+                if key not in buckets:
+                    buckets[key] = self._create_bucket(out_ds, f"split_{len(buckets)}", src_lyr)
+
+                out_lyr = buckets[key]
+                out_feature = ogr.Feature(out_lyr.GetLayerDefn())
+                out_feature.SetFrom(feature)
+                out_lyr.CreateFeature(out_feature)
+                uncommitted += 1
+                if uncommitted == self.commit_interval:
+                    out_ds.CommitTransaction()
+                    out_ds.StartTransaction()
+                    uncommitted = 0
+
+        out_ds.CommitTransaction()
+
+        # The GeoPackage is closed when this returns.
+        return {
+            key: (bucket_path, out_lyr.GetName())
+            for key, out_lyr in buckets.items()
+        }
+
+    def _create_bucket(self, out_ds, name: str, src_lyr):
+        # Layers are created between transactions.
+        out_ds.CommitTransaction()
+        out_lyr = out_ds.CreateLayer(
+            name, src_lyr.GetSpatialRef(), src_lyr.GetGeomType()
+        )
+
+        src_defn = src_lyr.GetLayerDefn()
+        for i in range(src_defn.GetFieldCount()):
+            out_lyr.CreateField(src_defn.GetFieldDefn(i))
+
+        out_ds.StartTransaction()
+
+        return out_lyr
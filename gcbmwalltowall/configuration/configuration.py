@@ -1,11 +1,18 @@
 import json
 import site
 import sys
+from copy import deepcopy
+from threading import Lock
 from gcbmwalltowall.util.encoding import load_json
 from gcbmwalltowall.util.path import Path
 from gcbmwalltowall.util.encoding import load_csv
 
 
+def _load_settings_json(path):
+    with open(path) as settings_file:
+        return json.load(settings_file)
+
+
 class Configuration(dict):
 
     global_settings_paths = [
@@ -16,6 +23,12 @@ class Configuration(dict):
         Path(site.USER_BASE, "Tools", "gcbmwalltowall", "settings.json"),
     ]
 
+    # Parsed json files keyed on path, invalidated when the file changes, so
+    # that long-running processes (i.e. batch runs) don't re-read and re-parse
+    # the same project and settings files for every command.
+    _json_cache = {}
+    _json_cache_lock = Lock()
+
     def __init__(self, d, config_path, working_path=None):
         super().__init__(d)
         self.config_path = Path(config_path).absolute()
@@ -109,7 +122,9 @@ class Configuration(dict):
         settings_keys = set()
         for config_path in Configuration.global_settings_paths:
             if config_path.is_file():
-                settings_keys.update(json.load(open(config_path)).keys())
+                settings_keys.update(
+                    Configuration._load_cached(config_path, _load_settings_json).keys()
+                )
 
         return settings_keys
 
@@ -145,7 +160,7 @@ class Configuration(dict):
         project_settings = self.copy()
         for config_path in Configuration.global_settings_paths:
             if config_path.is_file():
-                self.update(json.load(open(config_path)))
+                self.update(Configuration._load_cached(config_path, _load_settings_json))
 
         self.update(project_settings)
 
@@ -159,12 +174,26 @@ class Configuration(dict):
             + ", ".join((str(p) for p in Configuration.global_settings_paths))
         )
 
+    @staticmethod
+    def _load_cached(path, loader):
+        path = Path(path).absolute()
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with Configuration._json_cache_lock:
+            cached_key, cached_data = Configuration._json_cache.get(path, (None, None))
+            if cached_key != key:
+                cached_data = loader(path)
+
+                Configuration._json_cache[path] = (key, cached_data)
+
+            return deepcopy(cached_data)
+
     @classmethod
     def load(cls, config_path, working_path=None):
         config_path = Path(config_path).absolute()
 
         return cls(
-            load_json(config_path),
+            Configuration._load_cached(config_path, load_json),
             config_path.parent,
             Path(working_path or config_path.parent).absolute(),
         )
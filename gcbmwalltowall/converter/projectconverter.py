@@ -15,6 +15,7 @@ from arrow_space.raster_indexed_dataset import RasterIndexedDataset
 from cbm4.app.spatial.spatial_cbm4.classifier_tree import ClassifierTree
 from contextlib import contextmanager
 from tempfile import TemporaryDirectory
+from threading import Lock
 from typing import Any
 from gcbmwalltowall.component.preparedproject import PreparedProject
 from gcbmwalltowall.configuration.gcbmconfigurer import GCBMConfigurer
@@ -30,6 +31,13 @@ from gcbmwalltowall.util.encoding import load_csv
 
 class ProjectConverter:
 
+    # cbm_defaults databases built from an AIDB, shared by every conversion in
+    # the same process (i.e. a batch run) and keyed on the AIDB's path,
+    # modification time and locale.
+    _cbm_defaults_cache: dict[tuple, Path] = {}
+    _cbm_defaults_cache_dir: TemporaryDirectory = None
+    _cbm_defaults_cache_lock = Lock()
+
     def __init__(self, creation_options=None, disturbance_cohorts=False):
         self._disturbance_cohorts = disturbance_cohorts
         self._creation_options: dict[str, Any] = {
@@ -589,16 +597,41 @@ class ProjectConverter:
         if aidb_path.suffix == ".db":
             shutil.copyfile(aidb_path, output_cbm_defaults_path)
         else:
+            shutil.copyfile(
+                self._get_cached_cbm_defaults(aidb_path, locale),
+                output_cbm_defaults_path
+            )
+
+        return output_cbm_defaults_path
+
+    def _get_cached_cbm_defaults(self, aidb_path, locale):
+        aidb_path = Path(aidb_path).absolute()
+        cache_key = (str(aidb_path), aidb_path.stat().st_mtime_ns, locale)
+        cls = ProjectConverter
+        with cls._cbm_defaults_cache_lock:
+            cached_path = cls._cbm_defaults_cache.get(cache_key)
+            if cached_path is not None and cached_path.exists():
+                return cached_path
+
+            if cls._cbm_defaults_cache_dir is None:
+                cls._cbm_defaults_cache_dir = TemporaryDirectory()
+
+            cached_path = Path(cls._cbm_defaults_cache_dir.name).joinpath(
+                f"cbm_defaults_{len(cls._cbm_defaults_cache)}.db"
+            )
+
             make_cbm_defaults(
                 {
-                    "output_path": output_cbm_defaults_path,
+                    "output_path": cached_path,
                     "default_locale": locale,
                     "locales": [{"id": 1, "code": locale}],
                     "archive_index_data": [{"locale": locale, "path": str(aidb_path)}],
                 }
             )
 
-        return output_cbm_defaults_path
+            cls._cbm_defaults_cache[cache_key] = cached_path
+
+            return cached_path
 
     def _load_disturbance_order(self, project: PreparedProject) -> dict[str, int]:
         ordered_db_dist_types = self._load_disturbance_types(project)
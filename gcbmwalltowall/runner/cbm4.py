@@ -11,6 +11,8 @@ from arrow_space.raster_indexed_dataset import RasterIndexedDataset
 from cbm4.app.spatial.spatial_cbm3.spatial_cbm3_app import (
     create_simulation_dataset, spinup_all, step_all)
 from cbm4.app.spatial.event_handler.event_processor import EventProcessor
+from gcbmwalltowall.runner.checkpoint import SimulationCheckpoint
+from gcbmwalltowall.runner.spinupcache import SpinupCache, hash_path, package_versions
 from gcbmwalltowall.util.path import Path
 from tqdm import tqdm
 
@@ -86,50 +88,111 @@ def run(
     on_pre_spinup: Callable[[str]] | None = None,
     on_pre_simulation: Callable[[str]] | None = None,
     end_year: int | None = None,
+    spinup_cache_path: str | Path | None = None,
+    resume: bool = False,
+    checkpoint_interval: int = 1,
     **kwargs
 ):
     simulation_config, spinup_config, step_configs = load_config(
         cbm4_config_path, end_year=end_year, **kwargs
     )
 
+    json_config = json.load(open(cbm4_config_path))
+    spinup_cached = json_config.get("cache") is not None
+
+    checkpoint = SimulationCheckpoint(
+        Path(cbm4_config_path).absolute().parent,
+        {
+            "engine": "libcbm",
+            "config": Path(cbm4_config_path).read_text(),
+            "end_year": end_year,
+        },
+        resume,
+        checkpoint_interval,
+    )
+
+    # The pre-spinup callback can change the simulation dataset in ways the
+    # fingerprint can't see, so spinups that use one are never cached.
+    spinup_cache = None if on_pre_spinup else SpinupCache.from_config(
+        cbm4_config_path, json_config, spinup_cache_path
+    )
+
+    if spinup_cache is not None and not checkpoint.resuming:
+        spinup_inputs = {
+            "engine": "libcbm",
+            "inventory": hash_path(spinup_config["inventory_dataset"]["path_or_uri"]),
+            "cbm_defaults_locale": spinup_config["cbm_defaults_locale"],
+            "use_smoother": spinup_config["use_smoother"],
+            "versions": package_versions("cbm4", "libcbm", "arrow_space"),
+        }
+        spinup_fingerprint = spinup_cache.fingerprint(spinup_inputs)
+
     cbm4_root = os.path.join(
         simulation_config["out_simulation_dataset"]["path_or_uri"],
         ".."
     )
 
-    shutil.rmtree(simulation_config["out_simulation_dataset"]["path_or_uri"], True)
-
     step_times = []
-    start = time.time()
-    create_simulation_dataset(simulation_config)
-    step_times.append(["create simulation dataset", (time.time() - start)])
+    spinup_restored = False
+    if not checkpoint.resuming:
+        shutil.rmtree(simulation_config["out_simulation_dataset"]["path_or_uri"], True)
 
-    if on_pre_spinup is not None:
-        start = time.time()
-        on_pre_spinup(simulation_config["out_simulation_dataset"]["path_or_uri"])
-        step_times.append(["pre-spinup callback", (time.time() - start)])
+        if spinup_cache is not None:
+            start = time.time()
+            spinup_restored = spinup_cache.restore(
+                spinup_fingerprint, simulation_config["out_simulation_dataset"]
+            )
+            if spinup_restored:
+                step_times.append(["spinup (cached)", (time.time() - start)])
+
+        if not spinup_restored:
+            start = time.time()
+            create_simulation_dataset(simulation_config)
+            step_times.append(["create simulation dataset", (time.time() - start)])
+
+        if on_pre_spinup is not None:
+            start = time.time()
+            on_pre_spinup(simulation_config["out_simulation_dataset"]["path_or_uri"])
+            step_times.append(["pre-spinup callback", (time.time() - start)])
 
-    spinup_cached = json.load(open(cbm4_config_path)).get("cache") is not None
     with tqdm(desc="Simulation", total=len(step_configs) + (0 if spinup_cached else 1)) as pbar:
+        if not checkpoint.spinup_complete:
+            if not spinup_cached and not spinup_restored:
+                start = time.time()
+                spinup_all(spinup_config)
+                step_times.append(["spinup", (time.time() - start)])
+                if spinup_cache is not None:
+                    start = time.time()
+                    spinup_cache.store(
+                        spinup_fingerprint, simulation_config["out_simulation_dataset"],
+                        spinup_inputs,
+                    )
+                    step_times.append(["store spinup cache", (time.time() - start)])
+
+            checkpoint.complete_spinup()
+
         if not spinup_cached:
-            start = time.time()
-            spinup_all(spinup_config)
             pbar.update()
-            step_times.append(["spinup", (time.time() - start)])
 
-        if on_pre_simulation is not None:
+        if on_pre_simulation is not None and not checkpoint.last_timestep:
             start = time.time()
             on_pre_simulation(simulation_config["out_simulation_dataset"]["path_or_uri"])
             step_times.append(["pre-simulation callback", (time.time() - start)])
 
         with TemporaryDirectory() as tmp:
             # Create a temporary working copy of the disturbance dataset to be used
-            # by rule-based EventProcessor.
+            # by rule-based EventProcessor - when resuming, the copy saved with the
+            # last checkpoint.
             working_disturbance_ds_path = Path(tmp).joinpath("disturbance")
-            RasterIndexedDataset(
-                simulation_config["disturbance_dataset"]["dataset_name"],
-                simulation_config["disturbance_dataset"]["storage_type"],
-                simulation_config["disturbance_dataset"]["path_or_uri"]
+            (
+                RasterIndexedDataset(
+                    "disturbance", "local_storage", str(checkpoint.disturbance_snapshot_path)
+                ) if checkpoint.disturbance_snapshot_path
+                else RasterIndexedDataset(
+                    simulation_config["disturbance_dataset"]["dataset_name"],
+                    simulation_config["disturbance_dataset"]["storage_type"],
+                    simulation_config["disturbance_dataset"]["path_or_uri"]
+                )
             ).copy("disturbance", "local_storage", str(working_disturbance_ds_path))
             
             working_disturbance_ds = RasterIndexedDataset(
@@ -145,6 +208,10 @@ def run(
             t0_event_processor = None
             event_processor = EventProcessor.for_datasets(simulation_ds, working_disturbance_ds)
             for i, step_config in enumerate(step_configs):
+                if step_config["timestep"] <= checkpoint.last_timestep:
+                    pbar.update()
+                    continue
+
                 start = time.time()
                 if i == 0 and spinup_cached:
                     t0_simulation_ds = RasterIndexedDataset(
@@ -163,6 +230,10 @@ def run(
                 
                 step_config["disturbance_dataset"]["path_or_uri"] = str(working_disturbance_ds_path)
                 step_all(step_config)
+                checkpoint.complete_timestep(
+                    step_config["timestep"], working_disturbance_ds,
+                    final=(i == len(step_configs) - 1),
+                )
                 pbar.update()
                 step_times.append(
                     [f"timestep_{step_config['timestep']}", (time.time() - start)]
@@ -176,3 +247,5 @@ def run(
         time_profiling.to_csv(
             Path(cbm4_config_path).absolute().parent.joinpath("profiling.csv"), index=False
         )
+
+    checkpoint.clear()
@@ -15,6 +15,9 @@ from cbmspec_cbm3.models import cbmspec_cbm3_single_matrix
 from cbmspec_cbm3.parameters.cbm_defaults import cbm4_parameter_dataset_factory
 from tqdm import tqdm
 
+from gcbmwalltowall.runner.checkpoint import SimulationCheckpoint
+from gcbmwalltowall.runner.parameterdatasets import get_parameter_inputs, reuse_or_create
+from gcbmwalltowall.runner.spinupcache import SpinupCache, package_versions
 from gcbmwalltowall.util.path import Path
 
 
@@ -51,6 +54,40 @@ def create_model(inventory_ds: RasterIndexedDataset, **model_kwargs) -> Any:
     return cbmspec_cbm3_single_matrix_model
 
 
+def _create_parameter_dataset(
+    factory: Callable,
+    dataset_name: str,
+    inventory_ds: RasterIndexedDataset,
+    disturbance_ds: RasterIndexedDataset,
+    out_path: Path,
+    use_smoother: bool,
+    model_config: dict[str, Any],
+) -> RasterIndexedDataset:
+    parameter_ds = factory(
+        inventory_ds,
+        disturbance_ds,
+        dataset_name,
+        "local_storage",
+        str(out_path.joinpath(dataset_name)),
+        enable_cbm_cfs3_smoother=use_smoother,
+    )
+
+    if "increment_table" in model_config:
+        shutil.rmtree(out_path.joinpath(
+            dataset_name, f"{dataset_name}-table-increments"
+        ))
+
+        parameter_ds.write_table(
+            "parameter_table_metadata",
+            parameter_ds.read_table_pandas(
+                "parameter_table_metadata",
+                filters=[("table_name", "!=", "increments")]
+            )
+        )
+
+    return parameter_ds
+
+
 def run(
     cbm4_config_path: str | Path,
     max_workers: int | None = None,
@@ -58,15 +95,30 @@ def run(
     on_pre_spinup: Callable[[str]] | None = None,
     on_pre_simulation: Callable[[str]] | None = None,
     end_year: int | None = None,
+    spinup_cache_path: str | Path | None = None,
+    resume: bool = False,
+    checkpoint_interval: int = 1,
     **kwargs,
 ):
     json_config = kwargs.get("json_config") or load_config(cbm4_config_path, **kwargs)
     json_cache_config = json_config.get("cache")
 
-    shutil.rmtree(
-        json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"], True
+    checkpoint = SimulationCheckpoint(
+        Path(cbm4_config_path).absolute().parent,
+        {
+            "engine": "cbmspec",
+            "config": Path(cbm4_config_path).read_text(),
+            "end_year": end_year,
+        },
+        resume,
+        checkpoint_interval,
     )
 
+    if not checkpoint.resuming:
+        shutil.rmtree(
+            json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"], True
+        )
+
     inventory_ds = RasterIndexedDataset(
         json_config["cbm4_spatial_dataset"]["inventory"]["dataset_name"],
         json_config["cbm4_spatial_dataset"]["inventory"]["storage_type"],
@@ -91,6 +143,32 @@ def run(
 
             model_config["increment_table"] = increment_table_abs_path
 
+    # The pre-spinup callback can change the simulation dataset in ways the
+    # fingerprint can't see, so spinups that use one are never cached.
+    spinup_cache = None if on_pre_spinup else SpinupCache.from_config(
+        cbm4_config_path, json_config, spinup_cache_path
+    )
+
+    # Fingerprint the inputs for the spinup cache and parameter dataset
+    # manifests; a cloned cache supplies both instead. Spinup only depends on
+    # the inventory, so changing the disturbance tables doesn't invalidate it.
+    if json_cache_config is None:
+        parameter_inputs = get_parameter_inputs(json_config)
+
+    if spinup_cache is not None:
+        spinup_inputs = {
+            **parameter_inputs["spinup_parameters"],
+            "engine": "cbmspec",
+            "model_parameters": {
+                **spinup_model_config,
+                "increment_table": parameter_inputs["spinup_parameters"]["increment_table"],
+            },
+            "versions": package_versions(
+                "cbm4", "cbmspec_cbm3", "libcbm", "arrow_space"
+            ),
+        }
+        spinup_fingerprint = spinup_cache.fingerprint(spinup_inputs)
+
     spinup_model = create_model(
         inventory_ds,
         **json_config.get("model_parameters", {}).get("spinup", {})
@@ -102,79 +180,83 @@ def run(
     )
 
     step_times = []
-    start = time.time()
-    simulation_ds = cbm4_spatial_runner.create_simulation_dataset(
-        spinup_model,
-        inventory_ds,
-        json_config["cbm4_spatial_dataset"]["simulation"]["dataset_name"],
-        json_config["cbm4_spatial_dataset"]["simulation"]["storage_type"],
-        json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"],
-    )
-    step_times.append(["create simulation dataset", (time.time() - start)])
+    spinup_restored = False
+    if checkpoint.resuming:
+        simulation_ds = RasterIndexedDataset(
+            json_config["cbm4_spatial_dataset"]["simulation"]["dataset_name"],
+            json_config["cbm4_spatial_dataset"]["simulation"]["storage_type"],
+            json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"],
+        )
+    elif spinup_cache is not None:
+        start = time.time()
+        spinup_restored = spinup_cache.restore(
+            spinup_fingerprint, json_config["cbm4_spatial_dataset"]["simulation"]
+        )
+        if spinup_restored:
+            simulation_ds = RasterIndexedDataset(
+                json_config["cbm4_spatial_dataset"]["simulation"]["dataset_name"],
+                json_config["cbm4_spatial_dataset"]["simulation"]["storage_type"],
+                json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"],
+            )
+            step_times.append(["spinup (cached)", (time.time() - start)])
+
+    if not spinup_restored and not checkpoint.resuming:
+        start = time.time()
+        simulation_ds = cbm4_spatial_runner.create_simulation_dataset(
+            spinup_model,
+            inventory_ds,
+            json_config["cbm4_spatial_dataset"]["simulation"]["dataset_name"],
+            json_config["cbm4_spatial_dataset"]["simulation"]["storage_type"],
+            json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"],
+        )
+        step_times.append(["create simulation dataset", (time.time() - start)])
 
     out_path = Path(
         json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"]
     ).parent
 
-    if json_cache_config is None:
+    spinup_required = (
+        json_cache_config is None and not spinup_restored and not checkpoint.spinup_complete
+    )
+
+    if spinup_required:
         start = time.time()
-        spinup_spatial_parameter_ds = (
-            cbm4_parameter_dataset_factory.spinup_parameter_dataset_create(
-                inventory_ds,
-                disturbance_ds,
-                "spinup_parameters",
-                "local_storage",
-                str(out_path.joinpath("spinup_parameters")),
-                enable_cbm_cfs3_smoother=json_config.get("use_smoother", True),
-            )
+        spinup_spatial_parameter_ds, reused = reuse_or_create(
+            out_path.joinpath("spinup_parameters"),
+            parameter_inputs["spinup_parameters"],
+            lambda: _create_parameter_dataset(
+                cbm4_parameter_dataset_factory.spinup_parameter_dataset_create,
+                "spinup_parameters", inventory_ds, disturbance_ds, out_path,
+                json_config.get("use_smoother", True), spinup_model_config,
+            ),
         )
 
-        if "increment_table" in spinup_model_config:
-            shutil.rmtree(out_path.joinpath(
-                "spinup_parameters", "spinup_parameters-table-increments"
-            ))
-            
-            spinup_spatial_parameter_ds.write_table(
-                "parameter_table_metadata",
-                spinup_spatial_parameter_ds.read_table_pandas(
-                    "parameter_table_metadata",
-                    filters=[("table_name", "!=", "increments")]
-                )
-            )
-
-        step_times.append(["create spinup parameter datasets", (time.time() - start)])
+        step_times.append([
+            f"{'reuse' if reused else 'create'} spinup parameter datasets",
+            (time.time() - start)
+        ])
 
         if on_pre_spinup is not None:
             start = time.time()
             on_pre_spinup(json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"])
             step_times.append(["pre-spinup callback", (time.time() - start)])
 
+    if json_cache_config is None:
         start = time.time()
-        step_spatial_parameter_ds = (
-            cbm4_parameter_dataset_factory.step_parameter_dataset_create(
-                inventory_ds,
-                disturbance_ds,
-                "step_parameters",
-                "local_storage",
-                str(out_path.joinpath("step_parameters")),
-                enable_cbm_cfs3_smoother=json_config.get("use_smoother", True),
-            )
+        step_spatial_parameter_ds, reused = reuse_or_create(
+            out_path.joinpath("step_parameters"),
+            parameter_inputs["step_parameters"],
+            lambda: _create_parameter_dataset(
+                cbm4_parameter_dataset_factory.step_parameter_dataset_create,
+                "step_parameters", inventory_ds, disturbance_ds, out_path,
+                json_config.get("use_smoother", True), step_model_config,
+            ),
         )
 
-        if "increment_table" in step_model_config:
-            shutil.rmtree(out_path.joinpath(
-                "step_parameters", "step_parameters-table-increments"
-            ))
-            
-            step_spatial_parameter_ds.write_table(
-                "parameter_table_metadata",
-                step_spatial_parameter_ds.read_table_pandas(
-                    "parameter_table_metadata",
-                    filters=[("table_name", "!=", "increments")]
-                )
-            )
-        
-        step_times.append(["create step parameter datasets", (time.time() - start)])
+        step_times.append([
+            f"{'reuse' if reused else 'create'} step parameter datasets",
+            (time.time() - start)
+        ])
     else:
         step_spatial_parameter_ds = RasterIndexedDataset(
             "step_parameters",
@@ -187,7 +269,7 @@ def run(
     final_timestep = end_year - start_year + 1
     timesteps = list(range(1, final_timestep + 1))
     with tqdm(desc="Simulation", total=len(timesteps) + 1) as pbar:
-        if json_cache_config is None:
+        if spinup_required:
             start = time.time()
             cbm4_spatial_runner.spinup_all(
                 model=spinup_model,
@@ -198,9 +280,17 @@ def run(
                 write_parameters=write_parameters,
             )
             step_times.append(["spinup", (time.time() - start)])
+            if spinup_cache is not None:
+                start = time.time()
+                spinup_cache.store(
+                    spinup_fingerprint, json_config["cbm4_spatial_dataset"]["simulation"],
+                    spinup_inputs,
+                )
+                step_times.append(["store spinup cache", (time.time() - start)])
 
+        checkpoint.complete_spinup()
         pbar.update()
-        if on_pre_simulation is not None:
+        if on_pre_simulation is not None and not checkpoint.last_timestep:
             start = time.time()
             on_pre_simulation(json_config["cbm4_spatial_dataset"]["simulation"]["path_or_uri"])
             step_times.append(["pre-simulation callback", (time.time() - start)])
@@ -216,9 +306,15 @@ def run(
 
         with TemporaryDirectory() as tmp:
             # Create a temporary working copy of the disturbance dataset to be used
-            # by rule-based EventProcessor.
+            # by rule-based EventProcessor - when resuming, the copy saved with the
+            # last checkpoint.
             working_disturbance_ds_path = Path(tmp).joinpath("disturbance")
-            disturbance_ds.copy("disturbance", "local_storage", str(working_disturbance_ds_path))
+            (
+                RasterIndexedDataset(
+                    "disturbance", "local_storage", str(checkpoint.disturbance_snapshot_path)
+                ) if checkpoint.disturbance_snapshot_path
+                else disturbance_ds
+            ).copy("disturbance", "local_storage", str(working_disturbance_ds_path))
             working_disturbance_ds = RasterIndexedDataset(
                 "disturbance", "local_storage", str(working_disturbance_ds_path)
             )
@@ -226,7 +322,7 @@ def run(
             t0_event_processor = None
             event_processor = EventProcessor.for_datasets(simulation_ds, working_disturbance_ds)
             for timestep in timesteps:
-                if timestep <= cache_end_timestep:
+                if timestep <= max(cache_end_timestep, checkpoint.last_timestep):
                     pbar.update()
                     continue
 
@@ -254,6 +350,9 @@ def run(
                     max_workers=max_workers,
                     write_parameters=write_parameters,
                 )
+                checkpoint.complete_timestep(
+                    timestep, working_disturbance_ds, final=(timestep == final_timestep)
+                )
                 step_times.append([f"timestep_{timestep}", (time.time() - start)])
                 pbar.update()
 
@@ -263,3 +362,5 @@ def run(
             event_processor.summarize(out_path.joinpath("event_processor_summary.csv"))
             time_profiling = pd.DataFrame(columns=["task", "time_elapsed"], data=step_times)
             time_profiling.to_csv(out_path.joinpath("profiling.csv"), index=False)
+
+    checkpoint.clear()
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+import shutil
+
+from gcbmwalltowall.application.command.impl.stagestate import StageState
+from gcbmwalltowall.util.path import Path
+
+
+class SimulationCheckpoint:
+    """Checkpoints a CBM4 simulation so that an interrupted run can resume
+    after its last checkpointed timestep instead of starting over from spinup.
+    The simulation dataset already holds the output of every completed
+    timestep; a checkpoint adds a marker for the timestep and a snapshot of
+    the working disturbance dataset, which the EventProcessor changes as the
+    simulation goes. Checkpoints are kept in the project's checkpoint
+    directory and discarded when the run finishes, or when the project's
+    configuration changes.
+
+    Args:
+        project_path (str): the CBM4 project directory
+        fingerprint (dict): json-serializable description of the run; a
+            rerun only resumes if this matches the interrupted run's
+        resume (bool, optional): resume from the last checkpoint, if any,
+            instead of starting over. Defaults to False.
+        interval (int, optional): number of timesteps between checkpoints.
+            Defaults to 1.
+    """
+
+    def __init__(
+        self,
+        project_path: str | Path,
+        fingerprint: dict,
+        resume: bool = False,
+        interval: int = 1,
+    ):
+        self.path = Path(project_path).absolute().joinpath("checkpoint")
+        self.interval = max(interval or 1, 1)
+        self._state = StageState(self.path, fingerprint, resume)
+        self.last_timestep = max(
+            (
+                int(marker.stem.split("_")[-1])
+                for marker in self.path.glob("timestep_*.done")
+            ),
+            default=0,
+        )
+
+        if self.last_timestep:
+            logging.info(f"Resuming after timestep {self.last_timestep}")
+
+    @property
+    def spinup_complete(self) -> bool:
+        return self._state.is_complete("spinup")
+
+    @property
+    def resuming(self) -> bool:
+        return self.spinup_complete or self.last_timestep > 0
+
+    @property
+    def disturbance_snapshot_path(self) -> Path | None:
+        """The working disturbance dataset as of the last checkpoint, if any."""
+        if not self.last_timestep:
+            return None
+
+        return self.path.joinpath(f"disturbance_{self.last_timestep}")
+
+    def complete_spinup(self):
+        self._state.run("spinup", lambda: None)
+
+    def complete_timestep(self, timestep: int, working_disturbance_ds, final: bool = False):
+        """Record a completed timestep if it falls on a checkpoint.
+
+        Args:
+            timestep (int): the completed timestep
+            working_disturbance_ds (RasterIndexedDataset): the working
+                disturbance dataset after the timestep
+            final (bool, optional): the timestep is the last in the run, so
+                no checkpoint is needed
+        """
+        if final or timestep % self.interval != 0:
+            return
+
+        # The snapshot is written before its marker so that a checkpoint
+        # interrupted part way is ignored on resume.
+        snapshot_path = self.path.joinpath(f"disturbance_{timestep}")
+        shutil.rmtree(snapshot_path, True)
+        working_disturbance_ds.copy("disturbance", "local_storage", str(snapshot_path))
+        self._state.run(f"timestep_{timestep}", lambda: None)
+
+        previous_snapshot_path = self.disturbance_snapshot_path
+        self.last_timestep = timestep
+        if previous_snapshot_path is not None:
+            shutil.rmtree(previous_snapshot_path, True)
+
+    def clear(self):
+        self._state.clear()
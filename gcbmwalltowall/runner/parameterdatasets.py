@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+from typing import Any, Callable
+
+from gcbmwalltowall.runner.spinupcache import hash_path, package_versions
+from gcbmwalltowall.util.encoding import load_json
+from gcbmwalltowall.util.path import Path, link_or_copy
+
+
+def get_manifest_path(dataset_path: str | Path) -> Path:
+    dataset_path = Path(dataset_path)
+    return dataset_path.parent.joinpath(f"{dataset_path.name}.manifest.json")
+
+
+def hash_dataset_tables(dataset_path: str | Path) -> str | None:
+    """Hash the tables in a local_storage dataset, ignoring its raster layers.
+    Parameter datasets only read the disturbance dataset's tables, so this
+    keeps appending disturbance events (i.e. extend) from invalidating them.
+    """
+    return hash_path(dataset_path, "*-table-*")
+
+
+def get_parameter_inputs(json_config: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Fingerprint what a cbmspec project's parameter datasets are derived
+    from. Spinup parameters only depend on the inventory, while step
+    parameters also depend on the disturbance dataset's tables, so that
+    changing the disturbance tables only rebuilds the step parameters.
+
+    Args:
+        json_config (dict): the loaded CBM4 config, with absolute dataset and
+            increment table paths
+
+    Returns:
+        dict: the spinup_parameters and step_parameters manifest inputs
+    """
+    datasets = json_config["cbm4_spatial_dataset"]
+    model_parameters = json_config.get("model_parameters", {})
+    inventory_inputs = {
+        "inventory": hash_path(datasets["inventory"]["path_or_uri"]),
+        "use_smoother": json_config.get("use_smoother", True),
+        "versions": package_versions("cbmspec_cbm3", "arrow_space"),
+    }
+
+    return {
+        "spinup_parameters": {
+            **inventory_inputs,
+            "increment_table": _hash_increment_table(model_parameters.get("spinup", {})),
+        },
+        "step_parameters": {
+            **inventory_inputs,
+            "disturbance_tables": hash_dataset_tables(datasets["disturbance"]["path_or_uri"]),
+            "increment_table": _hash_increment_table(model_parameters.get("step", {})),
+        },
+    }
+
+
+def _hash_increment_table(model_config: dict[str, Any]) -> str | None:
+    increment_table_path = model_config.get("increment_table")
+    return hash_path(increment_table_path) if increment_table_path else None
+
+
+def reuse_or_create(
+    dataset_path: str | Path, inputs: dict[str, Any], create: Callable[[], Any]
+) -> tuple[Any, bool]:
+    """Reuse a parameter dataset if its manifest shows it was created from the
+    same inputs, otherwise create it from scratch and write a new manifest.
+
+    Args:
+        dataset_path (str): path to the local_storage parameter dataset
+        inputs (dict): json-serializable fingerprints of everything the
+            dataset is derived from
+        create (callable): creates the dataset at dataset_path and returns it
+
+    Returns:
+        tuple: the dataset and whether it was reused
+    """
+    from arrow_space.raster_indexed_dataset import RasterIndexedDataset
+
+    dataset_path = Path(dataset_path)
+    manifest_path = get_manifest_path(dataset_path)
+    inputs = json.loads(json.dumps(inputs, default=str))
+    if (
+        dataset_path.exists()
+        and manifest_path.exists()
+        and load_json(manifest_path) == inputs
+    ):
+        logging.info(f"Reusing {dataset_path.name}: inputs unchanged")
+        return RasterIndexedDataset(
+            dataset_path.name, "local_storage", str(dataset_path)
+        ), True
+
+    if manifest_path.exists():
+        previous_inputs = load_json(manifest_path)
+        changed = [k for k in inputs if previous_inputs.get(k) != inputs[k]]
+        logging.info(f"Rebuilding {dataset_path.name}: changed inputs {changed}")
+        manifest_path.unlink()
+
+    shutil.rmtree(dataset_path, True)
+    dataset = create()
+    json.dump(inputs, open(manifest_path, "w"), indent=4)
+
+    return dataset, False
+
+
+def copy_parameter_datasets(project_path: str | Path, output_path: str | Path):
+    """Stage a project's parameter datasets and their manifests in another
+    project, i.e. a clone, so that its runs can reuse them if their inputs
+    still match. Files are linked where possible; parameter datasets are only
+    ever replaced, never modified in place.
+    """
+    project_path = Path(project_path)
+    output_path = Path(output_path)
+    for manifest_path in project_path.glob("*.manifest.json"):
+        dataset_name = manifest_path.name[: -len(".manifest.json")]
+        dataset_path = project_path.joinpath(dataset_name)
+        if not dataset_path.is_dir():
+            continue
+
+        output_dataset_path = output_path.joinpath(dataset_name)
+        shutil.rmtree(output_dataset_path, True)
+        shutil.copytree(dataset_path, output_dataset_path, copy_function=link_or_copy)
+        shutil.copyfile(manifest_path, output_path.joinpath(manifest_path.name))
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from importlib import metadata
+from tempfile import mkdtemp
+from typing import Any
+
+from gcbmwalltowall.util.path import Path
+
+
+class SpinupCache:
+    """A content-addressed store of post-spinup simulation datasets. Each entry
+    is keyed by a fingerprint of everything spinup depends on - the inventory
+    dataset, the spinup settings and the model versions - so that runs which
+    differ only in their disturbances after the start year can start from a
+    previous run's spinup instead of repeating it.
+
+    Args:
+        cache_path (str): the cache root directory; may be shared by any
+            number of projects
+    """
+
+    def __init__(self, cache_path: str | Path):
+        self.path = Path(cache_path).absolute()
+
+    @staticmethod
+    def from_config(
+        cbm4_config_path: str | Path, json_config: dict[str, Any], cache_path: str | Path = None
+    ) -> SpinupCache | None:
+        """Get the spinup cache for a CBM4 project: either the explicitly
+        specified cache path or the project config's "spinup_cache" path,
+        relative to the config file. Returns None if spinup caching is not
+        enabled, or if the project already starts from a cloned cache.
+        """
+        if json_config.get("cache") is not None:
+            return None
+
+        cache_path = cache_path or json_config.get("spinup_cache")
+        if not cache_path:
+            return None
+
+        return SpinupCache(
+            Path(cbm4_config_path).absolute().parent.joinpath(cache_path)
+        )
+
+    @staticmethod
+    def fingerprint(inputs: dict[str, Any]) -> str:
+        """Fingerprint the spinup inputs.
+
+        Args:
+            inputs (dict): json-serializable description of the spinup inputs;
+                use hash_path for files and datasets so that the fingerprint
+                follows their content
+
+        Returns:
+            str: the cache key
+        """
+        return hashlib.sha256(
+            json.dumps(inputs, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def find(self, fingerprint: str) -> Path | None:
+        """Get the path to the cached simulation dataset for a fingerprint, or
+        None if there is no cache entry.
+        """
+        dataset_path = self.path.joinpath(fingerprint, "simulation")
+        return dataset_path if dataset_path.exists() else None
+
+    def restore(self, fingerprint: str, simulation_dataset: dict[str, Any]) -> bool:
+        """Copy a cached post-spinup simulation dataset into place.
+
+        Args:
+            fingerprint (str): the cache key
+            simulation_dataset (dict): the project's simulation dataset config
+                (dataset_name, storage_type, path_or_uri)
+
+        Returns:
+            bool: True if the cache entry existed and was restored
+        """
+        from arrow_space.raster_indexed_dataset import RasterIndexedDataset
+
+        cached_path = self.find(fingerprint)
+        if cached_path is None:
+            return False
+
+        logging.info(f"Restoring cached spinup {fingerprint}")
+        shutil.rmtree(simulation_dataset["path_or_uri"], True)
+        RasterIndexedDataset(
+            simulation_dataset["dataset_name"], "local_storage", str(cached_path)
+        ).copy(
+            simulation_dataset["dataset_name"],
+            simulation_dataset["storage_type"],
+            simulation_dataset["path_or_uri"],
+        )
+
+        return True
+
+    def store(
+        self, fingerprint: str, simulation_dataset: dict[str, Any], inputs: dict[str, Any]
+    ):
+        """Add a freshly spun-up simulation dataset to the cache. The copy is
+        made in a staging directory and moved into place once complete, so a
+        failed or concurrent store never leaves a partial entry.
+
+        Args:
+            fingerprint (str): the cache key
+            simulation_dataset (dict): the project's simulation dataset config
+            inputs (dict): the fingerprinted inputs, recorded with the entry
+        """
+        from arrow_space.raster_indexed_dataset import RasterIndexedDataset
+
+        if self.find(fingerprint) is not None:
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        staging_path = Path(mkdtemp(dir=self.path, prefix=".staging_"))
+        try:
+            RasterIndexedDataset(
+                simulation_dataset["dataset_name"],
+                simulation_dataset["storage_type"],
+                simulation_dataset["path_or_uri"],
+            ).copy(
+                simulation_dataset["dataset_name"],
+                "local_storage",
+                str(staging_path.joinpath("simulation")),
+            )
+
+            json.dump(
+                inputs, open(staging_path.joinpath("fingerprint.json"), "w"),
+                indent=4, default=str,
+            )
+
+            try:
+                os.rename(staging_path, self.path.joinpath(fingerprint))
+                logging.info(f"Cached spinup {fingerprint}")
+            except OSError:
+                # Another run stored the same spinup first.
+                pass
+        finally:
+            shutil.rmtree(staging_path, True)
+
+
+def hash_path(path: str | Path, pattern: str = "*") -> str | None:
+    """Hash the logical content of a file, or of every file in a directory,
+    such as a local_storage dataset. Returns None if the path does not exist.
+
+    A dataset's content is the same wherever it was written, so a copy made
+    under another dataset name (i.e. by clone) hashes the same: the
+    "<dataset_name>-" prefix of the dataset's tables and layers is left out,
+    and parquet files are hashed by their data rather than their bytes or
+    their (random) file names.
+
+    Args:
+        path (str): the file or directory to hash
+        pattern (str, optional): for directories, only hash the top-level
+            entries matching this glob pattern
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    if path.is_file():
+        return _hash_file(path)
+
+    entries = sorted(path.glob(pattern))
+    dataset_name = _find_dataset_name(path)
+    file_hashes = {}
+    for entry in entries:
+        entry_name = entry.name
+        if dataset_name is not None:
+            entry_name = entry_name[len(dataset_name):].lstrip("-")
+
+        files = [entry] if entry.is_file() else sorted(
+            p for p in entry.rglob("*") if p.is_file()
+        )
+
+        for file in files:
+            relative_path = Path(entry_name, file.relative_to(entry)).as_posix()
+            if file.suffix == ".parquet":
+                relative_path = Path(relative_path).parent.joinpath("*.parquet").as_posix()
+
+            file_hashes.setdefault(relative_path, []).append(_hash_file(file))
+
+    return hashlib.sha256(json.dumps(
+        {name: sorted(hashes) for name, hashes in file_hashes.items()}, sort_keys=True
+    ).encode()).hexdigest()
+
+
+def _find_dataset_name(path: Path) -> str | None:
+    # A local_storage dataset's entries are all named after the dataset, i.e.
+    # "inventory", "inventory-chunks" and "inventory-table-yield".
+    names = sorted(entry.name for entry in path.iterdir())
+    for name in names:
+        if all(other == name or other.startswith(f"{name}-") for other in names):
+            return name
+
+    return None
+
+
+def _hash_file(path: Path) -> str:
+    if path.suffix == ".parquet":
+        import pandas as pd
+
+        data = pd.read_parquet(path)
+        object_columns = data.columns[data.dtypes == object]
+        data[object_columns] = data[object_columns].astype(str)
+        digest = hashlib.sha256(json.dumps(
+            [[str(column), str(dtype)] for column, dtype in data.dtypes.items()]
+        ).encode())
+
+        digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+
+        return digest.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024**2), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def package_versions(*packages: str) -> dict[str, str | None]:
+    """Get the installed versions of the packages that determine the model's
+    behaviour; packages that are not installed are recorded as None.
+    """
+    versions = {}
+    for package in packages:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    return versions
@@ -1,9 +1,15 @@
+from __future__ import annotations
+
+import csv
 import json
-import pandas as pd
 from io import BytesIO
 from ftfy import fix_encoding, guess_bytes
 from csv import Sniffer
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def read_text_file(path):
@@ -17,6 +23,8 @@ def load_json(json_path):
 
 
 def load_csv(path: str | Path, **kwargs) -> pd.DataFrame:
+    import pandas as pd
+
     text = read_text_file(path)
     
     # Strip NBSP (\xa0) and possibly other whitespace characters that sometimes
@@ -34,3 +42,25 @@ def load_csv(path: str | Path, **kwargs) -> pd.DataFrame:
     decimal = "," if delim == ";" else "."
 
     return pd.read_csv(text_bytes, delimiter=delim, decimal=decimal, **kwargs)
+
+
+def load_csv_header(path: str | Path, sample_size: int = 65536) -> list[str]:
+    """Read just the column names of a CSV file, detecting the encoding and
+    delimiter the same way as :py:func:`load_csv` but from the start of the
+    file only, so that checking the columns of very large tables is cheap.
+    """
+    with open(path, "rb") as csv_file:
+        sample_bytes = csv_file.read(sample_size)
+
+    sample, _ = guess_bytes(sample_bytes)
+    lines = fix_encoding(sample).translate("".maketrans("\xa0", " ")).splitlines()
+    if not lines:
+        return []
+
+    if len(sample_bytes) == sample_size and len(lines) > 1:
+        # Don't let a row cut off by the sample size confuse the sniffer.
+        lines = lines[:-1]
+
+    delim = Sniffer().sniff("\n".join(lines), ",;\n\r").delimiter
+
+    return next(csv.reader([lines[0]], delimiter=delim))
@@ -1,22 +1,21 @@
 from __future__ import annotations
 
+import math
 import os
-from contextlib import contextmanager
+from contextlib import ExitStack, contextmanager
 from multiprocessing import cpu_count
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 
 import numpy as np
-import psutil
 from mojadata.util import gdal
 from osgeo import gdal_array
 
 from gcbmwalltowall.util.rasterbound import RasterBound
+from gcbmwalltowall.util.rasterchunks import plan_raster_chunks
 
 max_threads = int(max(cpu_count(), 4))
 gdal_threads = 4
 memory_limit_scale = int(max_threads / 10) or 1
-global_memory_limit = int(psutil.virtual_memory().available * 0.75 / memory_limit_scale)
-gdal_memory_limit = int(global_memory_limit / gdal_threads)
 gdal_creation_options = [
     "BIGTIFF=YES",
     "TILED=YES",
@@ -25,13 +24,52 @@ gdal_creation_options = [
     f"NUM_THREADS={gdal_threads}",
 ]
 
-gdal.SetConfigOption("GDAL_SWATH_SIZE", str(gdal_memory_limit))
-gdal.SetConfigOption("VSI_CACHE", "TRUE")
-gdal.SetConfigOption("VSI_CACHE_SIZE", str(int(gdal_memory_limit / gdal_threads)))
-gdal.SetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
-gdal.SetConfigOption("GDAL_GEOREF_SOURCES", "INTERNAL,NONE")
-gdal.SetConfigOption("GTIFF_DIRECT_IO", "YES")
-gdal.SetConfigOption("GDAL_MAX_DATASET_POOL_SIZE", "50000")
+_configured_memory_limit = None
+
+
+def _get_memory_limits() -> Tuple[int, int]:
+    """Get the global and per-GDAL-thread memory limits in bytes from the
+    process' current :py:class:`ResourceGovernor` budget, which can be
+    reconfigured after import.
+    """
+    from gcbmwalltowall.util.resources import ResourceGovernor
+
+    global_memory_limit = int(
+        ResourceGovernor.get().max_memory_bytes / memory_limit_scale
+    )
+
+    return global_memory_limit, int(global_memory_limit / gdal_threads)
+
+
+def __getattr__(name):
+    if name == "global_memory_limit":
+        return _get_memory_limits()[0]
+    if name == "gdal_memory_limit":
+        return _get_memory_limits()[1]
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def configure():
+    """Apply the GDAL configuration options used by these helpers. Called by
+    every helper that opens a raster, so it only needs to be called directly
+    before using GDAL outside of this module. The options are reapplied if the
+    resource budget has changed since they were last set.
+    """
+    global _configured_memory_limit
+    gdal_memory_limit = _get_memory_limits()[1]
+    if _configured_memory_limit == gdal_memory_limit:
+        return
+
+    gdal.SetConfigOption("GDAL_SWATH_SIZE", str(gdal_memory_limit))
+    gdal.SetConfigOption("VSI_CACHE", "TRUE")
+    gdal.SetConfigOption("VSI_CACHE_SIZE", str(int(gdal_memory_limit / gdal_threads)))
+    gdal.SetConfigOption("GDAL_DISABLE_READDIR_ON_OPEN", "EMPTY_DIR")
+    gdal.SetConfigOption("GDAL_GEOREF_SOURCES", "INTERNAL,NONE")
+    gdal.SetConfigOption("GTIFF_DIRECT_IO", "YES")
+    gdal.SetConfigOption("GDAL_MAX_DATASET_POOL_SIZE", "50000")
+    gdal.SetCacheMax(gdal_memory_limit)
+    _configured_memory_limit = gdal_memory_limit
 
 
 class GDALHelperDataset:
@@ -60,6 +98,24 @@ class GDALHelperDataset:
         self.lry = self.uly + (self.data_bounds.y_size * self.yres)
 
 
+class GDALHelperDatasetStack(GDALHelperDataset):
+    def __init__(
+        self,
+        paths: List[str],
+        data: np.ndarray,
+        data_bounds: RasterBound,
+        raster_bounds: RasterBound,
+        nodata: List[Union[int, float]],
+        geo_transform: Tuple[float, float, float, float, float, float],
+        projection: str,
+    ):
+        super().__init__(
+            paths, data, data_bounds, raster_bounds, nodata, geo_transform, projection
+        )
+
+        self.paths = paths
+
+
 @contextmanager
 def __open(*args):
     """pass args to gdal.Open
@@ -73,6 +129,7 @@ def __open(*args):
     """
     if not os.path.exists(args[0]):
         raise ValueError("specified path does not exist {}".format(args[0]))
+    configure()
     dataset = gdal.Open(*args)
     if not dataset:
         raise ValueError("failed to open '{}'".format(args[0]))
@@ -92,6 +149,64 @@ def __open_band(band_num, *args):
             del band
 
 
+def __get_read_window(dataset, bounds=None):
+    """Validate an optional read window against a dataset's dimensions.
+
+    Args:
+        dataset (gdal.Dataset): an open dataset
+        bounds (RasterBound, optional): the rectangular section to read; the
+            whole raster if not specified
+
+    Raises:
+        ValueError: the specified coordinate parameters are out of bounds
+
+    Returns:
+        tuple: x_off, y_off, x_size, y_size of the window
+    """
+    x_size = dataset.RasterXSize
+    y_size = dataset.RasterYSize
+    if not bounds:
+        return 0, 0, x_size, y_size
+
+    if bounds.x_size < 1 or bounds.y_size < 1:
+        raise ValueError("x_size, y_size may not be less than 1")
+    if bounds.x_off < 0 or bounds.y_off < 0:
+        raise ValueError("x_off, y_off may not be less than 0")
+    if x_size - bounds.x_off < bounds.x_size:
+        raise ValueError("x_off, x_size out of bounds")
+    if y_size - bounds.y_off < bounds.y_size:
+        raise ValueError("y_off, y_size out of bounds")
+
+    return bounds.x_off, bounds.y_off, bounds.x_size, bounds.y_size
+
+
+def __read_window_mmap(dataset, band, x_off, y_off, x_size, y_size, out):
+    """Try to fill out with a window of an uncompressed raster band through a
+    memory map of the file, bypassing the GDAL block cache.
+
+    Returns:
+        bool: True if the window was read, False if the band can't be mapped
+    """
+    compression = dataset.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE")
+    if compression and compression.upper() != "NONE":
+        return False
+
+    try:
+        mapped = band.GetVirtualMemAutoArray(gdal.GF_Read)
+    except (RuntimeError, AttributeError):
+        return False
+
+    if mapped is None:
+        return False
+
+    try:
+        out[...] = mapped[y_off:y_off + y_size, x_off:x_off + x_size]
+    finally:
+        del mapped
+
+    return True
+
+
 def get_raster_dimension(path):
     """Gets the pixel dimension of the raster at the specified path.
 
@@ -164,29 +279,12 @@ def read_dataset(path, bounds=None, raster_band=1):
     """
     path = str(path)
     with __open(path) as dataset:
-        x_off = 0
-        y_off = 0
-        x_size = dataset.RasterXSize
-        y_size = dataset.RasterYSize
-        if bounds:
-            if bounds.x_size < 1 or bounds.y_size < 1:
-                raise ValueError("x_size, y_size may not be less than 1")
-            if bounds.x_off < 0 or bounds.y_off < 0:
-                raise ValueError("x_off, y_off may not be less than 0")
-            if x_size - bounds.x_off < bounds.x_size:
-                raise ValueError("x_off, x_size out of bounds")
-            if y_size - bounds.y_off < bounds.y_size:
-                raise ValueError("y_off, y_size out of bounds")
-            x_off = bounds.x_off
-            y_off = bounds.y_off
-            x_size = bounds.x_size
-            y_size = bounds.y_size
-
+        x_off, y_off, x_size, y_size = __get_read_window(dataset, bounds)
         band = dataset.GetRasterBand(raster_band)
 
         result = GDALHelperDataset(
             path=path,
-            data=np.array(band.ReadAsArray(x_off, y_off, x_size, y_size)),
+            data=band.ReadAsArray(x_off, y_off, x_size, y_size),
             data_bounds=RasterBound(x_off, y_off, x_size, y_size),
             raster_bounds=RasterBound(0, 0, dataset.RasterXSize, dataset.RasterYSize),
             nodata=band.GetNoDataValue(),
@@ -198,6 +296,215 @@ def read_dataset(path, bounds=None, raster_band=1):
         return result
 
 
+def read_dataset_stack(
+    paths, bounds=None, raster_band=1, out=None, use_mmap=False
+):
+    """Read the same window from a stack of co-registered rasters, i.e. tiled
+    layers sharing the same study area, into a single 3d array without
+    intermediate copies.
+
+    Args:
+        paths (list of str): paths to the raster datasets; all must have the
+            same pixel dimensions
+        bounds (RasterBound, optional): if specified defines the rectangular
+            section to read
+        raster_band (int, optional): the raster band to read. Defaults to 1.
+        out (numpy.ndarray, optional): a preallocated array of shape
+            (len(paths), y_size, x_size) to read into, so that the same buffer
+            can be reused for every chunk of a multi-layer pass. If not
+            specified, an array of the common type of the rasters is created.
+        use_mmap (bool, optional): read uncompressed rasters through a memory
+            map instead of GDAL's block cache where the driver supports it;
+            other rasters are read normally. Defaults to False.
+
+    Raises:
+        ValueError: the rasters are not the same size, the coordinate
+            parameters are out of bounds, or out is the wrong shape
+
+    Returns:
+        GDALHelperDatasetStack: as :py:func:`read_dataset`, but with a list of
+            paths and nodata values, and 3d data with one layer per path
+    """
+    paths = [str(path) for path in paths]
+    if not paths:
+        raise ValueError("no rasters specified")
+
+    with ExitStack() as stack:
+        datasets = [stack.enter_context(__open(path)) for path in paths]
+        first = datasets[0]
+        for path, dataset in zip(paths, datasets):
+            if (
+                dataset.RasterXSize != first.RasterXSize
+                or dataset.RasterYSize != first.RasterYSize
+            ):
+                raise ValueError(f"{path} dimensions differ from {paths[0]}")
+
+        x_off, y_off, x_size, y_size = __get_read_window(first, bounds)
+        bands = [dataset.GetRasterBand(raster_band) for dataset in datasets]
+        shape = (len(paths), y_size, x_size)
+        if out is None:
+            dtype = np.result_type(*(
+                gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)
+                for band in bands
+            ))
+
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"expected output buffer of shape {shape}, got {out.shape}")
+
+        for i, (dataset, band) in enumerate(zip(datasets, bands)):
+            if use_mmap and __read_window_mmap(
+                dataset, band, x_off, y_off, x_size, y_size, out[i]
+            ):
+                continue
+
+            band.ReadAsArray(x_off, y_off, x_size, y_size, buf_obj=out[i])
+
+        result = GDALHelperDatasetStack(
+            paths=paths,
+            data=out,
+            data_bounds=RasterBound(x_off, y_off, x_size, y_size),
+            raster_bounds=RasterBound(0, 0, first.RasterXSize, first.RasterYSize),
+            nodata=[band.GetNoDataValue() for band in bands],
+            geo_transform=first.GetGeoTransform(),
+            projection=first.GetProjection(),
+        )
+
+        del bands
+        return result
+
+
+def __get_block_presence(dataset, band):
+    """Get a grid of which blocks of a sparse GeoTIFF band have been written.
+
+    Returns:
+        numpy.ndarray: boolean array of shape (blocks_y, blocks_x), or None if
+            the driver doesn't report block offsets
+    """
+    block_width, block_height = band.GetBlockSize()
+    blocks_x = math.ceil(dataset.RasterXSize / block_width)
+    blocks_y = math.ceil(dataset.RasterYSize / block_height)
+    if dataset.GetDriver().ShortName != "GTiff":
+        return None
+
+    presence = np.zeros((blocks_y, blocks_x), dtype=bool)
+    for block_y in range(blocks_y):
+        for block_x in range(blocks_x):
+            presence[block_y, block_x] = bool(
+                band.GetMetadataItem(f"BLOCK_OFFSET_{block_x}_{block_y}", "TIFF")
+            )
+
+    return presence
+
+
+def __get_overview_data_mask(dataset, band):
+    """Get a mask of pixels with data in the smallest overview of a band.
+
+    Returns:
+        numpy.ndarray: boolean array of the overview's shape, or None if the
+            band has no overviews
+    """
+    if band.GetOverviewCount() == 0:
+        return None
+
+    overview = band.GetOverview(band.GetOverviewCount() - 1)
+    data = overview.ReadAsArray()
+    nodata = band.GetNoDataValue()
+    del overview
+
+    return np.ones(data.shape, dtype=bool) if nodata is None else data != nodata
+
+
+def __window_has_data(mask, raster_width, raster_height, chunk):
+    """Check whether the window of a coarse mask (block presence or overview
+    pixels) covering a chunk of the full resolution raster has any data,
+    rounding outwards so partially covered cells count.
+    """
+    mask_height, mask_width = mask.shape
+    x_scale = mask_width / raster_width
+    y_scale = mask_height / raster_height
+    x_min = int(math.floor(chunk.x_off * x_scale))
+    y_min = int(math.floor(chunk.y_off * y_scale))
+    x_max = int(math.ceil((chunk.x_off + chunk.x_size) * x_scale))
+    y_max = int(math.ceil((chunk.y_off + chunk.y_size) * y_scale))
+
+    return bool(mask[y_min:max(y_max, y_min + 1), x_min:max(x_max, x_min + 1)].any())
+
+
+def plan_raster_stack_chunks(
+    paths,
+    memory_limit_MB=None,
+    workers=1,
+    extra_bytes_per_pixel=None,
+    skip_nodata=False,
+    use_overviews=False,
+    raster_band=1,
+):
+    """Plan block-aligned chunks for a pass over a stack of co-registered
+    rasters using :py:func:`plan_raster_chunks`, reading the pixel sizes and
+    block sizes from the rasters themselves.
+
+    Args:
+        paths (list of str): paths to the raster datasets; chunks are aligned
+            to the blocks of the first raster
+        memory_limit_MB (int, optional): the maximum memory in megabytes shared
+            by all workers; defaults to the global memory limit
+        workers (int, optional): the number of chunks processed at once.
+            Defaults to 1.
+        extra_bytes_per_pixel (list of int, optional): pixel sizes of any
+            additional arrays held per chunk, i.e. output buffers
+        skip_nodata (bool, optional): leave out chunks whose blocks are absent
+            from every raster in sparse GeoTIFFs (SPARSE_OK=TRUE). Defaults to
+            False.
+        use_overviews (bool, optional): with skip_nodata, also leave out chunks
+            that are entirely nodata in every raster's smallest overview. This
+            is only exact if the overviews were built with a resampling method
+            that preserves isolated pixels. Defaults to False.
+        raster_band (int, optional): the raster band to plan for. Defaults to 1.
+
+    Returns:
+        list: RasterBound objects in row-major order
+    """
+    paths = [str(path) for path in paths]
+    bytes_per_pixel = list(extra_bytes_per_pixel or [])
+    data_masks = []
+    with ExitStack() as stack:
+        datasets = [stack.enter_context(__open(path)) for path in paths]
+        first = datasets[0]
+        width, height = first.RasterXSize, first.RasterYSize
+        block_width, block_height = first.GetRasterBand(raster_band).GetBlockSize()
+        for dataset in datasets:
+            band = dataset.GetRasterBand(raster_band)
+            bytes_per_pixel.append(max(1, gdal.GetDataTypeSize(band.DataType) // 8))
+            if skip_nodata:
+                mask = __get_block_presence(dataset, band)
+                if (mask is None or mask.all()) and use_overviews:
+                    mask = __get_overview_data_mask(dataset, band)
+
+                data_masks.append(mask)
+
+            del band
+
+    is_empty = None
+    if skip_nodata and data_masks and all(mask is not None for mask in data_masks):
+
+        def is_empty(chunk):
+            return not any(
+                __window_has_data(mask, width, height, chunk) for mask in data_masks
+            )
+
+    return plan_raster_chunks(
+        width,
+        height,
+        block_width,
+        block_height,
+        bytes_per_pixel,
+        memory_limit_MB or int(_get_memory_limits()[0] / 1e6),
+        workers,
+        is_empty,
+    )
+
+
 def create_empty_raster(
     source_path,
     dest_path,
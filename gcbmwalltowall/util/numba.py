@@ -9,22 +9,52 @@ def numba_map(a: np.ndarray, m: dict) -> np.ndarray:
     The key and values of the dictionary m must be both of the same
     type as the array dtype, and the returned array will be the same
     type as the input array.
+
+    Prefer :py:func:`gcbmwalltowall.util.valuemap.remap`, which picks a
+    vectorized lookup strategy and only falls back to a numba dictionary for
+    very large, sparse maps.
+
     Args:
         a (numpy.ndarray): a numpy array
         m (dict): a dictionary to map values in the resulting array
     Returns:
         numpy.ndarray: the numpy array with replaced mapped values
     """
-    dict_type = types.__dict__[str(a.dtype)]
-    d = Dict.empty(key_type=dict_type, value_type=dict_type)
-    for k, v in m.items():
-        d[k] = v
+    d = make_typed_dict(
+        np.fromiter(m.keys(), dtype=a.dtype, count=len(m)),
+        np.fromiter(m.values(), dtype=a.dtype, count=len(m)),
+    )
+
     return _numba_map(a, d)
 
 
+def make_typed_dict(keys: np.ndarray, values: np.ndarray) -> Dict:
+    """Build a numba typed dictionary from matching key and value arrays.
+
+    Args:
+        keys (numpy.ndarray): the dictionary keys
+        values (numpy.ndarray): the dictionary values, same dtype as keys
+    Returns:
+        numba.typed.Dict: the populated dictionary
+    """
+    dict_type = types.__dict__[str(keys.dtype)]
+    d = Dict.empty(key_type=dict_type, value_type=dict_type)
+    _fill_typed_dict(d, keys, values)
+
+    return d
+
+
+@njit
+def _fill_typed_dict(d, keys, values):
+    for i in range(len(keys)):
+        d[keys[i]] = values[i]
+
+
 @njit
 def _numba_map(a, m):
     out = a.copy()
     for index, value in np.ndenumerate(a):
-        out[index] = m[value]
+        if value in m:
+            out[index] = m[value]
+
     return out
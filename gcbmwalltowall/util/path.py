@@ -1,5 +1,6 @@
 import os
 import pathlib
+import shutil
 from typing import Any
 
 
@@ -9,3 +10,31 @@ def Path(*p: Any) -> pathlib.Path:
 
 def relpath(path, start) -> str:
     return Path(os.path.relpath(path, start)).as_posix()
+
+
+def link_or_copy(src, dst) -> pathlib.Path:
+    """Stage src at dst as cheaply as the filesystem allows: a hard link if src
+    and dst are on the same volume, otherwise a symbolic link, falling back to
+    a copy where neither is permitted (i.e. unprivileged Windows accounts).
+    Linked files share their contents with src, so dst must be treated as
+    read-only.
+
+    Args:
+        src (str): the existing file
+        dst (str): the path to create
+
+    Returns:
+        pathlib.Path: dst
+    """
+    src = Path(src).absolute()
+    dst = Path(dst)
+    for link in (os.link, os.symlink):
+        try:
+            link(src, dst)
+            return dst
+        except (OSError, NotImplementedError):
+            pass
+
+    shutil.copyfile(src, dst)
+
+    return dst
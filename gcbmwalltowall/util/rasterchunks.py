@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import math
+from typing import Callable
 
 from gcbmwalltowall.util.rasterbound import RasterBound
 
@@ -56,8 +57,8 @@ def get_raster_chunks(width: int, height: int, chunk_width: int, chunk_height: i
         raise ValueError("parameters must be positive integers")
     n_cols = math.ceil(width / chunk_width)
     n_rows = math.ceil(height / chunk_height)
-    for col in range(0, n_cols):
-        for row in range(0, n_rows):
+    for row in range(0, n_rows):
+        for col in range(0, n_cols):
             yield __get_chunk_bounds(width, height, chunk_width, chunk_height, row, col)
 
 
@@ -87,6 +88,9 @@ def get_memory_limited_raster_chunks(
 
     Returns:
         sequence: the memory limited sequence of RasterBound objects.
+
+    See :py:func:`plan_raster_chunks` for block-aligned chunks based on the
+    actual pixel sizes of the rasters.
     """
     divisor = n_rasters * bytes_per_pixel / 1e6
     if divisor <= 0:
@@ -97,3 +101,97 @@ def get_memory_limited_raster_chunks(
     else:
         size = int(math.sqrt(max_pixels))
         return get_raster_chunks(width, height, size, size)
+
+
+def get_block_aligned_raster_chunks(
+    width: int, height: int, block_width: int, block_height: int, max_pixels: int
+):
+    """Call :py:func:`get_raster_chunks` with a chunk size made up of whole
+    blocks of the raster's native block (tile or strip) size, so that no block
+    is decompressed by more than one chunk. Full-width strips of block rows are
+    preferred where they fit within max_pixels since they follow the order
+    blocks are stored on disk; otherwise chunks are a single block row high and
+    as many blocks wide as will fit. At least one block is always returned per
+    chunk, even if it exceeds max_pixels.
+
+    Args:
+        width (int): the entire raster width in pixels (x dimension)
+        height (int): the entire raster height in pixels (y dimension)
+        block_width (int): the width of the raster's native blocks
+        block_height (int): the height of the raster's native blocks
+        max_pixels (int): the maximum number of pixels per chunk
+
+    Raises:
+        ValueError: Negative or zero parameters
+
+    Returns:
+        sequence: the block-aligned sequence of RasterBound objects in
+            row-major order.
+    """
+    if block_width <= 0 or block_height <= 0 or max_pixels <= 0:
+        raise ValueError("parameters must be positive integers")
+
+    block_width = min(block_width, width)
+    block_height = min(block_height, height)
+    if max_pixels >= width * height:
+        return get_raster_chunks(width, height, width, height)
+
+    block_row_pixels = width * block_height
+    if max_pixels >= block_row_pixels:
+        chunk_height = block_height * (max_pixels // block_row_pixels)
+        return get_raster_chunks(width, height, width, chunk_height)
+
+    blocks_per_chunk = max(1, max_pixels // (block_width * block_height))
+    return get_raster_chunks(
+        width, height, block_width * blocks_per_chunk, block_height
+    )
+
+
+def plan_raster_chunks(
+    width: int,
+    height: int,
+    block_width: int,
+    block_height: int,
+    bytes_per_pixel: list[int],
+    memory_limit_MB: int,
+    workers: int = 1,
+    is_empty: Callable[[RasterBound], bool] = None,
+) -> list[RasterBound]:
+    """Plan block-aligned chunks for a pass over a stack of co-registered
+    rasters so that every worker can hold one chunk of the whole stack in
+    memory at the same time without exceeding the memory limit, using the
+    actual pixel size of each raster rather than a uniform estimate.
+
+    Args:
+        width (int): the entire raster width in pixels (x dimension)
+        height (int): the entire raster height in pixels (y dimension)
+        block_width (int): the width of the rasters' native blocks
+        block_height (int): the height of the rasters' native blocks
+        bytes_per_pixel (list of int): the pixel size of each raster in the
+            stack, including any output rasters held in memory
+        memory_limit_MB (int): the maximum memory in megabytes shared by all
+            workers
+        workers (int, optional): the number of chunks processed at once.
+            Defaults to 1.
+        is_empty (callable, optional): predicate for chunks known to contain
+            only nodata in every raster, which are left out of the plan
+
+    Raises:
+        ValueError: Negative or zero parameters
+
+    Returns:
+        list: RasterBound objects in row-major order
+    """
+    stack_bytes_per_pixel = sum(bytes_per_pixel)
+    if stack_bytes_per_pixel <= 0 or workers <= 0 or memory_limit_MB <= 0:
+        raise ValueError("parameters must be positive integers")
+
+    max_pixels = int(memory_limit_MB * 1e6 / (workers * stack_bytes_per_pixel))
+    chunks = get_block_aligned_raster_chunks(
+        width, height, block_width, block_height, max(1, max_pixels)
+    )
+
+    if is_empty is None:
+        return list(chunks)
+
+    return [chunk for chunk in chunks if not is_empty(chunk)]
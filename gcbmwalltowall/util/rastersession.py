@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator
+
+import numpy as np
+from mojadata.util import gdal
+
+from gcbmwalltowall.util import gdalhelpers
+from gcbmwalltowall.util.rasterbound import RasterBound
+from gcbmwalltowall.util.rasterchunks import plan_raster_chunks
+
+
+class RasterSession:
+    """Keeps GDAL datasets open across many chunked reads and writes instead of
+    reopening the file for each call like the :py:mod:`gdalhelpers` functions,
+    and iterates over rasters in block-aligned, row-major chunks, optionally
+    reading the next chunk on a background thread while the current one is
+    being processed.
+
+    Intended to be used as a context manager:
+
+        with RasterSession() as session:
+            for bounds, (data,) in session.read_chunks([in_path], memory_limit_MB=512):
+                session.write(out_path, process(data), bounds.x_off, bounds.y_off)
+
+    While :py:meth:`read_chunks` is prefetching, the background thread reads
+    through its own dataset handles, so the session can be used to read and
+    write other rasters. The rasters being read must not be written while
+    they are being prefetched.
+
+    Args:
+        prefetch (bool, optional): read the next chunk in the background while
+            the caller processes the current one. Defaults to True.
+    """
+
+    def __init__(self, prefetch: bool = True):
+        self._prefetch = prefetch
+        self._datasets = {}
+
+    def __enter__(self) -> RasterSession:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, path: str, update: bool = False) -> gdal.Dataset:
+        """Get an open dataset for the specified path, opening it if this is
+        the first time it has been requested. A dataset opened for update is
+        also used for reads.
+
+        Args:
+            path (str): path to a raster dataset
+            update (bool, optional): open the dataset for writing. Defaults to
+                False.
+
+        Raises:
+            ValueError: the path does not exist or could not be opened
+
+        Returns:
+            gdal.Dataset: the open dataset
+        """
+        path = os.path.abspath(str(path))
+        dataset, is_update = self._datasets.get(path, (None, False))
+        if dataset is not None and (is_update or not update):
+            return dataset
+
+        if dataset is not None:
+            # Reopen a read-only dataset for update.
+            self._datasets.pop(path)
+            del dataset
+
+        dataset = _open_dataset(path, update)
+        self._datasets[path] = (dataset, update)
+
+        return dataset
+
+    def close(self):
+        """Flush any datasets opened for writing and close all open datasets."""
+        for dataset, is_update in self._datasets.values():
+            if is_update:
+                dataset.FlushCache()
+
+        self._datasets.clear()
+
+    def get_dimension(self, path: str) -> RasterBound:
+        """Gets the pixel dimension of the raster at the specified path.
+
+        Args:
+            path (str): path to a raster dataset
+
+        Returns:
+            RasterBound: object with the pixel extent of the raster
+        """
+        dataset = self.open(path)
+        return RasterBound(0, 0, dataset.RasterXSize, dataset.RasterYSize)
+
+    def get_block_size(self, path: str, band_num: int = 1) -> tuple[int, int]:
+        """Gets the native block (tile or strip) size of a raster band.
+
+        Args:
+            path (str): path to a raster dataset
+            band_num (int, optional): the raster band. Defaults to 1.
+
+        Returns:
+            tuple: the (width, height) of the band's blocks in pixels
+        """
+        block_width, block_height = self.open(path).GetRasterBand(band_num).GetBlockSize()
+        return block_width, block_height
+
+    def get_bytes_per_pixel(self, path: str, band_num: int = 1) -> int:
+        """Gets the size in bytes of a single pixel of a raster band.
+
+        Args:
+            path (str): path to a raster dataset
+            band_num (int, optional): the raster band. Defaults to 1.
+
+        Returns:
+            int: bytes per pixel
+        """
+        data_type = self.open(path).GetRasterBand(band_num).DataType
+        return max(1, gdal.GetDataTypeSize(data_type) // 8)
+
+    def get_chunks(
+        self,
+        paths: str | list[str],
+        memory_limit_MB: int = None,
+        band_num: int = 1,
+    ) -> Iterator[RasterBound]:
+        """Generate block-aligned chunks in row-major order for a stack of
+        rasters sharing the same dimensions, sized so that one chunk of every
+        raster in the stack fits within the memory limit. Blocks are aligned to
+        the first raster in the stack.
+
+        Args:
+            paths (str or list of str): the raster or stack of rasters
+            memory_limit_MB (int, optional): the maximum memory in megabytes to
+                use for a chunk of the whole stack; defaults to the
+                :py:mod:`gdalhelpers` global memory limit
+            band_num (int, optional): the raster band. Defaults to 1.
+
+        Returns:
+            sequence: RasterBound objects describing the chunks
+        """
+        paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+        bounds = self.get_dimension(paths[0])
+        block_width, block_height = self.get_block_size(paths[0], band_num)
+
+        return plan_raster_chunks(
+            bounds.x_size,
+            bounds.y_size,
+            block_width,
+            block_height,
+            [self.get_bytes_per_pixel(path, band_num) for path in paths],
+            memory_limit_MB or int(gdalhelpers.global_memory_limit / 1e6),
+        )
+
+    def read(
+        self,
+        path: str,
+        bounds: RasterBound = None,
+        band_num: int = 1,
+        out: np.ndarray = None,
+    ) -> np.ndarray:
+        """Read an entire raster band or a rectangular section of it.
+
+        Args:
+            path (str): path to a raster dataset
+            bounds (RasterBound, optional): if specified defines the rectangular
+                section to read
+            band_num (int, optional): the raster band. Defaults to 1.
+            out (numpy.ndarray, optional): an existing array of the right shape
+                and type to read into instead of allocating a new one
+
+        Returns:
+            numpy.ndarray: the raster data
+        """
+        return _read_dataset(self.open(path), bounds, band_num, out)
+
+    def write(self, path: str, data: np.ndarray, x_off: int, y_off: int, band_num: int = 1):
+        """Write a rectangular section of a raster band. The dataset stays
+        open, and is flushed when the session is closed.
+
+        Args:
+            path (str): path to a raster dataset
+            data (numpy.ndarray): 2d data rectangle to write
+            x_off (int): the x raster coordinate of the upper left corner of
+                the data rectangle
+            y_off (int): the y raster coordinate of the upper left corner of
+                the data rectangle
+            band_num (int, optional): the raster band. Defaults to 1.
+        """
+        self.open(path, update=True).GetRasterBand(band_num).WriteArray(data, x_off, y_off)
+
+    def get_nodata(self, path: str, band_num: int = 1) -> int | float:
+        """Get the no-data value of a raster band.
+
+        Args:
+            path (str): path to a raster dataset
+            band_num (int, optional): the raster band. Defaults to 1.
+
+        Returns:
+            float: the no_data value for the raster
+        """
+        return self.open(path).GetRasterBand(band_num).GetNoDataValue()
+
+    def read_chunks(
+        self,
+        paths: str | list[str],
+        chunks: Iterable[RasterBound] = None,
+        memory_limit_MB: int = None,
+        band_num: int = 1,
+    ) -> Iterator[tuple[RasterBound, list[np.ndarray]]]:
+        """Read a stack of rasters chunk by chunk. If prefetching is enabled,
+        the next chunk is read on a background thread while the caller works on
+        the current one, so the memory limit should allow for two chunks of the
+        stack to be in memory at once.
+
+        Args:
+            paths (str or list of str): the raster or stack of rasters to read
+            chunks (iterable of RasterBound, optional): the chunks to read;
+                defaults to :py:meth:`get_chunks` for the stack
+            memory_limit_MB (int, optional): passed to :py:meth:`get_chunks`
+                when chunks are not specified
+            band_num (int, optional): the raster band. Defaults to 1.
+
+        Yields:
+            tuple: the chunk bounds and a list of arrays, one per raster in
+                the stack
+        """
+        paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+        if chunks is None:
+            chunks = self.get_chunks(paths, memory_limit_MB, band_num)
+
+        def read_stack(bounds):
+            return [self.read(path, bounds, band_num) for path in paths]
+
+        if not self._prefetch:
+            for bounds in chunks:
+                yield bounds, read_stack(bounds)
+
+            return
+
+        # The reader thread opens its own handles instead of sharing the
+        # session's, so the caller can keep using the session while the next
+        # chunk is being read.
+        reader_datasets = {}
+
+        def prefetch_stack(bounds):
+            stack = []
+            for path in paths:
+                path = os.path.abspath(str(path))
+                dataset = reader_datasets.get(path)
+                if dataset is None:
+                    dataset = reader_datasets[path] = _open_dataset(path)
+
+                stack.append(_read_dataset(dataset, bounds, band_num))
+
+            return stack
+
+        chunks = iter(chunks)
+        try:
+            with ThreadPoolExecutor(1) as reader:
+                bounds = next(chunks, None)
+                pending = reader.submit(prefetch_stack, bounds) if bounds is not None else None
+                while pending is not None:
+                    data = pending.result()
+                    current_bounds = bounds
+                    bounds = next(chunks, None)
+                    pending = reader.submit(prefetch_stack, bounds) if bounds is not None else None
+                    yield current_bounds, data
+        finally:
+            reader_datasets.clear()
+
+
+def _open_dataset(path: str, update: bool = False) -> gdal.Dataset:
+    if not os.path.exists(path):
+        raise ValueError(f"specified path does not exist {path}")
+
+    gdalhelpers.configure()
+    dataset = gdal.Open(path, gdal.GA_Update if update else gdal.GA_ReadOnly)
+    if not dataset:
+        raise ValueError(f"failed to open '{path}'")
+
+    return dataset
+
+
+def _read_dataset(
+    dataset: gdal.Dataset,
+    bounds: RasterBound = None,
+    band_num: int = 1,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    bounds = bounds or RasterBound(0, 0, dataset.RasterXSize, dataset.RasterYSize)
+    band = dataset.GetRasterBand(band_num)
+
+    return band.ReadAsArray(
+        bounds.x_off, bounds.y_off, bounds.x_size, bounds.y_size, buf_obj=out
+    )
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+
+class MemorySampler:
+    """Samples the peak resident memory of this process and its child
+    processes on a background thread until stopped.
+
+        with MemorySampler() as sampler:
+            do_work()
+
+        print(sampler.peak_memory_bytes)
+    """
+
+    sample_interval_secs = 0.5
+
+    def __init__(self):
+        self.peak_memory_bytes = 0
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def __enter__(self) -> MemorySampler:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+
+        self._stopped.set()
+        self._sampler.join()
+
+    def _sample(self):
+        import psutil
+
+        process = psutil.Process()
+        while True:
+            try:
+                usage = process.memory_info().rss + sum(
+                    child.memory_info().rss
+                    for child in process.children(recursive=True)
+                )
+
+                self.peak_memory_bytes = max(self.peak_memory_bytes, usage)
+            except psutil.Error:
+                # Children can exit between being listed and being measured.
+                pass
+
+            if self._stopped.wait(self.sample_interval_secs):
+                return
+
+
+class ResourceLease:
+    """A share of the process' memory and worker budget granted to one
+    subsystem by a :class:`ResourceGovernor`. While held, the peak resident
+    memory of this process and its child processes is sampled so that it can
+    be compared against what was granted when the lease is released. The
+    sample covers the whole process, so if other leases were held at the same
+    time (shared is True) it includes their memory as well.
+
+    Intended to be used as a context manager:
+
+        with ResourceGovernor.get().lease("tile", workers=8) as lease:
+            tiler = GdalTiler2D(..., workers=lease.workers,
+                                total_mem_bytes=lease.memory_bytes)
+
+    Args:
+        governor (ResourceGovernor): the governor that granted the lease
+        name (str): name of the subsystem holding the lease, for logging
+        memory_bytes (int): granted memory
+        workers (int): granted worker processes
+    """
+
+    def __init__(self, governor: ResourceGovernor, name: str, memory_bytes: int, workers: int):
+        self.name = name
+        self.memory_bytes = memory_bytes
+        self.workers = workers
+        self.shared = False
+        self._governor = governor
+        self._start = time.time()
+        self._released = False
+        self._sampler = MemorySampler()
+
+    @property
+    def process_peak_memory_bytes(self) -> int:
+        return self._sampler.peak_memory_bytes
+
+    @property
+    def memory_mb(self) -> int:
+        return int(self.memory_bytes / 1024**2)
+
+    @property
+    def memory_gb(self) -> float:
+        return self.memory_bytes / 1024**3
+
+    def __enter__(self) -> ResourceLease:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def release(self):
+        if self._released:
+            return
+
+        self._released = True
+        self._sampler.stop()
+        self._governor._release(self, time.time() - self._start)
+
+
+class ResourceGovernor:
+    """Single source of the memory and worker budget for every subsystem in the
+    process - tiling, rollback, merge and the GDAL helpers - instead of each
+    one sizing itself from the memory available when it starts. Subsystems
+    take a :class:`ResourceLease` for the duration of their work; concurrent
+    leases (i.e. batch runs) share the budget, and a lease that doesn't fit
+    waits until enough has been released unless it would be the only lease.
+
+    The process-wide instance is configured once from command line arguments
+    or the "max_mem_gb" and "max_workers" settings in settings.json, falling
+    back to 75% of available memory and all CPUs.
+
+    Args:
+        max_mem_gb (float, optional): the total memory budget
+        max_workers (int, optional): the total worker budget
+    """
+
+    _instance: ResourceGovernor = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_mem_gb: float = None, max_workers: int = None):
+        if max_mem_gb:
+            self.max_memory_bytes = int(max_mem_gb * 1024**3)
+        else:
+            import psutil
+
+            self.max_memory_bytes = int(psutil.virtual_memory().available * 0.75)
+
+        self.max_workers = max_workers or os.cpu_count()
+        self.history: list[list[Any]] = []
+        self._free_memory_bytes = self.max_memory_bytes
+        self._free_workers = self.max_workers
+        self._leases: set[ResourceLease] = set()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def configure(cls, max_mem_gb: float = None, max_workers: int = None) -> ResourceGovernor:
+        """Replace the process-wide governor. Unspecified budgets come from
+        settings.json, or the defaults if not set there either.
+
+        Returns:
+            ResourceGovernor: the new process-wide governor
+        """
+        settings = cls._load_settings()
+        with cls._instance_lock:
+            cls._instance = cls(
+                max_mem_gb or settings.get("max_mem_gb"),
+                max_workers or settings.get("max_workers"),
+            )
+
+            return cls._instance
+
+    @classmethod
+    def get(cls) -> ResourceGovernor:
+        """Get the process-wide governor, configuring it from settings.json if
+        it hasn't been configured yet.
+        """
+        if cls._instance is None:
+            settings = cls._load_settings()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(
+                        settings.get("max_mem_gb"), settings.get("max_workers")
+                    )
+
+        return cls._instance
+
+    def lease(
+        self,
+        name: str,
+        memory_gb: float = None,
+        memory_fraction: float = 1.0,
+        workers: int = None,
+    ) -> ResourceLease:
+        """Take a share of the budget.
+
+        Args:
+            name (str): name of the subsystem, for logging
+            memory_gb (float, optional): memory requested; defaults to
+                memory_fraction of the total budget
+            memory_fraction (float, optional): fraction of the total budget to
+                request when memory_gb isn't specified. Defaults to 1.0.
+            workers (int, optional): workers requested; defaults to the total
+                budget
+
+        Returns:
+            ResourceLease: the granted lease, which is never more than the
+                total budget
+        """
+        memory_bytes = min(
+            int(memory_gb * 1024**3) if memory_gb
+            else int(self.max_memory_bytes * memory_fraction),
+            self.max_memory_bytes,
+        )
+
+        workers = min(workers or self.max_workers, self.max_workers)
+        with self._condition:
+            self._condition.wait_for(lambda: not self._leases or (
+                memory_bytes <= self._free_memory_bytes
+                and workers <= self._free_workers
+            ))
+
+            self._free_memory_bytes -= memory_bytes
+            self._free_workers -= workers
+            lease = ResourceLease(self, name, memory_bytes, workers)
+            if self._leases:
+                lease.shared = True
+                for other in self._leases:
+                    other.shared = True
+
+            self._leases.add(lease)
+
+        logging.info(
+            f"{name}: granted {memory_bytes / 1024**3:.1f} GB memory, {workers} workers"
+        )
+
+        return lease
+
+    def _release(self, lease: ResourceLease, elapsed: float):
+        with self._condition:
+            self._free_memory_bytes += lease.memory_bytes
+            self._free_workers += lease.workers
+            self._leases.discard(lease)
+            self.history.append([
+                lease.name, lease.memory_bytes, lease.process_peak_memory_bytes,
+                lease.workers, elapsed, lease.shared
+            ])
+
+            self._condition.notify_all()
+
+        peak_memory_bytes = lease.process_peak_memory_bytes
+        if lease.shared:
+            # The process' peak includes the other leases held at the time,
+            # so it can't be held against this one's grant.
+            logging.info(
+                f"{lease.name}: process peak memory {peak_memory_bytes / 1024**3:.1f} GB "
+                f"shared with concurrent leases; {lease.memory_bytes / 1024**3:.1f} GB granted"
+            )
+            return
+
+        log = logging.warning if peak_memory_bytes > lease.memory_bytes else logging.info
+        log(
+            f"{lease.name}: process peak memory {peak_memory_bytes / 1024**3:.1f} GB "
+            f"of {lease.memory_bytes / 1024**3:.1f} GB granted"
+        )
+
+    @staticmethod
+    def _load_settings() -> dict[str, Any]:
+        from gcbmwalltowall.configuration.configuration import Configuration
+
+        settings = Configuration({}, ".")
+        return {
+            k: settings.get(k) for k in ("max_mem_gb", "max_workers")
+            if settings.get(k)
+        }
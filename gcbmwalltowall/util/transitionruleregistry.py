@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import csv
+import os
+import threading
+from itertools import count
+from multiprocessing.managers import BaseManager
+from typing import Any, Hashable, Iterable
+
+RuleKey = tuple[Any, Any, tuple[tuple[str, Any], ...]]
+
+
+def make_rule_key(
+    regen_delay: Any,
+    age_after: Any,
+    classifier_values: dict[str, Any] = None,
+) -> RuleKey:
+    """Build the hashable key identifying a transition rule by its content.
+    Values read from different attribute tables can describe the same rule in
+    different ways, i.e. an age_after of 0, "0" or 0.0, so numbers are reduced
+    to their simplest form and classifier values to strings before comparing.
+
+    Args:
+        regen_delay: the regen delay of the rule
+        age_after: the age to reset to, or -1 for no change
+        classifier_values (dict, optional): classifier name to the value to
+            transition to
+
+    Returns:
+        tuple: the rule key
+    """
+    return (
+        _normalize_number(regen_delay),
+        _normalize_number(age_after),
+        tuple(sorted(
+            (name, str(value) if value is not None else None)
+            for name, value in (classifier_values or {}).items()
+        )),
+    )
+
+
+def _normalize_number(value: Any) -> Any:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+
+    return int(number) if number.is_integer() else number
+
+
+class TransitionRuleIndex:
+    """Server side of the transition rule registry: assigns sequential ids to
+    unique rule keys. Lives in a :class:`SharedTransitionRuleRegistry` manager
+    process and is shared by all of the tiler's worker processes through a
+    :class:`TransitionRuleRegistry`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: dict[Hashable, int] = {}
+        self._keys: list[RuleKey] = []
+
+    def get_or_add_many(
+        self, keys: list[RuleKey], synced: int = 0
+    ) -> tuple[list[int], list[RuleKey]]:
+        """Get the ids for a batch of rule keys, adding any new ones.
+
+        Args:
+            keys (list): the rule keys to look up
+            synced (int, optional): the number of keys the caller already
+                knows about, i.e. from a previous call. Defaults to 0.
+
+        Returns:
+            tuple: the ids of the requested keys, and every key added since the
+                first `synced` keys in id order, so that the caller can cache
+                rules added by other workers too
+        """
+        with self._lock:
+            ids = []
+            for key in keys:
+                rule_id = self._ids.get(key)
+                if rule_id is None:
+                    self._keys.append(key)
+                    rule_id = self._ids[key] = len(self._keys)
+
+                ids.append(rule_id)
+
+            return ids, self._keys[synced:]
+
+    def write_rules(self, output_path: str = "transition_rules.csv"):
+        """Write the unique transition rules to csv in id order."""
+        with self._lock:
+            keys = list(self._keys)
+
+        if not keys:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        classifier_names = sorted({name for _, _, values in keys for name, _ in values})
+        with open(output_path, "w", newline="", encoding="utf-8", errors="surrogateescape") as out_file:
+            writer = csv.DictWriter(out_file, ["id", "regen_delay", "age_after"] + classifier_names)
+            writer.writeheader()
+            for rule_id, (regen_delay, age_after, values) in enumerate(keys, 1):
+                writer.writerow({
+                    "id": rule_id,
+                    "regen_delay": regen_delay,
+                    "age_after": age_after,
+                    **dict(values),
+                })
+
+
+class SharedTransitionRuleRegistry(BaseManager):
+    """Manager process hosting a :class:`TransitionRuleIndex`:
+
+        mgr = SharedTransitionRuleRegistry()
+        mgr.start()
+        rule_manager = TransitionRuleRegistry(mgr.TransitionRuleIndex())
+    """
+
+
+SharedTransitionRuleRegistry.register("TransitionRuleIndex", TransitionRuleIndex)
+
+
+class TransitionRuleRegistry:
+    """Drop-in replacement for the mojadata transition rule manager proxy that
+    keeps a local cache of rule ids in each process it is copied to, so that
+    only rules the process hasn't seen before cost a round trip to the shared
+    index. Each round trip also brings back every rule registered by other
+    processes since the last one. Rules that only differ in how their values
+    are written (see :func:`make_rule_key`) share an id.
+
+    Args:
+        index (TransitionRuleIndex): the shared index, usually a proxy from a
+            :class:`SharedTransitionRuleRegistry`
+    """
+
+    def __init__(self, index: TransitionRuleIndex):
+        self._index = index
+        self._ids: dict[RuleKey, int] = {}
+        self._synced = 0
+
+    def get_or_add(
+        self,
+        regen_delay: Any,
+        age_after: Any,
+        classifier_values: dict[str, Any] = None,
+    ) -> int:
+        """Get the unique id for a transition rule, adding it if necessary.
+
+        Args:
+            regen_delay: the regen delay of the rule
+            age_after: the age to reset to, or -1 for no change
+            classifier_values (dict, optional): classifier name to the value to
+                transition to
+
+        Returns:
+            int: the rule id
+        """
+        return self.get_or_add_many([(regen_delay, age_after, classifier_values)])[0]
+
+    def get_or_add_many(self, rules: Iterable[tuple]) -> list[int]:
+        """Get the unique ids for a batch of transition rules, adding any new
+        ones in a single round trip to the shared index.
+
+        Args:
+            rules (iterable): (regen_delay, age_after, classifier_values) tuples
+
+        Returns:
+            list: the rule ids in the same order as the rules
+        """
+        keys = [make_rule_key(*rule) for rule in rules]
+        missing = list(dict.fromkeys(key for key in keys if key not in self._ids))
+        if missing:
+            ids, new_keys = self._index.get_or_add_many(missing, self._synced)
+            self._ids.update(zip(new_keys, count(self._synced + 1)))
+            self._ids.update(zip(missing, ids))
+            self._synced += len(new_keys)
+
+        return [self._ids[key] for key in keys]
+
+    def write_rules(self, output_path: str = "transition_rules.csv"):
+        self._index.write_rules(output_path)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import numpy as np
+
+from gcbmwalltowall.util.path import Path
+
+
+class ValueMap:
+    """Maps array values according to a dictionary, leaving any values not
+    present as a key unchanged. The lookup strategy is chosen once from the
+    distribution of the keys so that the same map can be applied cheaply to
+    many arrays, i.e. every chunk of a raster:
+
+        - "dense": integer keys spanning a compact range are expanded into a
+          lookup table indexed directly by pixel value
+        - "sorted": keys are sorted and pixel values located with a binary
+          search
+        - "hash": very large, sparse key sets are looked up in a numba typed
+          dictionary
+
+    Args:
+        m (dict): a dictionary of original value to mapped value
+        dtype (numpy.dtype): the dtype of the arrays that will be mapped; mapped
+            arrays keep this dtype
+        strategy (str, optional): force a particular strategy instead of
+            choosing one from the keys
+    """
+
+    dense_max_entries = 2**24
+    dense_min_fill = 0.05
+    hash_min_keys = 2**20
+
+    def __init__(self, m: dict, dtype: np.dtype, strategy: str = None):
+        self.dtype = np.dtype(dtype)
+        self._keys = np.fromiter(m.keys(), dtype=self.dtype, count=len(m))
+        self._values = np.fromiter(m.values(), dtype=self.dtype, count=len(m))
+        self.strategy = strategy or self._choose_strategy()
+        if self.strategy == "dense":
+            self._build_dense()
+        elif self.strategy == "sorted":
+            self._build_sorted()
+        elif self.strategy == "hash":
+            self._build_hash()
+        else:
+            raise ValueError(f"unknown value map strategy: {self.strategy}")
+
+    def __call__(self, a: np.ndarray) -> np.ndarray:
+        return self.apply(a)
+
+    def apply(self, a: np.ndarray) -> np.ndarray:
+        """Return a copy of a with mapped values replaced.
+
+        Args:
+            a (numpy.ndarray): array of the same dtype as the map
+
+        Returns:
+            numpy.ndarray: the mapped array
+        """
+        if a.dtype != self.dtype:
+            raise ValueError(f"expected array of {self.dtype}, got {a.dtype}")
+
+        if len(self._keys) == 0:
+            return a.copy()
+
+        if self.strategy == "dense":
+            return self._apply_dense(a)
+        elif self.strategy == "sorted":
+            return self._apply_sorted(a)
+
+        return self._apply_hash(a)
+
+    def _choose_strategy(self) -> str:
+        if len(self._keys) == 0:
+            return "sorted"
+
+        if np.issubdtype(self.dtype, np.integer):
+            key_range = int(self._keys.max()) - int(self._keys.min()) + 1
+            if (
+                key_range <= self.dense_max_entries
+                and len(self._keys) / key_range >= self.dense_min_fill
+            ):
+                return "dense"
+
+        if len(self._keys) >= self.hash_min_keys:
+            return "hash"
+
+        return "sorted"
+
+    def _build_dense(self):
+        self._min_key = int(self._keys.min())
+        self._max_key = int(self._keys.max())
+        self._lut = np.arange(self._min_key, self._max_key + 1).astype(self.dtype)
+        self._lut[self._keys.astype(np.int64) - self._min_key] = self._values
+
+    def _apply_dense(self, a: np.ndarray) -> np.ndarray:
+        in_range = (a >= self._min_key) & (a <= self._max_key)
+        if in_range.all():
+            return np.take(self._lut, a.astype(np.intp) - self._min_key)
+
+        out = a.copy()
+        out[in_range] = np.take(
+            self._lut, a[in_range].astype(np.intp) - self._min_key
+        )
+
+        return out
+
+    def _build_sorted(self):
+        order = np.argsort(self._keys, kind="stable")
+        self._sorted_keys = self._keys[order]
+        self._sorted_values = self._values[order]
+
+    def _apply_sorted(self, a: np.ndarray) -> np.ndarray:
+        idx = np.searchsorted(self._sorted_keys, a)
+        np.clip(idx, 0, len(self._sorted_keys) - 1, out=idx)
+        found = self._sorted_keys[idx] == a
+
+        return np.where(found, self._sorted_values[idx], a)
+
+    def _build_hash(self):
+        # Guard against paying for numba's import and JIT compilation unless
+        # the hash strategy is actually needed.
+        from gcbmwalltowall.util.numba import make_typed_dict
+
+        self._typed_dict = make_typed_dict(self._keys, self._values)
+
+    def _apply_hash(self, a: np.ndarray) -> np.ndarray:
+        from gcbmwalltowall.util.numba import _numba_map
+
+        return _numba_map(a, self._typed_dict)
+
+
+def remap(a: np.ndarray, m: dict, strategy: str = None) -> np.ndarray:
+    """Return the mapped value of a according to the dictionary m. Any values
+    in a not present as a key in m are unchanged, and the returned array is the
+    same type as the input array.
+
+    Args:
+        a (numpy.ndarray): a numpy array
+        m (dict): a dictionary to map values in the resulting array
+        strategy (str, optional): force a lookup strategy; see :class:`ValueMap`
+
+    Returns:
+        numpy.ndarray: the numpy array with replaced mapped values
+    """
+    return ValueMap(m, a.dtype, strategy).apply(a)
+
+
+def remap_raster(
+    input_path: str | Path,
+    output_path: str | Path,
+    m: dict,
+    memory_limit_MB: int = None,
+    strategy: str = None,
+):
+    """Remap the values of a single band raster chunk by chunk, writing the
+    result to a new raster with the same dimensions, type and nodata value.
+
+    Args:
+        input_path (str): path to the raster to remap
+        output_path (str): path to the remapped raster to create
+        m (dict): a dictionary to map pixel values
+        memory_limit_MB (int, optional): the maximum memory in megabytes to
+            use for the input and output chunks; defaults to the
+            :py:mod:`gdalhelpers` global memory limit
+        strategy (str, optional): force a lookup strategy; see :class:`ValueMap`
+    """
+    from gcbmwalltowall.util import gdalhelpers
+    from gcbmwalltowall.util.rastersession import RasterSession
+
+    input_path = str(input_path)
+    output_path = str(output_path)
+    gdalhelpers.create_empty_raster(
+        input_path, output_path, options=gdalhelpers.gdal_creation_options.copy()
+    )
+
+    value_map = None
+    with RasterSession() as session:
+        # Input and output chunks, plus the prefetched input chunk.
+        chunk_memory_limit_MB = (
+            memory_limit_MB or int(gdalhelpers.global_memory_limit / 1e6)
+        ) // 3
+
+        for bounds, (data,) in session.read_chunks(
+            input_path, memory_limit_MB=chunk_memory_limit_MB
+        ):
+            if value_map is None:
+                value_map = ValueMap(m, data.dtype, strategy)
+
+            session.write(output_path, value_map.apply(data), bounds.x_off, bounds.y_off)
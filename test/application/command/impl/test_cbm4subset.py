@@ -0,0 +1,238 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from gcbmwalltowall.application.command.impl.cbm4subset import find_chunks
+
+
+def test_find_chunks():
+    chunk_rasters = [
+        np.array([[0, 1, 1], [3, 3, 0]]),
+        np.array([[-1, 5], [5, 0]]),
+    ]
+
+    assert find_chunks(chunk_rasters) == {0, 2, 4}
+
+
+def test_mask_chunk_rasters(tmp_path):
+    from mojadata.util import gdal
+    from gcbmwalltowall.application.command.impl.cbm4subset import mask_chunk_rasters
+    from gcbmwalltowall.util.rasterbound import RasterBound
+
+    chunk_data = np.repeat(np.arange(1, 5, dtype=np.int32), 4).reshape(4, 4)
+    mask_data = np.array([
+        [1, 0, 0, 0],
+        [0, 255, 0, 0],
+        [0, 0, 0, 0],
+        [0, 0, 0, 2],
+    ], dtype=np.uint8)
+
+    paths = []
+    for name, data, data_type in (
+        ("chunks.tif", chunk_data, gdal.GDT_Int32),
+        ("mask.tif", mask_data, gdal.GDT_Byte),
+    ):
+        path = str(tmp_path.joinpath(name))
+        ds = gdal.GetDriverByName("GTiff").Create(path, 4, 4, 1, data_type)
+        ds.GetRasterBand(1).SetNoDataValue(255)
+        ds.GetRasterBand(1).WriteArray(data)
+        del ds
+        paths.append(path)
+
+    chunks = [RasterBound(0, 0, 4, 2), RasterBound(0, 2, 4, 2)]
+    masked = list(mask_chunk_rasters(paths, chunks))
+    assert np.array_equal(masked[0], [[1, 0, 0, 0], [0, 0, 0, 0]])
+    assert np.array_equal(masked[1], [[0, 0, 0, 0], [0, 0, 0, 4]])
+    assert find_chunks(masked) == {0, 3}
+
+
+class FakeDataset:
+    # Just enough of a local_storage RasterIndexedDataset for subsetting, with
+    # the data partitioned by chunk_index and, optionally, timestep.
+
+    raster_index_table_name = "raster_index"
+    created = {}
+
+    def __init__(self, data=None, tables=None):
+        import pandas as pd
+
+        self.data = data if data is not None else pd.DataFrame()
+        self.raster_index = pd.DataFrame({"chunk_index": sorted(set(self.data.get("chunk_index", [])))})
+        self.tables = tables or {}
+
+    def get_partition_values(self):
+        partition_cols = [c for c in ("chunk_index", "timestep") if c in self.data]
+        return [
+            dict(zip(partition_cols, map(int, values)))
+            for values in self.data[partition_cols].drop_duplicates().itertuples(index=False)
+        ]
+
+    def create_new(self, name, storage_type, path, copy_raster_index_data=True):
+        subset_ds = FakeDataset(tables={})
+        FakeDataset.created[str(path)] = subset_ds
+
+        return subset_ds
+
+    def read_pandas(self, table_name=None, filters=None):
+        data = self.raster_index if table_name == self.raster_index_table_name else self.data
+        for column, _, value in filters or []:
+            data = data[data[column] == value]
+
+        return data
+
+    def write(self, data, table_name=None):
+        import pandas as pd
+
+        if table_name == self.raster_index_table_name:
+            self.raster_index = pd.concat([self.raster_index, data])
+        else:
+            self.data = pd.concat([self.data, data])
+
+    def list_tables(self):
+        return list(self.tables)
+
+    def read_table_pandas(self, table_name):
+        return self.tables[table_name]
+
+    def write_table(self, table_name, data):
+        self.tables[table_name] = data
+
+    def list_files_and_dirs(self):
+        return []
+
+
+def _simulation_dataset():
+    import pandas as pd
+
+    return FakeDataset(pd.DataFrame({
+        "chunk_index": [0, 0, 1, 1, 2, 2],
+        "timestep": [1, 2, 1, 2, 1, 2],
+        "age": [10, 11, 20, 21, 30, 31],
+    }), {"transitions": pd.DataFrame({"id": [1]})})
+
+
+def test_copy_partitions_filters_chunks_and_timesteps(tmp_path):
+    from gcbmwalltowall.application.command.impl.cbm4subset import copy_partitions
+
+    source_ds = _simulation_dataset()
+    assert copy_partitions(source_ds, "simulation", tmp_path.joinpath("all"), {0, 2})
+    subset_ds = FakeDataset.created[str(tmp_path.joinpath("all"))]
+    assert sorted(subset_ds.data["age"]) == [10, 11, 30, 31]
+    assert sorted(subset_ds.raster_index["chunk_index"]) == [0, 2]
+    assert list(subset_ds.tables) == ["transitions"]
+
+    assert copy_partitions(
+        source_ds, "simulation", tmp_path.joinpath("t2"), {1, 2}, timesteps={2}
+    )
+    subset_ds = FakeDataset.created[str(tmp_path.joinpath("t2"))]
+    assert sorted(subset_ds.data["age"]) == [21, 31]
+
+    # Nothing to copy for chunks or timesteps that aren't in the dataset.
+    assert not copy_partitions(
+        source_ds, "simulation", tmp_path.joinpath("none"), {5}, timesteps={2}
+    )
+    assert not copy_partitions(
+        source_ds, "simulation", tmp_path.joinpath("t3"), {0}, timesteps={3}
+    )
+
+
+def _subset(tmp_path, monkeypatch, cache=None):
+    from gcbmwalltowall.application.command.impl import cbm4subset
+    from gcbmwalltowall.application.command.impl.cbm4subset import CBM4Subset
+    from gcbmwalltowall.configuration.configuration import Configuration
+
+    project_path = tmp_path.joinpath("project")
+    project_path.mkdir()
+    config = {
+        "start_year": 2010,
+        "end_year": 2020,
+        "cbm4_spatial_dataset": {
+            name: {"dataset_name": name, "storage_type": "local_storage", "path_or_uri": name}
+            for name in ("inventory", "disturbance", "simulation")
+        },
+    }
+
+    if cache:
+        config["cache"] = cache
+
+    project_path.joinpath("cbm4_config.json").write_text(json.dumps(config))
+
+    # Simulation results are opened by path: the project's own, or its cache.
+    opened = []
+    monkeypatch.setattr(
+        cbm4subset, "RasterIndexedDataset",
+        lambda name, storage_type, path: opened.append(path) or _simulation_dataset(),
+    )
+
+    subset = CBM4Subset.__new__(CBM4Subset)
+    subset._config = Configuration(config, project_path)
+    subset._project = SimpleNamespace(
+        inventory_dataset=_simulation_dataset(), disturbance_dataset=FakeDataset()
+    )
+
+    return subset, opened
+
+
+def test_select_chunks_meets_every_criterion(tmp_path, monkeypatch):
+    subset, _ = _subset(tmp_path, monkeypatch)
+    subset._find_chunks_in_bounding_box = lambda bounding_box: {0, 1, 7}
+    subset._find_chunks_under_mask = lambda mask_path: {1, 2}
+    subset._find_chunks_with_classifiers = lambda classifier_filter: {1}
+
+    assert subset.select_chunks() == [0, 1, 2]
+    assert subset.select_chunks(chunks=[2, 5]) == [2]
+    assert subset.select_chunks(bounding_box=(0, 0, 1, 1)) == [0, 1]
+    assert subset.select_chunks(bounding_box=(0, 0, 1, 1), mask_path="mask.tif") == [1]
+    assert subset.select_chunks(chunks=[0], classifier_filter={"species": "pine"}) == []
+
+
+def test_cache_ends_the_year_before_the_start_year(tmp_path, monkeypatch):
+    subset, opened = _subset(tmp_path, monkeypatch)
+    cache_path = tmp_path.joinpath("subset", "cache")
+
+    # Starting in 2012 needs the project's results at the end of 2011.
+    cache_config = subset._create_cache(cache_path, {1}, 2)
+    assert cache_config["end_year"] == 2011
+    assert opened == [str(tmp_path.joinpath("project", "simulation"))]
+    cached_ds = FakeDataset.created[str(cache_path.joinpath("simulation"))]
+    assert list(cached_ds.data["age"]) == [21]
+
+    with pytest.raises(RuntimeError):
+        subset._create_cache(cache_path, {1}, 3)
+
+
+def test_cache_from_cloned_project_cache(tmp_path, monkeypatch):
+    # A clone whose own cache runs to the end of 2013, timestep 4.
+    subset, opened = _subset(tmp_path, monkeypatch, cache={
+        "dataset_name": "simulation", "storage_type": "local_storage",
+        "path_or_uri": "../parent/simulation", "end_year": 2013,
+    })
+
+    cache_config = subset._create_cache(tmp_path.joinpath("cache"), {0}, 2)
+    assert cache_config["end_year"] == 2011
+    assert opened == [str(tmp_path.joinpath("parent", "simulation"))]
+
+
+def test_resume_reuses_matching_subset(tmp_path, monkeypatch):
+    subset, _ = _subset(tmp_path, monkeypatch)
+    output_path = tmp_path.joinpath("subset")
+
+    config_path = subset.create(output_path, [0, 2], end_year=2015)
+    assert json.loads(config_path.read_text())["end_year"] == 2015
+    output_path.joinpath("checkpoint").mkdir()
+
+    # The same selection keeps the subset and its checkpoints.
+    assert subset.create(output_path, [2, 0], end_year=2015, resume=True) == config_path
+    assert output_path.joinpath("checkpoint").exists()
+
+    with pytest.raises(RuntimeError):
+        subset.create(output_path, [0, 1], end_year=2015, resume=True)
+
+    with pytest.raises(RuntimeError):
+        subset.create(output_path, [0, 2], resume=True)
+
+    # Without resuming, the subset starts over.
+    subset.create(output_path, [0, 2], end_year=2015)
+    assert not output_path.joinpath("checkpoint").exists()
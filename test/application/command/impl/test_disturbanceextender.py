@@ -60,3 +60,25 @@ def test_add_from_walltowall_config(
     )
 
     assert extended_disturbance_count > original_disturbance_count
+
+
+def test_add_from_study_area_single_worker(
+    cbm4_project_copy, extra_tiled_disturbance_path
+):
+    cbm4_project = CBM4Project(cbm4_project_copy.joinpath("cbm4_config.json"))
+    extender = DisturbanceExtender(cbm4_project, max_workers=1)
+    study_area_path = extra_tiled_disturbance_path.joinpath("study_area.json")
+
+    original_disturbance_count = (
+        cbm4_project.disturbance_dataset.read_polars()
+        .select(pl.len()).collect().item()
+    )
+
+    extender.add_from_study_area(study_area_path)
+    extended_disturbance_count = (
+        cbm4_project.disturbance_dataset.read_polars()
+        .select(pl.len()).collect().item()
+    )
+
+    assert extended_disturbance_count > original_disturbance_count
+    assert cbm4_project_copy.joinpath("extend_profiling.csv").is_file()
@@ -0,0 +1,32 @@
+from gcbmwalltowall.application.command.impl.layerinspector import (
+    LayerInspection, summarize
+)
+
+
+def test_report_row():
+    inspection = LayerInspection(
+        "fire", "disturbance", "fire.shp", "ESRI Shapefile", "EPSG:4326",
+        extent=(-120.5, 50, -119, 51), size=12,
+        attributes={"year": 3, "dist_type": 2}, years=(2001, 2010),
+        errors=["attribute not found: 'year'"],
+    )
+
+    row = dict(zip(LayerInspection.columns, inspection.to_row()))
+    assert row["extent"] == "-120.5 50 -119 51"
+    assert row["attribute_values"] == "year=3; dist_type=2"
+    assert row["years"] == "2001-2010"
+    assert row["errors"] == "attribute not found: 'year'"
+
+
+def test_summary_peak_memory():
+    inspections = [
+        LayerInspection(str(i), "layer", est_tiled_pixels=1000, est_memory_MB=mb)
+        for i, mb in enumerate((10, 40, 20, 30))
+    ]
+    inspections.append(LayerInspection("missing", "layer", errors=["file not found"]))
+
+    summary = summarize(inspections, workers=2)
+    assert summary["layers"] == 5
+    assert summary["errors"] == 1
+    assert summary["est_tiled_pixels"] == 4000
+    assert summary["est_peak_memory_MB"] == 70
@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gcbmwalltowall.application.command.impl.simulationexporter import (
+    SimulationExporter,
+    aggregate,
+    combine,
+    geotiff_nodata,
+    rasterize_chunk,
+    select_variables,
+)
+
+
+def test_select_variables():
+    columns = ["chunk_index", "index", "pools.Merch", "flux.NPP", "area", "age"]
+    assert select_variables(columns) == ["pools.Merch", "flux.NPP", "area"]
+
+
+def test_combine_chunk_aggregates():
+    variables = ["pools.Merch", "area"]
+    chunk_1 = pd.DataFrame({
+        "species": ["pine", "pine", "spruce"],
+        "pools.Merch": [1.0, 2.0, 3.0],
+        "area": [1.0, 1.0, 1.0],
+    })
+
+    chunk_2 = pd.DataFrame({
+        "species": ["spruce", "fir"],
+        "pools.Merch": [4.0, 5.0],
+        "area": [2.0, 1.0],
+    })
+
+    total = None
+    for chunk in (chunk_1, chunk_2):
+        total = combine(total, aggregate(chunk, ["species"], variables))
+
+    expected = aggregate(pd.concat([chunk_1, chunk_2]), ["species"], variables)
+    pd.testing.assert_frame_equal(total.sort_index(), expected.sort_index())
+
+
+def test_aggregate_without_groups():
+    data = pd.DataFrame({"area": [1.0, 2.0]})
+    assert aggregate(data, [], ["area"])["area"].iloc[0] == 3.0
+
+
+def test_rasterize_chunk():
+    pixel_data = pd.DataFrame({
+        "raster_index": [0, 5],
+        "pools.Merch": [1.5, 2.5],
+        "area": [1.0, 2.0],
+    })
+
+    rasters = dict(rasterize_chunk(pixel_data, ["pools.Merch", "area"], 3, 2))
+    assert list(rasters) == ["pools.Merch", "area"]
+    assert rasters["pools.Merch"].shape == (2, 3)
+    assert rasters["pools.Merch"][0, 0] == 1.5
+    assert rasters["pools.Merch"][1, 2] == 2.5
+    assert (rasters["area"][rasters["area"] != geotiff_nodata] == [1.0, 2.0]).all()
+
+
+class FakeDataset:
+    # Just enough of a RasterIndexedDataset for exporting: partitioned by
+    # chunk_index and, for simulation results, timestep.
+
+    raster_index_table_name = "raster_index"
+
+    def __init__(self, data, raster_index=None, chunks=None):
+        self.data = data
+        self.raster_index = raster_index
+        self.chunks = chunks
+
+    def get_partition_values(self):
+        return [
+            {"chunk_index": chunk_index, "timestep": timestep}
+            for chunk_index, timestep in
+            self.data[["chunk_index", "timestep"]].drop_duplicates().itertuples(index=False)
+        ]
+
+    def get_layer_names(self):
+        return [c for c in self.data.columns if c not in ("chunk_index", "index", "cohort_index")]
+
+    def read_pandas(self, table_name=None, filters=None, read_cols=None):
+        data = self.raster_index if table_name == self.raster_index_table_name else self.data
+        for column, _, value in filters or []:
+            data = data[data[column] == value]
+
+        return data[read_cols] if read_cols else data
+
+
+def _fake_project(chunk_raster_path=None):
+    inventory_ds = FakeDataset(
+        pd.DataFrame({"chunk_index": [0, 0, 1], "index": [0, 1, 0], "cohort_index": 0}),
+        raster_index=pd.DataFrame({
+            "chunk_index": [0, 0, 1], "index": [0, 1, 0], "cohort_index": 0,
+            "raster_index": [0, 3, 1],
+        }),
+        chunks=[
+            SimpleNamespace(x_off=0, y_off=0, x_size=2, y_size=2),
+            SimpleNamespace(x_off=2, y_off=0, x_size=2, y_size=2),
+        ],
+    )
+
+    simulation_ds = FakeDataset(pd.DataFrame({
+        "chunk_index": [0, 0, 1, 0, 0, 1],
+        "index": [0, 1, 0, 0, 1, 0],
+        "cohort_index": 0,
+        "timestep": [1, 1, 1, 2, 2, 2],
+        "pools.Merch": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        "area": 1.0,
+    }))
+
+    return SimpleNamespace(
+        inventory_dataset=inventory_ds,
+        simulation_dataset=simulation_ds,
+        classifier_names=[],
+        t0_year=2009,
+        extract_chunk_raster=lambda: chunk_raster_path,
+    )
+
+
+def test_export_aggregates_without_groups(tmp_path):
+    pytest.importorskip("pyarrow")
+    exporter = SimulationExporter(_fake_project())
+    aggregate_path = exporter.export_aggregates(tmp_path)
+
+    # Without reporting classifiers or boundaries there's one row per year,
+    # and no index column.
+    totals = pd.read_parquet(aggregate_path.joinpath("year=2010", "part-0.parquet"))
+    assert list(totals.columns) == ["pools.Merch", "area"]
+    assert totals.to_dict("records") == [{"pools.Merch": 6.0, "area": 3.0}]
+
+
+def test_export_geotiffs_by_chunk(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import gdal
+
+    chunk_raster_path = str(tmp_path.joinpath("chunk.tiff"))
+    ds = gdal.GetDriverByName("GTiff").Create(chunk_raster_path, 4, 2, 1, gdal.GDT_Int32)
+    ds.SetGeoTransform((-100.0, 0.01, 0, 55.0, 0, -0.01))
+    ds.GetRasterBand(1).WriteArray(np.array([[1, 1, 2, 2], [1, 1, 2, 2]]))
+    del ds
+
+    exporter = SimulationExporter(_fake_project(chunk_raster_path))
+    outputs = exporter.export_geotiffs(tmp_path, ["pools.Merch"])
+    assert [path.name for path in outputs] == ["pools.Merch_2010.tiff", "pools.Merch_2011.tiff"]
+
+    ds = gdal.Open(str(outputs[1]))
+    assert ds.GetGeoTransform() == (-100.0, 0.01, 0, 55.0, 0, -0.01)
+    nodata = ds.GetRasterBand(1).GetNoDataValue()
+    assert ds.ReadAsArray().tolist() == [[4.0, nodata, nodata, 6.0], [nodata, 5.0, nodata, nodata]]
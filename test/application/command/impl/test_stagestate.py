@@ -0,0 +1,19 @@
+from gcbmwalltowall.application.command.impl.stagestate import StageState
+
+
+def test_resume_skips_completed_stages(tmp_path):
+    calls = []
+    state = StageState(tmp_path, {"input": 1})
+    assert state.run("first", lambda: calls.append("first") or 42) == 42
+
+    resumed = StageState(tmp_path, {"input": 1})
+    assert resumed.run("first", lambda: calls.append("first") or 0) == 42
+    assert resumed.run("second", lambda: calls.append("second")) is None
+    assert calls == ["first", "second"]
+
+
+def test_changed_inputs_discard_state(tmp_path):
+    StageState(tmp_path, {"input": 1}).run("first", lambda: 1)
+    assert not StageState(tmp_path, {"input": 2}).is_complete("first")
+    StageState(tmp_path, {"input": 2}).run("first", lambda: 1)
+    assert not StageState(tmp_path, {"input": 2}, resume=False).is_complete("first")
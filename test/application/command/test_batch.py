@@ -0,0 +1,131 @@
+import json
+import sys
+import threading
+import time
+from types import ModuleType
+import pytest
+from gcbmwalltowall.application.command.batch import BatchPlan, BatchRunner
+
+
+def _plan(**kwargs):
+    return BatchPlan.from_dict({
+        "tasks": [
+            {"id": "prepare", "command": "prepare", "args": {"config_path": "base.json"}},
+        ],
+        "scenarios": {"a": {"end_year": 2030}, "b": {"end_year": 2040}},
+        "scenario_tasks": [
+            {"id": "clone", "command": "clone", "depends_on": ["prepare"],
+             "args": {"output_path": "out/{scenario}", "end_year": "{end_year}"}},
+            {"id": "run", "command": "run", "depends_on": ["clone"],
+             "args": {"project_path": "out/{scenario}"}},
+        ],
+        **kwargs,
+    })
+
+
+def test_scenario_expansion():
+    tasks = {task.id: task for task in _plan().tasks}
+    assert list(tasks) == ["prepare", "a/clone", "a/run", "b/clone", "b/run"]
+    assert tasks["b/clone"].args == {"output_path": "out/b", "end_year": 2040}
+    assert tasks["b/clone"].depends_on == ["prepare"]
+    assert tasks["a/run"].depends_on == ["a/clone"]
+
+
+def test_invalid_plans():
+    with pytest.raises(ValueError):
+        BatchPlan.from_dict({"tasks": [{"id": "x", "command": "rm"}]})
+
+    with pytest.raises(ValueError):
+        BatchPlan.from_dict({"tasks": [
+            {"id": "x", "command": "run", "depends_on": ["y"]},
+            {"id": "y", "command": "run", "depends_on": ["x"]},
+        ]})
+
+
+def test_runner_order_and_budget(monkeypatch):
+    lock = threading.Lock()
+    finished = []
+    active = [0, 0]
+
+    def fake_run_task(self, task, workers, mem_gb):
+        with lock:
+            active[0] += workers
+            active[1] = max(active[1], active[0])
+
+        time.sleep(0.05)
+        with lock:
+            active[0] -= workers
+            finished.append(task.id)
+
+        if task.id == "a/clone":
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(BatchRunner, "_run_task", fake_run_task)
+    plan = _plan(continue_on_error=True)
+    for task in plan.tasks:
+        task.max_workers = 2
+
+    summary = {row[0]: row[2] for row in BatchRunner(plan, 3, 0).run()}
+
+    assert finished[0] == "prepare"
+    assert active[1] <= 3
+    assert summary == {
+        "prepare": "done", "a/clone": "failed", "a/run": "skipped",
+        "b/clone": "done", "b/run": "done",
+    }
+
+
+def test_runner_exit_fails_task_and_shares_memory(monkeypatch):
+    granted = {}
+
+    def fake_run_task(self, task, workers, mem_gb):
+        granted[task.id] = mem_gb
+        if task.id == "a/clone":
+            sys.exit("bad input")
+
+    monkeypatch.setattr(BatchRunner, "_run_task", fake_run_task)
+    plan = _plan(continue_on_error=True)
+    plan.tasks[0].max_mem_gb = 10
+
+    summary = {row[0]: row[2] for row in BatchRunner(plan, 4, 40).run()}
+
+    assert summary["a/clone"] == "failed"
+    assert summary["b/run"] == "done"
+    assert granted["prepare"] == 10
+    assert granted["b/clone"] == 10
+
+
+def test_scenarios_share_cached_configuration(monkeypatch, tmp_path):
+    from gcbmwalltowall.configuration import configuration
+    from gcbmwalltowall.configuration.configuration import Configuration
+
+    config_path = tmp_path.joinpath("base.json")
+    config_path.write_text(json.dumps({"project_name": "base"}))
+
+    parsed = []
+    load_json = configuration.load_json
+    monkeypatch.setattr(
+        configuration, "load_json", lambda path: parsed.append(path) or load_json(path)
+    )
+
+    loaded = {}
+    fake_clone = ModuleType("clone")
+    fake_clone.clone = lambda args: loaded.update(
+        {args["output_path"]: Configuration.load(args["config_path"])}
+    )
+
+    monkeypatch.setitem(sys.modules, "gcbmwalltowall.application.command.clone", fake_clone)
+    plan = BatchPlan.from_dict({
+        "scenarios": {"a": {}, "b": {}},
+        "scenario_tasks": [
+            {"id": "clone", "command": "clone",
+             "args": {"config_path": str(config_path), "output_path": "{scenario}"}},
+        ],
+    })
+
+    summary = BatchRunner(plan, 2, 0).run()
+
+    # Both scenarios run in this process, so the file is only parsed once.
+    assert [row[2] for row in summary] == ["done", "done"]
+    assert loaded["a"] == loaded["b"] == {"project_name": "base"}
+    assert parsed == [config_path]
@@ -0,0 +1,28 @@
+import pandas as pd
+from gcbmwalltowall.application.command.benchmark import (
+    benchmark_columns, compare_to_baseline
+)
+
+
+def _results(*rows):
+    return pd.DataFrame(columns=benchmark_columns, data=list(rows))
+
+
+def test_compare_to_baseline():
+    baseline = _results(
+        ["small", "prepare", "done", 10.0, 500.0, 100.0],
+        ["small", "convert", "done", 20.0, 800.0, 50.0],
+        ["small", "run_libcbm", "failed", 1.0, 100.0, 0.0],
+    )
+
+    results = _results(
+        ["small", "prepare", "done", 11.0, 590.0, 100.0],
+        ["small", "convert", "failed", 1.0, 100.0, 0.0],
+        ["small", "run_libcbm", "done", 60.0, 900.0, 10.0],
+        ["large", "prepare", "done", 100.0, 5000.0, 1000.0],
+    )
+
+    regressions = compare_to_baseline(results, baseline, 0.1)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("small/prepare: peak_memory_MB 590")
+    assert regressions[1] == "small/convert: failed"
@@ -0,0 +1,73 @@
+import json
+import pytest
+
+
+class FakeLayer:
+    # Just enough of a mojadata RasterLayer for the passthrough tiler.
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.name = path.stem
+        self.data_type = "Int16"
+        self.nodata_value = -1
+        self.pixel_size = 0.00025
+        self.attribute_table = None
+        self.metadata = {"name": self.name}
+
+    def is_empty(self):
+        return False
+
+    def tiles(self, tile_extent, block_extent):
+        return []
+
+
+def test_merge_tiling_skips_recorded_layers(tmp_path, monkeypatch):
+    pytest.importorskip("spatial_inventory_rollback")
+    from spatial_inventory_rollback.gcbm.merge import gcbm_merge_tile
+    from gcbmwalltowall.application.command.merge import _resumable_tiling
+
+    layers = []
+    for name in ("initial_age", "Classifier1", "disturbance_2010"):
+        layer_path = tmp_path.joinpath("merged", f"{name}.tiff")
+        layer_path.parent.mkdir(exist_ok=True)
+        layer_path.write_text(f"{name} v1")
+        layers.append(FakeLayer(layer_path))
+
+    # Like the real tile function, the tiler is looked up when it's called.
+    def fake_tile(layer_output_dir, layers):
+        gcbm_merge_tile.PassthroughGdalTiler2D(workers=1).tile(layers, layer_output_dir)
+
+    monkeypatch.setattr(gcbm_merge_tile, "tile", fake_tile, raising=False)
+
+    checkpoint_path = tmp_path.joinpath("checkpoint")
+    output_path = tmp_path.joinpath("tiled")
+
+    # A first run that stopped after the first two layers.
+    with _resumable_tiling(checkpoint_path):
+        gcbm_merge_tile.tile(str(output_path), layers[:2])
+
+    assert sorted(fn.name for fn in checkpoint_path.iterdir()) == [
+        "Classifier1.done", "initial_age.done"
+    ]
+
+    for layer in layers:
+        with open(layer.path, "w") as layer_file:
+            layer_file.write(f"{layer.name} v2")
+
+    with _resumable_tiling(checkpoint_path):
+        gcbm_merge_tile.tile(str(output_path), layers)
+
+    # Only the layer missing from the checkpoint was copied again.
+    assert output_path.joinpath("initial_age_moja.tiff").read_text() == "initial_age v1"
+    assert output_path.joinpath("Classifier1_moja.tiff").read_text() == "Classifier1 v1"
+    assert output_path.joinpath("disturbance_2010_moja.tiff").read_text() == (
+        "disturbance_2010 v2"
+    )
+
+    study_area = json.loads(output_path.joinpath("study_area.json").read_text())
+    assert [layer["name"] for layer in study_area["layers"]] == [
+        "initial_age", "Classifier1", "disturbance_2010"
+    ]
+
+    # The original tiler is restored afterwards.
+    assert not hasattr(gcbm_merge_tile.PassthroughGdalTiler2D, "func")
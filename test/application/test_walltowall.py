@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+# Cumulative import time budget for the CLI entry point, in microseconds.
+IMPORT_TIME_BUDGET_US = 500_000
+
+HEAVY_MODULES = (
+    "arrow_space",
+    "cbm4",
+    "gcbminputloader",
+    "mojadata",
+    "numba",
+    "osgeo",
+    "pandas",
+    "psutil",
+    "spatial_inventory_rollback",
+    "sqlalchemy",
+)
+
+
+def _import_times(*args):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+
+    return result, times
+
+
+def _assert_no_heavy_imports(times):
+    loaded = {module.split(".")[0] for module in times}
+    assert not loaded.intersection(HEAVY_MODULES)
+
+
+def test_cli_import_time():
+    _, times = _import_times("-c", "import gcbmwalltowall.application.walltowall")
+    _assert_no_heavy_imports(times)
+    assert times["gcbmwalltowall.application.walltowall"] < IMPORT_TIME_BUDGET_US
+
+
+def test_cli_help_is_lightweight():
+    result, times = _import_times(
+        "-m", "gcbmwalltowall.application.walltowall", "--help"
+    )
+
+    assert result.returncode == 0
+    assert "Manage GCBM wall-to-wall projects" in result.stdout
+    _assert_no_heavy_imports(times)
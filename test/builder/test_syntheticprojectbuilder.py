@@ -0,0 +1,112 @@
+import sqlite3
+import pytest
+from gcbmwalltowall.builder.syntheticprojectbuilder import choose_names
+
+AVAILABLE = {"Softwood forest type", "Hardwood forest type", "Black spruce", "Jack pine"}
+DEFAULTS = ["Softwood forest type", "Hardwood forest type", "Not in database"]
+
+
+def test_choose_configured_names():
+    assert choose_names("species", ["black SPRUCE"], AVAILABLE, DEFAULTS) == ["Black spruce"]
+    with pytest.raises(RuntimeError):
+        choose_names("species", ["Redwood"], AVAILABLE, DEFAULTS)
+
+
+def test_choose_name_count():
+    # Defaults missing from the database are replaced by random names.
+    chosen = choose_names("species", None, AVAILABLE, DEFAULTS)
+    assert chosen[:2] == DEFAULTS[:2]
+    assert chosen[2] in {"Black spruce", "Jack pine"}
+
+    chosen = choose_names("species", 4, AVAILABLE, DEFAULTS, seed=1)
+    assert chosen[:2] == DEFAULTS[:2]
+    assert set(chosen) == AVAILABLE
+    assert chosen == choose_names("species", 4, AVAILABLE, DEFAULTS, seed=1)
+
+    with pytest.raises(RuntimeError):
+        choose_names("species", 5, AVAILABLE, DEFAULTS)
+
+
+def test_write_tiny_landscape(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import gdal
+    from gcbmwalltowall.builder.syntheticprojectbuilder import SyntheticLandscape
+
+    # Chunks smaller than the landscape, to write it in more than one piece.
+    landscape = SyntheticLandscape(tmp_path, 10, 10, 0.001, (-100.0, 55.0), 5, 0)
+    landscape.chunk_pixels = 30
+
+    bbox_path = tmp_path.joinpath(landscape.write_bounding_box())
+    age_path = tmp_path.joinpath(landscape.write_age("initial_age", 0))
+
+    bbox = gdal.Open(str(bbox_path)).ReadAsArray()
+    ages = gdal.Open(str(age_path)).ReadAsArray()
+    assert bbox.shape == (10, 10)
+    assert (bbox == 1).all()
+
+    # Each 5x5 stand has a single age.
+    for row in (0, 5):
+        for col in (0, 5):
+            stand = ages[row:row + 5, col:col + 5]
+            assert (stand == stand[0, 0]).all()
+
+
+def _create_aidb(path):
+    # Just enough of a cbm_defaults database for the builder's name lookups.
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE locale (id INTEGER PRIMARY KEY, code TEXT);
+            CREATE TABLE species (id INTEGER PRIMARY KEY);
+            CREATE TABLE species_tr (species_id INTEGER, locale_id INTEGER, name TEXT);
+            CREATE TABLE disturbance_type (id INTEGER PRIMARY KEY);
+            CREATE TABLE disturbance_type_tr (
+                disturbance_type_id INTEGER, locale_id INTEGER, name TEXT);
+            INSERT INTO locale VALUES (1, 'en-CA');
+            INSERT INTO species VALUES (1), (2), (3);
+            INSERT INTO species_tr VALUES
+                (1, 1, 'Softwood forest type'), (2, 1, 'Hardwood forest type'),
+                (3, 1, 'Black spruce');
+            INSERT INTO disturbance_type VALUES (1), (2);
+            INSERT INTO disturbance_type_tr VALUES
+                (1, 1, 'Wildfire'), (2, 1, 'Clearcut harvesting with salvage');
+        """)
+
+
+def test_build_small_project(tmp_path):
+    pytest.importorskip("mojadata")
+    pytest.importorskip("gcbminputloader")
+    from gcbmwalltowall.builder.syntheticprojectbuilder import SyntheticProjectBuilder
+    from gcbmwalltowall.configuration.configuration import Configuration
+
+    _create_aidb(tmp_path.joinpath("aidb.db"))
+    config = SyntheticProjectBuilder.build(Configuration({
+        "aidb": "aidb.db",
+        "builder": {
+            "type": "synthetic",
+            "width": 20,
+            "height": 20,
+            "patch_size": 5,
+            "classifier_format": "vector",
+            "disturbance_years": 2,
+            "disturbance_rate": 0.5,
+            "disturbance_format": "vector",
+            "extension_years": 1,
+            "cohorts": 1,
+            "rollback": True,
+        },
+    }, tmp_path))
+
+    assert set(config["classifiers"]) == {"classifier_1", "classifier_2"}
+    for classifier in config["classifiers"].values():
+        assert classifier["attribute"] == "code"
+        assert tmp_path.joinpath(classifier["layer"]).exists()
+        assert tmp_path.joinpath(classifier["values_path"]).exists()
+
+    for layer_path in config["layers"].values():
+        assert tmp_path.joinpath(layer_path).exists()
+
+    assert len(list(tmp_path.joinpath("layers", "disturbances").glob("*.shp"))) == 2
+    assert tmp_path.joinpath("extension_disturbances.json").exists()
+    assert tmp_path.joinpath(config["rollback"]["age_distribution"]).exists()
+    assert config["rollback"]["inventory_year"] == 2012
+    assert len(config["cohorts"]) == 1
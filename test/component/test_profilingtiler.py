@@ -0,0 +1,57 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _tile(age_path, output_path, checkpoint_path):
+    from mojadata.boundingbox import BoundingBox
+    from mojadata.layer.rasterlayer import RasterLayer
+    from gcbmwalltowall.component.profilingtiler import ProfilingGdalTiler2D
+
+    bbox = BoundingBox(RasterLayer(str(age_path)), pixel_size=0.001, shrink_to_data=True)
+    tiler = ProfilingGdalTiler2D(
+        bbox, use_bounding_box_resolution=True, workers=1,
+        checkpoint_path=checkpoint_path,
+    )
+
+    tiler.tile(
+        [RasterLayer(str(age_path), name="initial_age")], str(output_path),
+        {"initial_age": ("age", 0.5)},
+    )
+
+    return pd.read_csv(output_path.joinpath("tiling_profile.csv"))
+
+
+def test_tiling_profile_and_resume(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import gdal
+    from gcbmwalltowall.component.profilingtiler import ProfilingGdalTiler2D
+
+    age_path = tmp_path.joinpath("age.tif")
+    ds = gdal.GetDriverByName("GTiff").Create(str(age_path), 10, 10, 1, gdal.GDT_Int16)
+    ds.SetGeoTransform((-100.0, 0.001, 0, 55.0, 0, -0.001))
+    ds.SetProjection("EPSG:4326")
+    ds.GetRasterBand(1).SetNoDataValue(-1)
+    ds.GetRasterBand(1).WriteArray(np.arange(100, dtype=np.int16).reshape(10, 10))
+    del ds
+
+    output_path = tmp_path.joinpath("tiled")
+    checkpoint_path = tmp_path.joinpath("checkpoint")
+    profile = _tile(age_path, output_path, checkpoint_path)
+
+    assert list(profile.columns) == ProfilingGdalTiler2D.profile_columns
+    row = profile.iloc[0]
+    assert (row.layer, row.source, row.status) == ("initial_age", "age", "tiled")
+    assert row.prepare_time == 0.5
+    assert row.output_MB > 0 and row.total_time >= row.warp_time
+    assert checkpoint_path.joinpath("initial_age.done").exists()
+
+    # A rerun finds the layer recorded and its output still there.
+    profile = _tile(age_path, output_path, checkpoint_path)
+    row = profile.iloc[0]
+    assert row.status == "resumed"
+    assert pd.isna(row.total_time)
+
+    study_area = json.loads(output_path.joinpath("study_area.json").read_text())
+    assert len(study_area["layers"]) == 1
@@ -0,0 +1,107 @@
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+
+class StubRollback:
+    # Records what each rollback run sees in its tiled layers directory and
+    # writes outputs next to it like the real rollback.
+
+    def __init__(self, modify_layer=None):
+        self.modify_layer = modify_layer
+        self.runs = {}
+
+    def run(self, classifiers, tiled_layers_path, input_db_path, rule_manager, max_mem_gb):
+        self.runs[tiled_layers_path] = {
+            fn.name: not fn.stat().st_mode & stat.S_IWUSR
+            for fn in tiled_layers_path.iterdir()
+        }
+
+        if self.modify_layer:
+            with open(tiled_layers_path.joinpath(self.modify_layer), "ab") as layer:
+                layer.write(b"changed")
+
+        rollback_path = tiled_layers_path.parent.joinpath("rollback")
+        rollback_path.joinpath("rollback_stats").mkdir(parents=True, exist_ok=True)
+        for name in ("initial_age_rollback.tiff", "contemporary_age.tiff"):
+            rollback_path.joinpath(name).write_text(str(tiled_layers_path))
+
+
+def _cohort_project(tmp_path, monkeypatch):
+    pytest.importorskip("mojadata")
+    from gcbmwalltowall.component import project as project_module
+    from gcbmwalltowall.component.project import Project
+    from gcbmwalltowall.util.resources import ResourceGovernor
+
+    # Rollbacks run on threads so the stub can record what it saw.
+    monkeypatch.setattr(
+        project_module, "ProcessPoolExecutor",
+        lambda workers, **kwargs: ThreadPoolExecutor(workers),
+    )
+
+    ResourceGovernor.configure(16, 4)
+    project = Project.__new__(Project)
+    project.output_path = tmp_path
+    project.max_mem_gb = None
+    project.cohorts = [SimpleNamespace(), SimpleNamespace()]
+    for name in ("age.tiff", "species.tiff", "study_area.json"):
+        project.tiler_output_path.mkdir(parents=True, exist_ok=True)
+        project.tiler_output_path.joinpath(name).write_text(f"base {name}")
+
+    for i in (1, 2):
+        cohort_path = project.tiler_output_path.joinpath("cohorts", str(i))
+        cohort_path.mkdir(parents=True)
+        cohort_path.joinpath("age.tiff").write_text(f"cohort {i} age")
+        cohort_path.joinpath("study_area.json").write_text(f"cohort {i}")
+
+    return project
+
+
+def test_cohort_rollbacks(tmp_path, monkeypatch):
+    project = _cohort_project(tmp_path, monkeypatch)
+    staging_root = tmp_path.joinpath("staging")
+    rollback = StubRollback()
+    project._run_cohort_rollbacks(rollback, None, staging_root)
+
+    staging_layers = {
+        staging_root.joinpath(str(i), "layers", "tiled") for i in (1, 2)
+    }
+
+    assert set(rollback.runs) == staging_layers | {project.tiler_output_path}
+    for staging_layers_path in staging_layers:
+        # Cohort layers replace the base layers with the same name, and every
+        # staged layer is read-only while rollback runs.
+        assert rollback.runs[staging_layers_path] == {
+            "age.tiff": True, "species.tiff": True, "study_area.json": True,
+        }
+
+        i = staging_layers_path.parent.parent.name
+        assert staging_layers_path.joinpath("age.tiff").read_text() == f"cohort {i} age"
+        assert staging_layers_path.joinpath("study_area.json").read_text() == "base study_area.json"
+
+        cohort_rollback_path = project.rollback_output_path.joinpath("cohorts", i)
+        assert sorted(fn.name for fn in cohort_rollback_path.iterdir()) == [
+            "initial_age_rollback.tiff", "rollback_stats"
+        ]
+
+        assert cohort_rollback_path.joinpath("initial_age_rollback.tiff").read_text() == (
+            str(staging_layers_path)
+        )
+
+    # The base layers shared with the staging directories are writable again.
+    for fn in project.tiler_output_path.glob("*.*"):
+        assert os.access(fn, os.W_OK) and fn.stat().st_mode & stat.S_IWUSR
+
+
+def test_cohort_rollback_writing_linked_layer_fails(tmp_path, monkeypatch):
+    project = _cohort_project(tmp_path, monkeypatch)
+
+    # The read-only layer stops the write, or, for users that can write to it
+    # anyway (i.e. root), the changed layer is found afterwards.
+    with pytest.raises((PermissionError, RuntimeError)):
+        project._run_cohort_rollbacks(
+            StubRollback(modify_layer="species.tiff"), None, tmp_path.joinpath("staging")
+        )
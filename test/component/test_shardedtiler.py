@@ -0,0 +1,142 @@
+import json
+import numpy as np
+import pytest
+
+from gcbmwalltowall.component.shardedtiler import (
+    merge_attribute_tables, merge_study_areas, split_extent
+)
+
+
+def test_split_extent_on_tile_boundaries():
+    bands = split_extent((-120.5, 50.2, -115.5, 51.8), 1.0, 3)
+    assert bands == [
+        (-120.5, 51.8, -119, 50.2),
+        (-119, 51.8, -117, 50.2),
+        (-117, 51.8, -115.5, 50.2),
+    ]
+
+    # Taller than wide, and more shards than tiles.
+    bands = split_extent((10.0, 0.5, 10.5, 2.5), 1.0, 5)
+    assert bands == [(10.0, 2.5, 10.5, 2), (10.0, 2, 10.5, 1), (10.0, 1, 10.5, 0.5)]
+
+
+def test_merge_attribute_tables():
+    merged, remaps = merge_attribute_tables([
+        {"1": "fire", "2": "harvest"},
+        None,
+        {"1": "harvest", "2": "insects", "3": "fire"},
+    ])
+
+    assert merged == {"1": "fire", "2": "harvest", "3": "insects"}
+    assert remaps == [{1: 1, 2: 2}, {}, {1: 2, 2: 3, 3: 1}]
+
+    merged, remaps = merge_attribute_tables([
+        {"1": {"year": 2001, "type": "fire"}},
+        {"5": {"type": "fire", "year": 2001}},
+    ])
+
+    assert merged == {"1": {"year": 2001, "type": "fire"}}
+    assert remaps == [{1: 1}, {5: 1}]
+
+
+def test_merge_study_areas():
+    merged = merge_study_areas([
+        {"tile_size": 1.0, "pixel_size": 0.001, "tiles": [{"index": 7}],
+         "layers": [{"name": "age"}, {"name": "fire_2001"}]},
+        {"tile_size": 1.0, "pixel_size": 0.001, "tiles": [{"index": 3}, {"index": 7}],
+         "layers": [{"name": "age"}, {"name": "fire_2002"}]},
+    ])
+
+    assert merged["tile_size"] == 1.0
+    assert merged["tiles"] == [{"index": 3}, {"index": 7}]
+    assert [layer["name"] for layer in merged["layers"]] == ["age", "fire_2001", "fire_2002"]
+
+
+def _decoded_layer(output_path, name):
+    # A tiled layer's pixels as attribute values, so that layers tiled with and
+    # without shards compare equal however their attribute values are numbered.
+    from mojadata.util import gdal
+    from gcbmwalltowall.util.encoding import load_json
+
+    metadata = load_json(output_path.joinpath(f"{name}_moja.json"))
+    ds = gdal.Open(str(next(output_path.glob(f"{name}_moja.tif*"))))
+    geo_transform = ds.GetGeoTransform()
+    data = ds.ReadAsArray()
+    del ds
+
+    attributes = metadata.get("attributes")
+    if not attributes:
+        return geo_transform, np.where(data == metadata["nodata"], np.nan, data), None
+
+    decoded = np.full(data.shape, None, dtype=object)
+    for px, value in attributes.items():
+        decoded[data == int(px)] = json.dumps(value, sort_keys=True)
+
+    return geo_transform, decoded, sorted(
+        json.dumps(value, sort_keys=True) for value in attributes.values()
+    )
+
+
+def test_sharded_tiling_matches_unsharded(tmp_path):
+    pytest.importorskip("mojadata")
+    pytest.importorskip("gcbminputloader")
+    from test.builder.test_syntheticprojectbuilder import _create_aidb
+    from gcbmwalltowall.builder.syntheticprojectbuilder import SyntheticProjectBuilder
+    from gcbmwalltowall.configuration.configuration import Configuration
+    from gcbmwalltowall.project.projectfactory import ProjectFactory
+    from gcbmwalltowall.util.encoding import load_json
+    from gcbmwalltowall.util.resources import ResourceGovernor
+
+    ResourceGovernor.configure(4, 2)
+    _create_aidb(tmp_path.joinpath("aidb.db"))
+
+    # A landscape that straddles a tile boundary, so there are two shards.
+    config = SyntheticProjectBuilder.build(Configuration({
+        "aidb": "aidb.db",
+        "builder": {
+            "type": "synthetic",
+            "width": 20,
+            "height": 20,
+            "origin": [-100.01, 55.0],
+            "patch_size": 5,
+            "disturbance_years": 2,
+            "disturbance_rate": 0.5,
+        },
+    }, tmp_path))
+
+    output_paths = {}
+    for shards in (None, 2):
+        working_path = tmp_path.joinpath(f"shards_{shards}")
+        project = ProjectFactory().create(
+            Configuration(dict(config), config.config_path, working_path)
+        )
+
+        project.tile(shards)
+        output_paths[shards] = project.tiler_output_path
+
+    unsharded_path, sharded_path = output_paths[None], output_paths[2]
+    assert not sharded_path.joinpath("_shards").exists()
+
+    unsharded_study_area = load_json(unsharded_path.joinpath("study_area.json"))
+    sharded_study_area = load_json(sharded_path.joinpath("study_area.json"))
+    assert len(sharded_study_area["tiles"]) == 2
+    for key in ("tile_size", "block_size", "pixel_size", "tiles"):
+        assert sharded_study_area[key] == unsharded_study_area[key]
+
+    layer_names = [layer["name"] for layer in unsharded_study_area["layers"]]
+    assert sorted(layer["name"] for layer in sharded_study_area["layers"]) == sorted(layer_names)
+    for name in layer_names:
+        unsharded_transform, unsharded_data, unsharded_attributes = _decoded_layer(
+            unsharded_path, name
+        )
+
+        sharded_transform, sharded_data, sharded_attributes = _decoded_layer(
+            sharded_path, name
+        )
+
+        assert sharded_transform == pytest.approx(unsharded_transform)
+        assert sharded_attributes == unsharded_attributes
+        if unsharded_attributes is None:
+            np.testing.assert_array_equal(sharded_data, unsharded_data)
+        else:
+            assert (sharded_data == unsharded_data).all()
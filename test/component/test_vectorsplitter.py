@@ -0,0 +1,77 @@
+import pytest
+
+
+@pytest.fixture
+def disturbances(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import ogr, osr
+
+    path = tmp_path.joinpath("disturbances.shp")
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    ds = ogr.GetDriverByName("ESRI Shapefile").CreateDataSource(str(path))
+    lyr = ds.CreateLayer("disturbances", srs, ogr.wkbPolygon)
+    lyr.CreateField(ogr.FieldDefn("year", ogr.OFTInteger))
+    lyr.CreateField(ogr.FieldDefn("dist_type", ogr.OFTString))
+    for i, (year, dist_type) in enumerate([
+        (2010, "fire"), (2010, "fire"), (2010, "harvest"),
+        (2011, "fire"), (2012, "fire"), (2011, "insects"),
+    ]):
+        feature = ogr.Feature(lyr.GetLayerDefn())
+        feature.SetField("year", year)
+        feature.SetField("dist_type", dist_type)
+        feature.SetGeometry(ogr.CreateGeometryFromWkt(
+            f"POLYGON (({i} 0, {i + 1} 0, {i + 1} 1, {i} 1, {i} 0))"
+        ))
+        lyr.CreateFeature(feature)
+
+    del lyr, ds
+
+    return path
+
+
+def test_split_once_into_non_empty_layers(disturbances, monkeypatch):
+    from mojadata.util import ogr
+    from gcbmwalltowall.component.layer import Layer
+    from gcbmwalltowall.component.vectorsplitter import VectorSplitter
+
+    # Commit part way through writing the buckets.
+    monkeypatch.setattr(VectorSplitter, "commit_interval", 2)
+
+    splitter = VectorSplitter(Layer("disturbances", disturbances))
+    assert splitter.can_split(["year", "dist_type"])
+
+    split_layers = splitter.split({
+        "year": [2010, 2011], "dist_type": ["fire", "harvest"]
+    })
+
+    # (2011, "harvest") has no features, and 2012 and insects are left out.
+    assert list(split_layers) == [(2010, "fire"), (2010, "harvest"), (2011, "fire")]
+
+    # Every combination is a layer in the same GeoPackage.
+    split_paths = {path for path, _ in split_layers.values()}
+    assert len(split_paths) == 1
+
+    ds = ogr.Open(str(split_paths.pop()))
+    feature_counts = {
+        key: ds.GetLayerByName(layer_name).GetFeatureCount()
+        for key, (_, layer_name) in split_layers.items()
+    }
+
+    assert feature_counts == {(2010, "fire"): 2, (2010, "harvest"): 1, (2011, "fire"): 1}
+
+
+def test_extended_attributes_fall_back_to_filters(disturbances, tmp_path):
+    from gcbmwalltowall.component.layer import Layer
+    from gcbmwalltowall.component.vectorsplitter import VectorSplitter
+
+    extended_attributes_path = tmp_path.joinpath("extended.csv")
+    extended_attributes_path.write_text("year,regen_delay\n2010,1\n2011,0\n")
+    layer = Layer(
+        "disturbances", disturbances, extended_attribute_table=extended_attributes_path
+    )
+
+    # Attributes may come from the extended attribute table, so the layer is
+    # split by filtering the source once per combination instead.
+    assert not VectorSplitter(layer).can_split(["year"])
+    assert not VectorSplitter(Layer("disturbances", disturbances)).can_split(["regen_delay"])
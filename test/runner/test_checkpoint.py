@@ -0,0 +1,39 @@
+import os
+from gcbmwalltowall.runner.checkpoint import SimulationCheckpoint
+
+
+class WorkingDataset:
+
+    def __init__(self, timestep):
+        self.timestep = timestep
+
+    def copy(self, dataset_name, storage_type, path):
+        os.makedirs(path)
+        with open(os.path.join(path, "timestep"), "w") as snapshot:
+            snapshot.write(str(self.timestep))
+
+
+def test_resume_from_last_checkpoint(tmp_path):
+    fingerprint = {"config": "{}", "end_year": 2030}
+    checkpoint = SimulationCheckpoint(tmp_path, fingerprint, interval=2)
+    assert not checkpoint.resuming
+
+    checkpoint.complete_spinup()
+    for timestep in range(1, 6):
+        checkpoint.complete_timestep(timestep, WorkingDataset(timestep))
+
+    resumed = SimulationCheckpoint(tmp_path, fingerprint, resume=True)
+    assert resumed.spinup_complete
+    assert resumed.last_timestep == 4
+    assert resumed.disturbance_snapshot_path.joinpath("timestep").read_text() == "4"
+    assert not tmp_path.joinpath("checkpoint", "disturbance_2").exists()
+
+
+def test_changed_config_starts_over(tmp_path):
+    checkpoint = SimulationCheckpoint(tmp_path, {"end_year": 2030})
+    checkpoint.complete_spinup()
+    checkpoint.complete_timestep(1, WorkingDataset(1))
+
+    resumed = SimulationCheckpoint(tmp_path, {"end_year": 2050}, resume=True)
+    assert not resumed.resuming
+    assert resumed.disturbance_snapshot_path is None
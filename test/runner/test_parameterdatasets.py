@@ -0,0 +1,99 @@
+import json
+import shutil
+
+import pandas as pd
+import pytest
+
+from gcbmwalltowall.runner.parameterdatasets import (
+    copy_parameter_datasets, get_parameter_inputs, hash_dataset_tables
+)
+
+
+def _write_table(path, data):
+    path.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(data).to_parquet(path.joinpath("0.parquet"))
+
+
+def test_dataset_table_hash_ignores_layers(tmp_path):
+    pytest.importorskip("pyarrow")
+    dataset = tmp_path.joinpath("disturbance")
+    _write_table(dataset.joinpath("disturbance-table-transitions"), {"id": [1]})
+    _write_table(dataset.joinpath("disturbance-layer-fire"), {"value": [1]})
+    original = hash_dataset_tables(dataset)
+
+    _write_table(dataset.joinpath("disturbance-layer-fire"), {"value": [2]})
+    assert hash_dataset_tables(dataset) == original
+
+    _write_table(dataset.joinpath("disturbance-table-transitions"), {"id": [2]})
+    assert hash_dataset_tables(dataset) != original
+
+
+def _load_json_config(cbm4_config_path):
+    json_config = json.loads(cbm4_config_path.read_text())
+    for dataset_config in json_config["cbm4_spatial_dataset"].values():
+        dataset_config["path_or_uri"] = str(
+            cbm4_config_path.parent.joinpath(dataset_config["path_or_uri"])
+        )
+
+    return json_config
+
+
+def test_disturbance_tables_only_change_step_parameters(tmp_path):
+    pytest.importorskip("pyarrow")
+    _write_table(tmp_path.joinpath("inventory", "inventory-table-yield"), {"age": [0]})
+    _write_table(
+        tmp_path.joinpath("disturbance", "disturbance-table-transitions"), {"id": [1]}
+    )
+
+    cbm4_config_path = tmp_path.joinpath("cbm4_config.json")
+    cbm4_config_path.write_text(json.dumps({"cbm4_spatial_dataset": {
+        "inventory": {"path_or_uri": "inventory"},
+        "disturbance": {"path_or_uri": "disturbance"},
+    }}))
+
+    original = get_parameter_inputs(_load_json_config(cbm4_config_path))
+    _write_table(
+        tmp_path.joinpath("disturbance", "disturbance-table-transitions"), {"id": [2]}
+    )
+
+    changed = get_parameter_inputs(_load_json_config(cbm4_config_path))
+    assert changed["spinup_parameters"] == original["spinup_parameters"]
+    assert changed["step_parameters"] != original["step_parameters"]
+
+
+def test_clone_parameter_inputs_match_parent(cbm4_input_path, tmp_path):
+    pytest.importorskip("arrow_space")
+    from gcbmwalltowall.application.command.clone import clone
+
+    project_path = tmp_path.joinpath("project")
+    shutil.copytree(cbm4_input_path, project_path)
+    clone_path = tmp_path.joinpath("clone")
+    clone({
+        "config_path": str(project_path.joinpath("cbm4_config.json")),
+        "output_path": str(clone_path),
+        "include_disturbances": True,
+        "use_cache": False,
+    })
+
+    # The clone's datasets are copies, so it reuses the parent's parameter
+    # datasets instead of rebuilding them.
+    assert get_parameter_inputs(
+        _load_json_config(clone_path.joinpath("cbm4_config.json"))
+    ) == get_parameter_inputs(
+        _load_json_config(project_path.joinpath("cbm4_config.json"))
+    )
+
+
+def test_copy_parameter_datasets(tmp_path):
+    project = tmp_path.joinpath("project")
+    project.joinpath("step_parameters").mkdir(parents=True)
+    project.joinpath("step_parameters", "table.parquet").write_bytes(b"a")
+    project.joinpath("step_parameters.manifest.json").write_text("{}")
+    project.joinpath("spinup_parameters.manifest.json").write_text("{}")
+    clone = tmp_path.joinpath("clone")
+    clone.mkdir()
+
+    copy_parameter_datasets(project, clone)
+    assert clone.joinpath("step_parameters", "table.parquet").read_bytes() == b"a"
+    assert clone.joinpath("step_parameters.manifest.json").exists()
+    assert not clone.joinpath("spinup_parameters.manifest.json").exists()
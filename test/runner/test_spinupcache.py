@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from gcbmwalltowall.runner.spinupcache import SpinupCache, hash_path
+
+
+def test_hash_path_follows_content(tmp_path):
+    pytest.importorskip("pyarrow")
+    dataset = tmp_path.joinpath("inventory")
+    dataset.joinpath("inventory-table-yield").mkdir(parents=True)
+    dataset.joinpath("inventory-tags").mkdir()
+    dataset.joinpath("inventory-tags", "cbm_defaults.db").write_bytes(b"abc")
+    table_path = dataset.joinpath("inventory-table-yield", "a1-0.parquet")
+    pd.DataFrame({"age": [0, 10], "volume": [0.0, 5.5]}).to_parquet(table_path)
+    original = hash_path(dataset)
+
+    pd.DataFrame({"age": [0, 10], "volume": [0.0, 6.5]}).to_parquet(table_path)
+    assert hash_path(dataset) != original
+
+    pd.DataFrame({"age": [0, 10], "volume": [0.0, 5.5]}).to_parquet(table_path)
+    assert hash_path(dataset) == original
+
+    dataset.joinpath("inventory-tags", "cbm_defaults.db").write_bytes(b"abd")
+    assert hash_path(dataset) != original
+    assert hash_path(tmp_path.joinpath("missing")) is None
+
+
+def test_hash_path_ignores_dataset_name(tmp_path):
+    pytest.importorskip("pyarrow")
+    yields = pd.DataFrame({"age": [0, 10, 20], "volume": [0.0, 5.5, 9.0]})
+    for dataset_name, file_name in (("inventory", "a1-0.parquet"), ("clone", "b2-0.parquet")):
+        table_path = tmp_path.joinpath(dataset_name, f"{dataset_name}-table-yield")
+        table_path.mkdir(parents=True)
+        tmp_path.joinpath(dataset_name, dataset_name, "cohort_index=0").mkdir(parents=True)
+        yields.to_parquet(table_path.joinpath(file_name), compression=(
+            "snappy" if dataset_name == "inventory" else "zstd"
+        ))
+
+    # A copy of the dataset under another name, written with other parquet
+    # file names and options, has the same content.
+    assert hash_path(tmp_path.joinpath("inventory")) == hash_path(tmp_path.joinpath("clone"))
+
+    yields.to_parquet(tmp_path.joinpath("clone", "clone", "cohort_index=0", "c3-0.parquet"))
+    assert hash_path(tmp_path.joinpath("inventory")) != hash_path(tmp_path.joinpath("clone"))
+
+
+def test_cache_enabled_by_config(tmp_path):
+    config_path = tmp_path.joinpath("cbm4_config.json")
+    assert SpinupCache.from_config(config_path, {}) is None
+    assert SpinupCache.from_config(config_path, {"spinup_cache": "cache", "cache": {}}) is None
+
+    cache = SpinupCache.from_config(config_path, {"spinup_cache": "../cache"})
+    assert cache.path == tmp_path.joinpath("..", "cache")
+    assert cache.find(cache.fingerprint({"use_smoother": True})) is None
+    assert (
+        cache.fingerprint({"use_smoother": True, "inventory": "a"})
+        == cache.fingerprint({"inventory": "a", "use_smoother": True})
+    )
@@ -0,0 +1,10 @@
+from gcbmwalltowall.util.encoding import load_csv, load_csv_header
+
+
+def test_load_csv_header_matches_load_csv(tmp_path):
+    for delim in (",", ";"):
+        csv_path = tmp_path.joinpath("transitions.csv")
+        header = delim.join(("id", "disturbance_type", "Species"))
+        row = delim.join(("1", "Fire", "?"))
+        csv_path.write_text("\n".join([header] + [row] * 5000))
+        assert load_csv_header(csv_path, sample_size=1000) == list(load_csv(csv_path, nrows=1).columns)
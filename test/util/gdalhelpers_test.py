@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+
+from gcbmwalltowall.util.rasterbound import RasterBound
+
+
+def _create_raster(path, data, data_type, options=None, nodata=None):
+    from mojadata.util import gdal
+
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path), data.shape[1], data.shape[0], 1, data_type, options or []
+    )
+
+    ds.SetGeoTransform((-100.0, 0.01, 0, 55.0, 0, -0.01))
+    band = ds.GetRasterBand(1)
+    if nodata is not None:
+        band.SetNoDataValue(nodata)
+
+    band.WriteArray(data)
+    del band, ds
+
+    return str(path)
+
+
+@pytest.fixture
+def layers(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import gdal
+
+    ages = (np.arange(40 * 30) % 200).astype(np.int16).reshape(30, 40)
+    growth = np.linspace(0, 1, 40 * 30, dtype=np.float32).reshape(30, 40)
+
+    return [
+        _create_raster(tmp_path.joinpath("age.tif"), ages, gdal.GDT_Int16, nodata=-1),
+        _create_raster(
+            tmp_path.joinpath("growth.tif"), growth, gdal.GDT_Float32,
+            ["TILED=YES", "COMPRESS=ZSTD"], nodata=-1.0
+        ),
+    ]
+
+
+def test_read_stack_matches_layers(layers):
+    from gcbmwalltowall.util import gdalhelpers
+
+    bounds = RasterBound(5, 10, 20, 15)
+    stack = gdalhelpers.read_dataset_stack(layers, bounds)
+
+    # Mixed int16 and float32 layers are read into their common type.
+    assert stack.data.shape == (2, 15, 20)
+    assert stack.data.dtype == np.float32
+    assert stack.paths == layers
+    assert stack.nodata == [-1, -1.0]
+    for i, path in enumerate(layers):
+        layer = gdalhelpers.read_dataset(path, bounds)
+        assert np.array_equal(stack.data[i], layer.data)
+        assert stack.data_bounds.x_off == layer.data_bounds.x_off
+        assert stack.data_bounds.y_size == layer.data_bounds.y_size
+        assert stack.geo_transform == layer.geo_transform
+
+
+def test_read_stack_into_buffer(layers):
+    from gcbmwalltowall.util import gdalhelpers
+
+    out = np.zeros((2, 30, 40), dtype=np.float64)
+    stack = gdalhelpers.read_dataset_stack(layers, out=out)
+    assert stack.data is out
+    for i, path in enumerate(layers):
+        assert np.array_equal(out[i], gdalhelpers.read_dataset(path).data)
+
+    with pytest.raises(ValueError):
+        gdalhelpers.read_dataset_stack(layers, RasterBound(0, 0, 10, 10), out=out)
+
+
+def test_read_stack_mmap(layers):
+    from mojadata.util import gdal
+    from gcbmwalltowall.util import gdalhelpers
+
+    uncompressed_path, compressed_path = layers
+    bounds = RasterBound(3, 4, 30, 20)
+    expected = gdalhelpers.read_dataset(uncompressed_path, bounds).data
+
+    read_window_mmap = getattr(gdalhelpers, "__read_window_mmap")
+    for path, mapped in ((uncompressed_path, True), (compressed_path, False)):
+        ds = gdal.Open(path)
+        band = ds.GetRasterBand(1)
+        out = np.zeros((20, 30), dtype=np.float32)
+        assert read_window_mmap(ds, band, 3, 4, 30, 20, out) == mapped
+        if mapped:
+            assert np.array_equal(out, expected)
+
+        del band, ds
+
+    # Uncompressed layers are mapped and compressed ones read normally.
+    stack = gdalhelpers.read_dataset_stack(layers, bounds, use_mmap=True)
+    assert np.array_equal(stack.data[0], expected)
+    assert np.array_equal(
+        stack.data[1], gdalhelpers.read_dataset(compressed_path, bounds).data
+    )
+
+
+def test_plan_stack_chunks_fit_budget(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import gdal
+    from gcbmwalltowall.util import gdalhelpers
+
+    path = _create_raster(
+        tmp_path.joinpath("layer.tif"), np.zeros((60, 100), dtype=np.int32),
+        gdal.GDT_Int32, ["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"]
+    )
+
+    # Room for two workers to each hold 512 pixels of the int32 layer and an
+    # extra float64 buffer.
+    memory_limit_MB = 2 * 512 * 12 / 1e6
+    chunks = gdalhelpers.plan_raster_stack_chunks(
+        [path], memory_limit_MB, workers=2, extra_bytes_per_pixel=[8]
+    )
+
+    assert len(chunks) > 1
+    assert sum(chunk.x_size * chunk.y_size for chunk in chunks) == 60 * 100
+    for chunk in chunks:
+        assert chunk.x_off % 16 == 0 and chunk.y_off % 16 == 0
+        assert 2 * chunk.x_size * chunk.y_size * 12 <= memory_limit_MB * 1e6
+
+
+def test_plan_stack_chunks_skip_nodata(tmp_path):
+    pytest.importorskip("mojadata")
+    from mojadata.util import gdal
+    from gcbmwalltowall.util import gdalhelpers
+
+    block = np.ones((16, 16), dtype=np.uint8)
+    tiled = ["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"]
+
+    # Only one block is written to the sparse raster.
+    sparse_path = str(tmp_path.joinpath("sparse.tif"))
+    ds = gdal.GetDriverByName("GTiff").Create(
+        sparse_path, 64, 64, 1, gdal.GDT_Byte, tiled + ["SPARSE_OK=TRUE"]
+    )
+    ds.GetRasterBand(1).WriteArray(block, 16, 32)
+    del ds
+
+    # Every block is written to the dense raster, so its overview is used.
+    dense_data = np.zeros((64, 64), dtype=np.uint8)
+    dense_data[0:16, 48:64] = block
+    dense_path = _create_raster(
+        tmp_path.joinpath("dense.tif"), dense_data, gdal.GDT_Byte, tiled, nodata=0
+    )
+    ds = gdal.Open(dense_path, gdal.GA_Update)
+    ds.BuildOverviews("NEAREST", [4])
+    del ds
+
+    # One block per chunk.
+    memory_limit_MB = 16 * 16 / 1e6
+    assert len(gdalhelpers.plan_raster_stack_chunks([sparse_path], memory_limit_MB)) == 16
+
+    chunks = gdalhelpers.plan_raster_stack_chunks(
+        [sparse_path], memory_limit_MB, skip_nodata=True
+    )
+    assert [(c.x_off, c.y_off, c.x_size, c.y_size) for c in chunks] == [(16, 32, 16, 16)]
+
+    # Without overviews, nothing in the dense raster can be skipped.
+    assert len(gdalhelpers.plan_raster_stack_chunks(
+        [dense_path], memory_limit_MB, skip_nodata=True
+    )) == 16
+
+    chunks = gdalhelpers.plan_raster_stack_chunks(
+        [dense_path], memory_limit_MB, skip_nodata=True, use_overviews=True
+    )
+    assert [(c.x_off, c.y_off, c.x_size, c.y_size) for c in chunks] == [(48, 0, 16, 16)]
+
+    # A chunk is kept if any raster in the stack has data in it.
+    chunks = gdalhelpers.plan_raster_stack_chunks(
+        [sparse_path, dense_path], 2 * memory_limit_MB, skip_nodata=True,
+        use_overviews=True
+    )
+    assert [(c.x_off, c.y_off) for c in chunks] == [(48, 0), (16, 32)]
@@ -0,0 +1,8 @@
+from gcbmwalltowall.util.path import link_or_copy
+
+
+def test_link_or_copy(tmp_path):
+    src = tmp_path.joinpath("layer.tiff")
+    src.write_bytes(b"data")
+    dst = link_or_copy(src, tmp_path.joinpath("staged.tiff"))
+    assert dst.read_bytes() == b"data"
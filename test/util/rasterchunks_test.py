@@ -0,0 +1,51 @@
+from gcbmwalltowall.util.rasterchunks import (
+    get_block_aligned_raster_chunks, get_raster_chunks, plan_raster_chunks
+)
+
+
+def _as_tuples(chunks):
+    return [(c.x_off, c.y_off, c.x_size, c.y_size) for c in chunks]
+
+
+def test_row_major_order():
+    assert _as_tuples(get_raster_chunks(3, 2, 2, 1)) == [
+        (0, 0, 2, 1), (2, 0, 1, 1), (0, 1, 2, 1), (2, 1, 1, 1)
+    ]
+
+
+def test_block_aligned_whole_raster():
+    assert _as_tuples(get_block_aligned_raster_chunks(10, 10, 4, 4, 100)) == [
+        (0, 0, 10, 10)
+    ]
+
+
+def test_block_aligned_strips():
+    chunks = _as_tuples(get_block_aligned_raster_chunks(100, 50, 16, 16, 100 * 40))
+    assert chunks == [(0, 0, 100, 32), (0, 32, 100, 18)]
+
+
+def test_block_aligned_tiles():
+    chunks = list(get_block_aligned_raster_chunks(100, 20, 16, 16, 16 * 16 * 2))
+    for chunk in chunks:
+        assert chunk.x_off % 16 == 0 and chunk.y_off % 16 == 0
+        assert chunk.x_size == 32 or chunk.x_off + chunk.x_size == 100
+
+    assert sum(c.x_size * c.y_size for c in chunks) == 100 * 20
+
+
+def test_plan_fits_workers_in_budget():
+    # Two 4-byte rasters and a 1-byte raster, 4 workers, 1MB.
+    chunks = plan_raster_chunks(1000, 1000, 100, 10, [4, 4, 1], 1, workers=4)
+    for chunk in chunks:
+        assert chunk.x_size * chunk.y_size * 9 * 4 <= 1e6
+        assert chunk.y_off % 10 == 0
+
+    assert sum(c.x_size * c.y_size for c in chunks) == 1000 * 1000
+
+
+def test_plan_skips_empty_chunks():
+    chunks = plan_raster_chunks(
+        100, 100, 10, 10, [1], 1e-3, is_empty=lambda chunk: chunk.y_off >= 50
+    )
+
+    assert chunks and all(chunk.y_off < 50 for chunk in chunks)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from gcbmwalltowall.util.rasterbound import RasterBound
+
+
+def _create_raster(path, data, block_size=16):
+    from mojadata.util import gdal
+
+    ds = gdal.GetDriverByName("GTiff").Create(
+        str(path), data.shape[1], data.shape[0], 1, gdal.GDT_Int32,
+        ["TILED=YES", f"BLOCKXSIZE={block_size}", f"BLOCKYSIZE={block_size}"]
+    )
+
+    ds.SetGeoTransform((0, 1, 0, 0, 0, -1))
+    ds.GetRasterBand(1).WriteArray(data)
+    del ds
+
+    return str(path)
+
+
+@pytest.fixture
+def rasters(tmp_path):
+    pytest.importorskip("mojadata")
+    first = np.arange(64 * 48, dtype=np.int32).reshape(48, 64)
+    second = first * -1
+
+    return (
+        (_create_raster(tmp_path.joinpath("first.tif"), first), first),
+        (_create_raster(tmp_path.joinpath("second.tif"), second), second),
+    )
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_read_ahead_keeps_chunk_order(rasters, prefetch):
+    from gcbmwalltowall.util.rastersession import RasterSession
+
+    (path, expected), _ = rasters
+    chunks = [
+        RasterBound(16, 32, 16, 16),
+        RasterBound(0, 0, 64, 16),
+        RasterBound(48, 16, 16, 32),
+    ]
+
+    with RasterSession(prefetch) as session:
+        read = list(session.read_chunks(path, chunks))
+
+    assert [bounds for bounds, _ in read] == chunks
+    for bounds, (data,) in read:
+        assert np.array_equal(
+            data, expected[bounds.y_off:bounds.y_off + bounds.y_size,
+                           bounds.x_off:bounds.x_off + bounds.x_size]
+        )
+
+
+def test_read_stack(rasters):
+    from gcbmwalltowall.util.rastersession import RasterSession
+
+    paths = [path for path, _ in rasters]
+    stitched = [np.zeros_like(data) for _, data in rasters]
+    with RasterSession() as session:
+        # Small enough for several chunks of the stack.
+        chunks = list(session.get_chunks(paths, memory_limit_MB=0.005))
+        assert len(chunks) > 1
+        for bounds, stack in session.read_chunks(paths, chunks):
+            assert len(stack) == 2
+            for out, data in zip(stitched, stack):
+                out[bounds.y_off:bounds.y_off + bounds.y_size,
+                    bounds.x_off:bounds.x_off + bounds.x_size] = data
+
+    for out, (_, expected) in zip(stitched, rasters):
+        assert np.array_equal(out, expected)
+
+
+def test_write_other_raster_while_reading(rasters, tmp_path):
+    from gcbmwalltowall.util.rastersession import RasterSession
+
+    (path, expected), (other_path, other) = rasters
+    out_path = _create_raster(tmp_path.joinpath("out.tif"), np.zeros_like(expected))
+    with RasterSession() as session:
+        chunks = list(session.get_chunks(path, memory_limit_MB=0.003))
+        for bounds, (data,) in session.read_chunks(path, chunks):
+            # Reads and writes through the session while the next chunk is
+            # being prefetched.
+            assert session.read(other_path, bounds).sum() == -data.sum()
+            session.write(out_path, data * 2, bounds.x_off, bounds.y_off)
+
+    with RasterSession() as session:
+        assert np.array_equal(session.read(out_path), expected * 2)
+        assert np.array_equal(session.read(other_path), other)
@@ -0,0 +1,49 @@
+import threading
+import time
+from gcbmwalltowall.util.resources import ResourceGovernor
+
+
+def test_lease_is_capped_by_budget():
+    governor = ResourceGovernor(max_mem_gb=4, max_workers=2)
+    with governor.lease("a", memory_gb=16, workers=8) as lease:
+        assert lease.memory_gb == 4
+        assert lease.workers == 2
+
+    with governor.lease("b", memory_fraction=0.25) as lease:
+        assert lease.memory_gb == 1
+
+    assert [row[0] for row in governor.history] == ["a", "b"]
+    assert all(row[2] > 0 for row in governor.history)
+
+
+def test_concurrent_leases_share_budget():
+    governor = ResourceGovernor(max_mem_gb=4, max_workers=4)
+    first = governor.lease("first", memory_gb=3)
+    granted = threading.Event()
+
+    def take_second():
+        with governor.lease("second", memory_gb=2):
+            granted.set()
+
+    waiter = threading.Thread(target=take_second)
+    waiter.start()
+    time.sleep(0.1)
+    assert not granted.is_set()
+
+    first.release()
+    waiter.join(5)
+    assert granted.is_set()
+
+
+def test_overlapping_leases_are_marked_shared():
+    governor = ResourceGovernor(max_mem_gb=4, max_workers=4)
+    with governor.lease("alone", memory_gb=1, workers=1):
+        pass
+
+    with governor.lease("first", memory_gb=1, workers=1):
+        with governor.lease("second", memory_gb=1, workers=1):
+            pass
+
+    assert {row[0]: row[5] for row in governor.history} == {
+        "alone": False, "first": True, "second": True,
+    }
@@ -0,0 +1,42 @@
+import csv
+from gcbmwalltowall.util.transitionruleregistry import (
+    SharedTransitionRuleRegistry, TransitionRuleIndex, TransitionRuleRegistry
+)
+
+
+def test_equivalent_rules_share_an_id():
+    registry = TransitionRuleRegistry(TransitionRuleIndex())
+    first = registry.get_or_add(0, 0, {"Species": "Pine", "Region": 1})
+    assert registry.get_or_add("0", 0.0, {"Region": "1", "Species": "Pine"}) == first
+    assert registry.get_or_add(0, 5, {"Species": "Pine", "Region": 1}) != first
+
+
+def test_registries_sync_new_rules():
+    index = TransitionRuleIndex()
+    worker_a = TransitionRuleRegistry(index)
+    worker_b = TransitionRuleRegistry(index)
+    ids = worker_a.get_or_add_many([(0, 0, None), (0, 10, None), (0, 0, None)])
+    assert ids[0] == ids[2]
+
+    # Worker B learns about A's rules with its first round trip.
+    assert worker_b.get_or_add(1, 1) == 3
+    assert worker_b.get_or_add(0, 10) == ids[1]
+    assert worker_b._synced == 3
+
+
+def test_shared_registry(tmp_path):
+    mgr = SharedTransitionRuleRegistry()
+    mgr.start()
+    try:
+        registry = TransitionRuleRegistry(mgr.TransitionRuleIndex())
+        assert registry.get_or_add_many([(0, -1, {"Species": "Pine"}), (2, 0, None)]) == [1, 2]
+
+        output_path = tmp_path.joinpath("rules", "transition_rules.csv")
+        registry.write_rules(str(output_path))
+        with open(output_path, newline="") as rules:
+            assert list(csv.DictReader(rules)) == [
+                {"id": "1", "regen_delay": "0", "age_after": "-1", "Species": "Pine"},
+                {"id": "2", "regen_delay": "2", "age_after": "0", "Species": ""},
+            ]
+    finally:
+        mgr.shutdown()
@@ -0,0 +1,36 @@
+import numpy as np
+from gcbmwalltowall.util.valuemap import ValueMap, remap
+
+
+def test_strategy_selection():
+    for m, dtype, expected_strategy in (
+        ({1: 10, 2: 20, 3: 30}, np.int32, "dense"),
+        ({1: 10, 1_000_000_000: 20}, np.int64, "sorted"),
+        ({0.5: 1.5, 2.5: 3.5}, np.float32, "sorted"),
+        ({}, np.int16, "sorted"),
+    ):
+        assert ValueMap(m, dtype).strategy == expected_strategy
+
+
+def test_unmapped_values_pass_through():
+    a = np.array([[-5, 1, 2], [3, 4, 1_000]], dtype=np.int32)
+    m = {1: 10, 2: 20, 4: 40}
+    expected = np.array([[-5, 10, 20], [3, 40, 1_000]], dtype=np.int32)
+    for strategy in ("dense", "sorted", "hash"):
+        result = remap(a, m, strategy)
+        assert result.dtype == a.dtype
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_input_not_modified():
+    a = np.array([1, 2, 3], dtype=np.uint8)
+    remap(a, {1: 2, 2: 3})
+    np.testing.assert_array_equal(a, np.array([1, 2, 3], dtype=np.uint8))
+
+
+def test_reuse_across_chunks():
+    value_map = ValueMap({0: 7, 9: 1}, np.int16)
+    for chunk in (np.zeros(4, dtype=np.int16), np.full(4, 9, dtype=np.int16)):
+        np.testing.assert_array_equal(
+            value_map(chunk), np.where(chunk == 0, 7, 1).astype(np.int16)
+        )